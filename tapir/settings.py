@@ -198,3 +198,28 @@ AUTH_USER_MODEL = "accounts.TapirUser"
 LOGIN_REDIRECT_URL = "accounts:user_me"
 
 SITE_URL = "http://127.0.0.1:8000"
+
+# If enabled, future shifts of ShiftTemplates are not generated in advance but expanded on the fly from the templates
+# and the ABCD cycle. They are only stored once something shift-specific happens, see tapir/shifts/virtual.py.
+SHIFTS_VIRTUAL_FUTURE_SHIFTS = False
+
+# Penalties for members whose shift account balance has been below a threshold for a number of days. The status of the
+# last matching rule is stored on ShiftUserData.penalty_status, see tapir/shifts/penalties.py.
+SHIFT_PENALTY_RULES = [
+    {"status": "warned", "label": "Warned", "below": -1, "days": 0},
+    {
+        "status": "shopping_blocked",
+        "label": "Shopping blocked",
+        "below": -1,
+        "days": 28,
+    },
+]
+
+# Shared between the web and the worker processes, so that both can invalidate cached fragments. Create the table with
+# manage.py createcachetable.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "tapir_cache",
+    }
+}
@@ -1,4 +1,6 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.utils.formats import date_format
+from django.utils import timezone
 
 from tapir.shifts.models import (
     ShiftTemplateGroup,
@@ -7,6 +9,13 @@ from tapir.shifts.models import (
     ShiftAttendanceTemplate,
     ShiftAttendance,
     ShiftUserData,
+    ShiftTemplatePropagationJob,
+    ShiftCycleDay,
+    ShiftAccountBalanceSnapshot,
+    ShiftWaitlistEntry,
+    ShiftExemption,
+    ArchivedShift,
+    ArchivedShiftAttendance,
 )
 
 admin.site.register(ShiftUserData)
@@ -18,10 +27,39 @@ class ShiftTemplateInline(admin.TabularInline):
     extra = 3
 
 
+def report_num_slots_propagation(model_admin, request, shift_template):
+    """Show the result of the propagation of a changed number of slots, see ShiftTemplate.propagate_num_slots()."""
+    result = shift_template.num_slots_propagation
+    if result is None:
+        return
+
+    model_admin.message_user(request, "%s: %s" % (shift_template, result))
+    for shift in result.overbooked_shifts:
+        model_admin.message_user(
+            request,
+            "%s %s has %d valid attendances for %d slots"
+            % (
+                shift.name,
+                date_format(
+                    timezone.localtime(shift.start_time), "SHORT_DATETIME_FORMAT"
+                ),
+                shift.valid_attendance_count,
+                shift.num_slots,
+            ),
+            level=messages.WARNING,
+        )
+
+
 @admin.register(ShiftTemplateGroup)
 class ShiftTemplateGroupAdmin(admin.ModelAdmin):
     inlines = [ShiftTemplateInline]
 
+    def save_formset(self, request, form, formset, change):
+        super().save_formset(request, form, formset, change)
+        for shift_template, changed_fields in formset.changed_objects:
+            if isinstance(shift_template, ShiftTemplate):
+                report_num_slots_propagation(self, request, shift_template)
+
 
 class ShiftAttendanceTemplateInline(admin.TabularInline):
     model = ShiftAttendanceTemplate
@@ -37,6 +75,10 @@ class ShiftInline(admin.TabularInline):
 class ShiftTemplateAdmin(admin.ModelAdmin):
     inlines = [ShiftAttendanceTemplateInline, ShiftInline]
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        report_num_slots_propagation(self, request, obj)
+
 
 class ShiftAttendanceInline(admin.TabularInline):
     model = ShiftAttendance
@@ -46,5 +88,53 @@ class ShiftAttendanceInline(admin.TabularInline):
 @admin.register(Shift)
 class ShiftAdmin(admin.ModelAdmin):
     inlines = [ShiftAttendanceInline]
-    list_display = ["name", "start_time", "end_time", "num_slots"]
+    list_display = [
+        "name",
+        "start_time",
+        "end_time",
+        "num_slots",
+        "valid_attendance_count",
+        "free_slot_count",
+    ]
     search_fields = ["name", "start_time", "end_time"]
+
+
+@admin.register(ShiftTemplatePropagationJob)
+class ShiftTemplatePropagationJobAdmin(admin.ModelAdmin):
+    list_display = ["shift_template", "user", "created_date"]
+
+
+@admin.register(ShiftCycleDay)
+class ShiftCycleDayAdmin(admin.ModelAdmin):
+    list_display = ["date", "week_index", "weekday", "group"]
+    list_filter = ["week_index", "weekday", "group"]
+    date_hierarchy = "date"
+
+
+@admin.register(ShiftAccountBalanceSnapshot)
+class ShiftAccountBalanceSnapshotAdmin(admin.ModelAdmin):
+    list_display = ["user", "date", "balance"]
+    date_hierarchy = "date"
+
+
+@admin.register(ShiftWaitlistEntry)
+class ShiftWaitlistEntryAdmin(admin.ModelAdmin):
+    list_display = ["shift", "user", "created_date"]
+
+
+@admin.register(ShiftExemption)
+class ShiftExemptionAdmin(admin.ModelAdmin):
+    list_display = ["user", "start_date", "end_date", "description"]
+    date_hierarchy = "start_date"
+
+
+class ArchivedShiftAttendanceInline(admin.TabularInline):
+    model = ArchivedShiftAttendance
+    extra = 0
+
+
+@admin.register(ArchivedShift)
+class ArchivedShiftAdmin(admin.ModelAdmin):
+    inlines = [ArchivedShiftAttendanceInline]
+    list_display = ["name", "start_time", "num_slots", "valid_attendance_count"]
+    date_hierarchy = "start_time"
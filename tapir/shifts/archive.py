@@ -0,0 +1,111 @@
+"""Moving closed-out history out of the shift tables.
+
+Shift and ShiftAttendance only ever grow, so old shifts are moved into the compact ArchivedShift and
+ArchivedShiftAttendance tables, keeping the shift tables small for the queries of the daily work. Only shifts without
+pending attendances are archived, the ShiftAccountEntries of their attendances are kept as they are."""
+import datetime
+
+from django.db import connection, transaction
+
+from tapir.shifts import day_cache
+from tapir.shifts.models import (
+    ArchivedShift,
+    ArchivedShiftAttendance,
+    Shift,
+    ShiftAttendance,
+    ShiftWaitlistEntry,
+)
+
+ARCHIVE_BATCH_SIZE = 1000
+
+
+class ArchiveResult:
+    def __init__(self, shift_count=0, attendance_count=0):
+        self.shift_count = shift_count
+        self.attendance_count = attendance_count
+
+    def __str__(self):
+        return "Archived %d shifts and %d attendances" % (
+            self.shift_count,
+            self.attendance_count,
+        )
+
+
+def get_archivable_shifts(before: datetime.datetime):
+    return Shift.objects.filter(start_time__lt=before).exclude(
+        attendances__state=ShiftAttendance.State.PENDING
+    )
+
+
+def archive_shifts(
+    before: datetime.datetime, batch_size: int = ARCHIVE_BATCH_SIZE
+) -> ArchiveResult:
+    """Move the closed-out shifts that started before the given time and their attendances to the archive.
+
+    Each batch is moved in its own transaction, so that the shift tables are never locked for long."""
+    result = ArchiveResult()
+    while True:
+        with transaction.atomic():
+            shifts = list(
+                get_archivable_shifts(before)
+                .select_for_update(skip_locked=True)
+                .order_by("start_time", "pk")[:batch_size]
+            )
+            if not shifts:
+                return result
+            attendance_count = _archive_batch(shifts)
+
+        day_cache.invalidate_days_of(shift.start_time for shift in shifts)
+        result.shift_count += len(shifts)
+        result.attendance_count += attendance_count
+
+
+def _archive_batch(shifts) -> int:
+    shift_pks = [shift.pk for shift in shifts]
+    ArchivedShift.objects.bulk_create(
+        [
+            ArchivedShift(
+                id=shift.pk,
+                shift_template_id=shift.shift_template_id,
+                name=shift.name,
+                start_time=shift.start_time,
+                end_time=shift.end_time,
+                num_slots=shift.num_slots,
+                valid_attendance_count=shift.valid_attendance_count,
+            )
+            for shift in shifts
+        ]
+    )
+    archived_attendances = ArchivedShiftAttendance.objects.bulk_create(
+        [
+            ArchivedShiftAttendance(
+                id=attendance.pk,
+                shift_id=attendance.shift_id,
+                user_id=attendance.user_id,
+                state=attendance.state,
+                excused_reason=attendance.excused_reason,
+                account_entry_id=attendance.account_entry_id,
+            )
+            for attendance in ShiftAttendance.objects.filter(shift__in=shift_pks)
+        ]
+    )
+
+    # Plain DELETE statements: deleting through the ORM would load every row to send the signals, which only update
+    # the attendance counts and the cached days of the deleted shifts
+    _delete_rows(ShiftWaitlistEntry, "shift_id", shift_pks)
+    _delete_rows(ShiftAttendance, "shift_id", shift_pks)
+    _delete_rows(Shift, "id", shift_pks)
+    return len(archived_attendances)
+
+
+def _delete_rows(model, column, values):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "DELETE FROM %s WHERE %s IN (%s)"
+            % (
+                connection.ops.quote_name(model._meta.db_table),
+                connection.ops.quote_name(column),
+                ", ".join(["%s"] * len(values)),
+            ),
+            values,
+        )
@@ -0,0 +1,65 @@
+from django.db import connection, transaction
+
+from tapir.shifts.models import (
+    Shift,
+    ShiftAccountBalanceSnapshot,
+    ShiftAccountEntry,
+    ShiftAttendance,
+    ShiftUserData,
+)
+
+# States an attendance may be closed out with
+CLOSE_OUT_STATES = [
+    ShiftAttendance.State.DONE,
+    ShiftAttendance.State.MISSED,
+    ShiftAttendance.State.MISSED_EXCUSED,
+]
+
+
+@transaction.atomic
+def close_out_attendances(outcomes) -> int:
+    """Set the final states of pending ShiftAttendances and book their ShiftAccountEntries in one transaction.
+
+    outcomes maps ShiftAttendance primary keys to one of CLOSE_OUT_STATES. Attendances that are not pending anymore are
+    skipped, so that submitting the same outcomes twice doesn't book the entries twice. Returns the number of
+    attendances closed out."""
+    for state in outcomes.values():
+        if state not in CLOSE_OUT_STATES:
+            raise ValueError("Can't close out an attendance as {0}".format(state))
+
+    attendances = list(
+        ShiftAttendance.objects.select_for_update(of=("self",))
+        .filter(pk__in=outcomes.keys(), state=ShiftAttendance.State.PENDING)
+        .select_related("shift")
+    )
+    attendances_with_entries = []
+    for attendance in attendances:
+        attendance.state = outcomes[attendance.pk]
+        account_entry = attendance.build_account_entry()
+        if account_entry is not None:
+            attendances_with_entries.append((attendance, account_entry))
+
+    account_entries = [entry for _, entry in attendances_with_entries]
+    if connection.features.can_return_rows_from_bulk_insert:
+        ShiftAccountEntry.objects.bulk_create(account_entries)
+        ShiftUserData.objects.filter(
+            user__in={entry.user_id for entry in account_entries}
+        ).update_account_balances()
+    else:
+        # Without the primary keys of the new rows, the entries can't be linked to the attendances
+        for account_entry in account_entries:
+            account_entry.save()
+    for attendance, account_entry in attendances_with_entries:
+        attendance.account_entry = account_entry
+    if account_entries:
+        ShiftAccountBalanceSnapshot.invalidate(
+            {entry.user_id for entry in account_entries},
+            min(entry.date for entry in account_entries),
+        )
+
+    ShiftAttendance.objects.bulk_update(attendances, ["state", "account_entry"])
+    Shift.objects.filter(
+        pk__in={attendance.shift_id for attendance in attendances}
+    ).update_attendance_counts()
+
+    return len(attendances)
@@ -0,0 +1,66 @@
+"""Versions of the days of the shift calendar, used in the cache keys of the rendered days.
+
+A day gets a new version whenever a shift or an attendance on that day changes, so cached fragments of the day are
+simply never read again instead of being deleted. Changes to ShiftTemplates, ShiftAttendanceTemplates and
+ShiftExemptions change the version of all days, because they change the virtual shifts (see tapir.shifts.virtual)."""
+import datetime
+import uuid
+
+from django.core.cache import cache
+from django.utils import timezone
+
+_TEMPLATES_VERSION_KEY = "shifts:templates_version"
+
+
+def get_day_versions(dates) -> dict:
+    """Return the current version of each of the dates."""
+    keys_by_date = {date: _get_day_key(date) for date in dates}
+    versions = cache.get_many(list(keys_by_date.values()) + [_TEMPLATES_VERSION_KEY])
+
+    # Never fall back to a default version, an evicted version could otherwise lead back to a stale fragment
+    missing_versions = {
+        key: _new_version()
+        for key in list(keys_by_date.values()) + [_TEMPLATES_VERSION_KEY]
+        if key not in versions
+    }
+    cache.set_many(missing_versions, timeout=None)
+    versions.update(missing_versions)
+
+    return {
+        date: "%s.%s" % (versions[key], versions[_TEMPLATES_VERSION_KEY])
+        for date, key in keys_by_date.items()
+    }
+
+
+def get_templates_version() -> str:
+    """Return the current version of the ShiftTemplates and ShiftAttendanceTemplates."""
+    version = cache.get(_TEMPLATES_VERSION_KEY)
+    if version is None:
+        version = _new_version()
+        cache.set(_TEMPLATES_VERSION_KEY, version, None)
+    return version
+
+
+def invalidate_days(dates):
+    cache.set_many({_get_day_key(date): _new_version() for date in set(dates)}, None)
+
+
+def invalidate_days_of(start_times):
+    """Invalidate the days of the given shift start times."""
+    invalidate_days(
+        timezone.localtime(start_time).date()
+        for start_time in start_times
+        if start_time is not None
+    )
+
+
+def invalidate_templates():
+    cache.set(_TEMPLATES_VERSION_KEY, _new_version(), None)
+
+
+def _get_day_key(date: datetime.date) -> str:
+    return "shifts:day_version:%s" % date.isoformat()
+
+
+def _new_version() -> str:
+    return uuid.uuid4().hex
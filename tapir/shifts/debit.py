@@ -0,0 +1,110 @@
+import datetime
+
+from django.db import connection, transaction
+from django.db.models import (
+    Exists,
+    OuterRef,
+    Value,
+    CharField,
+    DateTimeField,
+    IntegerField,
+)
+from django.utils import timezone
+
+from tapir.coop.models import ShareOwnership
+from tapir.shifts.models import (
+    ShiftAccountBalanceSnapshot,
+    ShiftAccountEntry,
+    ShiftExemption,
+    ShiftTemplateGroup,
+    ShiftUserData,
+)
+
+# Every cycle, each member owes one shift
+DEBIT_VALUE = -1
+
+
+def get_cycle_key(cycle_start_date: datetime.date) -> str:
+    return "debit-%s" % cycle_start_date.isoformat()
+
+
+def get_debited_users(cycle_start_date: datetime.date):
+    """ShiftUserData of the users that owe a shift in the cycle: active, non-investing members owning a share that are
+    not exempt from shifts on the first day of the cycle."""
+    return ShiftUserData.objects.filter(
+        Exists(
+            ShareOwnership.objects.active_temporal(cycle_start_date).filter(
+                owner__user=OuterRef("user")
+            )
+        ),
+        ~Exists(
+            ShiftExemption.objects.active_temporal(cycle_start_date).filter(
+                user=OuterRef("user")
+            )
+        ),
+        user__is_active=True,
+        user__share_owner__is_investing=False,
+    )
+
+
+@transaction.atomic
+def debit_shift_credits(date: datetime.date) -> int:
+    """Debit every member one shift for the ABCD cycle containing the date and return the number of entries created.
+
+    All entries are inserted with a single INSERT ... SELECT. The cycle key of the entries is unique per user, so
+    conflicting rows are skipped and running this again for the same cycle (or after a crash) never debits twice. The
+    account balances of the debited users are then recomputed with a single UPDATE."""
+    cycle_start_date = ShiftTemplateGroup.get_cycle_start_date(date)
+    entries = (
+        get_debited_users(cycle_start_date)
+        .annotate(
+            debit_value=Value(DEBIT_VALUE, output_field=IntegerField()),
+            debit_date=Value(
+                timezone.make_aware(
+                    datetime.datetime.combine(cycle_start_date, datetime.time.min)
+                ),
+                output_field=DateTimeField(),
+            ),
+            debit_description=Value(
+                "Shift cycle starting on %s" % cycle_start_date.isoformat(),
+                output_field=CharField(),
+            ),
+            debit_cycle_key=Value(
+                get_cycle_key(cycle_start_date), output_field=CharField()
+            ),
+        )
+        .values_list(
+            "user_id",
+            "debit_value",
+            "debit_date",
+            "debit_description",
+            "debit_cycle_key",
+        )
+    )
+    select_sql, params = entries.query.sql_with_params()
+
+    opts = ShiftAccountEntry._meta
+    columns = [
+        opts.get_field(name).column
+        for name in ["user", "value", "date", "description", "cycle_key"]
+    ]
+    conflict_columns = [opts.get_field(name).column for name in ["user", "cycle_key"]]
+    quote_name = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "INSERT INTO %s (%s) %s ON CONFLICT (%s) DO NOTHING"
+            % (
+                quote_name(opts.db_table),
+                ", ".join(quote_name(column) for column in columns),
+                select_sql,
+                ", ".join(quote_name(column) for column in conflict_columns),
+            ),
+            params,
+        )
+        entry_count = cursor.rowcount
+
+    get_debited_users(cycle_start_date).update_account_balances()
+    ShiftAccountBalanceSnapshot.invalidate(
+        get_debited_users(cycle_start_date).values("user"), cycle_start_date
+    )
+    return entry_count
@@ -0,0 +1,83 @@
+"""Whether a user can join shifts, evaluated for any number of shifts with a fixed number of queries."""
+from django.utils.translation import gettext_lazy as _
+
+from tapir.coop.models import ShareOwner
+from tapir.shifts.models import Shift, ShiftAttendance
+
+
+class JoinEligibility:
+    """Whether the user can join the shift, and if not, why."""
+
+    ALREADY_REGISTERED = "already_registered"
+    INVESTING_MEMBER = "investing_member"
+    OVERLAPPING_ATTENDANCE = "overlapping_attendance"
+
+    REASON_MESSAGES = {
+        ALREADY_REGISTERED: _("You are already registered to this shift."),
+        INVESTING_MEMBER: _("Investing members can't join shifts."),
+        OVERLAPPING_ATTENDANCE: _("You are registered to another shift at that time."),
+    }
+
+    def __init__(self, shift: Shift, reason: str = None):
+        self.shift = shift
+        self.reason = reason
+
+    @property
+    def can_join(self) -> bool:
+        return self.reason is None
+
+    def get_reason_message(self):
+        return self.REASON_MESSAGES.get(self.reason)
+
+
+def get_join_eligibilities(user, shifts) -> list:
+    """Return the JoinEligibility of the user for each of the shifts, in the same order, using two queries.
+
+    The shifts may be virtual (see tapir.shifts.virtual). A user can't join a shift if they are an investing member,
+    already have an attendance on the shift, whatever its state, or have a valid attendance on another shift that
+    overlaps it."""
+    shifts = list(shifts)
+    if not shifts:
+        return []
+
+    if ShareOwner.objects.filter(user=user, is_investing=True).exists():
+        return [
+            JoinEligibility(shift, JoinEligibility.INVESTING_MEMBER) for shift in shifts
+        ]
+
+    attendances = list(
+        ShiftAttendance.objects.filter(
+            user=user,
+            shift__start_time__lt=max(shift.end_time for shift in shifts),
+            shift__end_time__gt=min(shift.start_time for shift in shifts),
+        ).values_list("shift_id", "state", "shift__start_time", "shift__end_time")
+    )
+    registered_shift_pks = {attendance[0] for attendance in attendances}
+    valid_attendance_times = [
+        (shift_pk, start_time, end_time)
+        for shift_pk, state, start_time, end_time in attendances
+        if state in ShiftAttendance.VALID_STATES
+    ]
+
+    eligibilities = []
+    for shift in shifts:
+        reason = None
+        if shift.pk is not None and shift.pk in registered_shift_pks:
+            reason = JoinEligibility.ALREADY_REGISTERED
+        elif any(
+            shift_pk != shift.pk
+            and start_time < shift.end_time
+            and end_time > shift.start_time
+            for shift_pk, start_time, end_time in valid_attendance_times
+        ):
+            reason = JoinEligibility.OVERLAPPING_ATTENDANCE
+        eligibilities.append(JoinEligibility(shift, reason))
+    return eligibilities
+
+
+def get_join_eligibility(user, shift: Shift) -> JoinEligibility:
+    return get_join_eligibilities(user, [shift])[0]
+
+
+def user_can_join_shift(user, shift: Shift) -> bool:
+    return get_join_eligibility(user, shift).can_join
@@ -0,0 +1,265 @@
+"""Assignment of flying members to the free slots of upcoming shifts.
+
+compute_proposal() fills the free slots in chronological order. Each slot goes to the flying member with the lowest
+recent load, then the lowest account balance, that has no overlapping attendance and isn't exempt from shifts at the
+time. The members are kept in a priority
+queue, so a month of shifts and thousands of members are resolved in O(slots · log(members)), plus the members that
+are skipped because they are busy. The resulting FlyingAssignmentProposal is reviewed by staff before it is applied."""
+import datetime
+import heapq
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from tapir.coop.models import ShareOwner
+from tapir.shifts import virtual
+from tapir.shifts.models import (
+    ExemptionCalendar,
+    Shift,
+    ShiftAttendance,
+    ShiftUserData,
+    start_of_day,
+)
+
+# Valid attendances in this many days before the start of a proposal count towards the recent load of a member
+RECENT_LOAD_DAYS = 28
+DEFAULT_MAX_ASSIGNMENTS_PER_MEMBER = 1
+
+
+class FlyingAssignment:
+    def __init__(self, shift: Shift, user_pk: int):
+        self.shift = shift
+        self.user_pk = user_pk
+        # Set by the view for the review
+        self.user = None
+
+    def get_key(self) -> str:
+        """Identifies the assignment in the review form, also if the shift is virtual."""
+        return "%s-%d" % (get_shift_key(self.shift), self.user_pk)
+
+
+class FlyingAssignmentProposal:
+    def __init__(self, assignments, unfilled_slot_count: int):
+        self.assignments = assignments
+        self.unfilled_slot_count = unfilled_slot_count
+
+    @transaction.atomic
+    def apply(self, keys=None) -> int:
+        """Create the attendances of the assignments, or only of those with the given keys, and return their number.
+
+        The proposal may be outdated by the time it is applied: assignments to shifts that are full by now and of
+        members that got an overlapping attendance in between are left out."""
+        assignments = [
+            assignment
+            for assignment in self.assignments
+            if keys is None or assignment.get_key() in keys
+        ]
+        if not assignments:
+            return 0
+
+        stored_shifts = {}
+        for assignment in assignments:
+            shift_key = get_shift_key(assignment.shift)
+            if shift_key not in stored_shifts:
+                stored_shifts[shift_key] = _store_shift(assignment.shift)
+        shift_pks = {shift.pk for shift in stored_shifts.values()}
+        user_pks = {assignment.user_pk for assignment in assignments}
+
+        free_slot_counts = dict(
+            Shift.objects.select_for_update()
+            .filter(pk__in=shift_pks)
+            .values_list("pk", "free_slot_count")
+        )
+        busy_times = _get_busy_times(
+            user_pks,
+            min(shift.start_time for shift in stored_shifts.values()),
+            max(shift.end_time for shift in stored_shifts.values()),
+        )
+
+        attendances = []
+        for assignment in assignments:
+            shift = stored_shifts[get_shift_key(assignment.shift)]
+            if free_slot_counts[shift.pk] <= 0 or _is_busy(
+                busy_times[assignment.user_pk], shift
+            ):
+                continue
+            free_slot_counts[shift.pk] -= 1
+            busy_times[assignment.user_pk].append((shift.start_time, shift.end_time))
+            attendances.append(ShiftAttendance(shift=shift, user_id=assignment.user_pk))
+
+        ShiftAttendance.objects.bulk_create(attendances)
+        Shift.objects.filter(pk__in=shift_pks).update_attendance_counts()
+        return len(attendances)
+
+
+def get_shift_key(shift: Shift) -> str:
+    if shift.is_virtual():
+        return "%d@%s" % (
+            shift.shift_template_id,
+            shift.start_time_local_date().isoformat(),
+        )
+    return str(shift.pk)
+
+
+def compute_proposal(
+    start_date: datetime.date,
+    end_date: datetime.date,
+    max_assignments_per_member: int = DEFAULT_MAX_ASSIGNMENTS_PER_MEMBER,
+) -> FlyingAssignmentProposal:
+    """Propose flying members for the free slots of the shifts between start_date and end_date (inclusive).
+
+    Only shifts that haven't started yet are filled."""
+    shifts = [
+        shift
+        for shift in _get_shifts(start_date, end_date)
+        if shift.free_slot_count > 0 and shift.start_time > timezone.now()
+    ]
+    if not shifts:
+        return FlyingAssignmentProposal([], 0)
+
+    members = get_flying_members()
+    start_of_window = min(shift.start_time for shift in shifts)
+    recent_loads = dict(
+        ShiftAttendance.objects.filter(
+            user__in=members.values("user"),
+            state__in=ShiftAttendance.VALID_STATES,
+            shift__start_time__gte=start_of_window
+            - datetime.timedelta(days=RECENT_LOAD_DAYS),
+            shift__start_time__lt=start_of_window,
+        )
+        .order_by()
+        .values("user")
+        .annotate(count=Count("pk"))
+        .values_list("user", "count")
+    )
+    busy_times = _get_busy_times(
+        members.values("user"),
+        start_of_window,
+        max(shift.end_time for shift in shifts),
+    )
+
+    return assign(
+        shifts,
+        [
+            (user_pk, recent_loads.get(user_pk, 0), account_balance)
+            for user_pk, account_balance in members.values_list(
+                "user_id", "account_balance"
+            )
+        ],
+        busy_times,
+        max_assignments_per_member,
+    )
+
+
+def get_flying_members():
+    """The ShiftUserData of the active flying members that can work shifts."""
+    return ShiftUserData.objects.filter(
+        attendance_mode="flying", user__is_active=True
+    ).exclude(
+        user__in=ShareOwner.objects.filter(
+            is_investing=True, user__isnull=False
+        ).values("user")
+    )
+
+
+def assign(
+    shifts, members, busy_times, max_assignments_per_member
+) -> FlyingAssignmentProposal:
+    """The greedy assignment itself, without any database access.
+
+    shifts must be ordered by start time, members are (user_pk, recent_load, account_balance) tuples and busy_times
+    maps user pks to the (start_time, end_time) pairs of their attendances and exemptions."""
+    # Members that worked least recently come first, then those who owe the most shifts
+    queue = [
+        (recent_load, account_balance, user_pk, 0)
+        for user_pk, recent_load, account_balance in members
+    ]
+    heapq.heapify(queue)
+    busy_times = defaultdict(list, busy_times)
+
+    assignments = []
+    unfilled_slot_count = 0
+    for shift in shifts:
+        for _ in range(shift.free_slot_count):
+            busy_members = []
+            while queue and _is_busy(busy_times[queue[0][2]], shift):
+                busy_members.append(heapq.heappop(queue))
+
+            if queue:
+                load, account_balance, user_pk, assignment_count = heapq.heappop(queue)
+                assignments.append(FlyingAssignment(shift, user_pk))
+                busy_times[user_pk].append((shift.start_time, shift.end_time))
+                if assignment_count + 1 < max_assignments_per_member:
+                    heapq.heappush(
+                        queue,
+                        (load + 1, account_balance, user_pk, assignment_count + 1),
+                    )
+            else:
+                unfilled_slot_count += 1
+
+            for busy_member in busy_members:
+                heapq.heappush(queue, busy_member)
+
+    return FlyingAssignmentProposal(assignments, unfilled_slot_count)
+
+
+def _get_shifts(start_date: datetime.date, end_date: datetime.date):
+    if virtual.is_enabled():
+        return virtual.get_shifts(start_date, end_date)
+    return Shift.objects.filter(
+        start_time__gte=timezone.make_aware(
+            datetime.datetime.combine(start_date, datetime.time.min)
+        ),
+        start_time__lt=timezone.make_aware(
+            datetime.datetime.combine(
+                end_date + datetime.timedelta(days=1), datetime.time.min
+            )
+        ),
+        free_slot_count__gt=0,
+    ).order_by("start_time", "pk")
+
+
+def _get_busy_times(user_pks, start_time, end_time):
+    busy_times = defaultdict(list)
+    for user_pk, shift_start_time, shift_end_time in ShiftAttendance.objects.filter(
+        user__in=user_pks,
+        state__in=ShiftAttendance.VALID_STATES,
+        shift__start_time__lt=end_time,
+        shift__end_time__gt=start_time,
+    ).values_list("user", "shift__start_time", "shift__end_time"):
+        busy_times[user_pk].append((shift_start_time, shift_end_time))
+
+    # Exempt members are busy for the whole exemption, open ends are cut at the end of the window
+    exemptions = ExemptionCalendar(
+        user_pks=user_pks,
+        start_date=timezone.localtime(start_time).date(),
+        end_date=timezone.localtime(end_time).date(),
+    )
+    for user_pk, periods in exemptions.periods_by_user_pk.items():
+        for period_start, period_end in periods:
+            busy_times[user_pk].append(
+                (
+                    start_of_day(period_start),
+                    end_time
+                    if period_end == datetime.date.max
+                    else start_of_day(period_end + datetime.timedelta(days=1)),
+                )
+            )
+    return busy_times
+
+
+def _is_busy(times, shift: Shift) -> bool:
+    return any(
+        start_time < shift.end_time and end_time > shift.start_time
+        for start_time, end_time in times
+    )
+
+
+def _store_shift(shift: Shift) -> Shift:
+    if shift.is_virtual():
+        return virtual.materialize_shift(
+            shift.shift_template, shift.start_time_local_date()
+        )
+    return shift
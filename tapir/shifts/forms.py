@@ -1,8 +1,19 @@
+import datetime
+
 from bootstrap_datepicker_plus import DateTimePickerInput
 from django import forms
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
 from django.forms import DateTimeInput, SplitDateTimeWidget
 
-from tapir.shifts.models import Shift
+from tapir.shifts import timetable, flying
+from tapir.shifts.closeout import CLOSE_OUT_STATES
+from tapir.shifts.models import (
+    Shift,
+    ShiftAttendance,
+    ShiftTemplateGroup,
+    WEEKDAY_CHOICES,
+)
 
 
 class ShiftCreateForm(forms.ModelForm):
@@ -13,3 +24,114 @@ class ShiftCreateForm(forms.ModelForm):
             "start_time": DateTimePickerInput().start_of("shift"),
             "end_time": DateTimePickerInput().end_of("shift"),
         }
+
+
+class FreeSlotSearchForm(forms.Form):
+    start_date = forms.DateField(required=False)
+    end_date = forms.DateField(required=False)
+    weekdays = forms.TypedMultipleChoiceField(
+        choices=WEEKDAY_CHOICES, coerce=int, required=False
+    )
+    earliest_start_time = forms.TimeField(required=False)
+    latest_end_time = forms.TimeField(required=False)
+    group = forms.ModelChoiceField(
+        queryset=ShiftTemplateGroup.objects.all(), required=False
+    )
+    limit = forms.IntegerField(min_value=1, max_value=500, required=False)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start_date = cleaned_data.get("start_date")
+        end_date = cleaned_data.get("end_date")
+        if start_date and end_date and end_date < start_date:
+            self.add_error("end_date", _("The end date must be after the start date."))
+        return cleaned_data
+
+
+class TimetableRangeForm(forms.Form):
+    start_date = forms.DateField(required=False)
+    end_date = forms.DateField(required=False)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if self.errors:
+            return cleaned_data
+
+        # The week starting today by default
+        start_date = cleaned_data["start_date"] or timezone.localdate()
+        end_date = cleaned_data["end_date"] or start_date + datetime.timedelta(days=6)
+        if end_date < start_date:
+            self.add_error("end_date", _("The end date must be after the start date."))
+        elif (end_date - start_date).days >= timetable.MAX_DAYS:
+            self.add_error(
+                "end_date",
+                _("The timetable can show at most %(days)d days at once.")
+                % {"days": timetable.MAX_DAYS},
+            )
+        cleaned_data["start_date"] = start_date
+        cleaned_data["end_date"] = end_date
+        return cleaned_data
+
+
+class FlyingAssignmentForm(forms.Form):
+    start_date = forms.DateField(label=_("From"), required=False)
+    end_date = forms.DateField(label=_("To"), required=False)
+    max_assignments_per_member = forms.IntegerField(
+        label=_("Maximum shifts per member"),
+        min_value=1,
+        initial=flying.DEFAULT_MAX_ASSIGNMENTS_PER_MEMBER,
+        required=False,
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if self.errors:
+            return cleaned_data
+
+        # The four weeks starting tomorrow by default
+        start_date = cleaned_data[
+            "start_date"
+        ] or timezone.localdate() + datetime.timedelta(days=1)
+        end_date = cleaned_data["end_date"] or start_date + datetime.timedelta(days=27)
+        if end_date < start_date:
+            self.add_error("end_date", _("The end date must be after the start date."))
+        cleaned_data["start_date"] = start_date
+        cleaned_data["end_date"] = end_date
+        cleaned_data["max_assignments_per_member"] = (
+            cleaned_data["max_assignments_per_member"]
+            or flying.DEFAULT_MAX_ASSIGNMENTS_PER_MEMBER
+        )
+        return cleaned_data
+
+
+class CloseOutForm(forms.Form):
+    """One outcome field per pending ShiftAttendance, all submitted at once."""
+
+    def __init__(self, *args, attendances, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.attendances = attendances
+        for attendance in attendances:
+            self.fields[self._get_field_name(attendance)] = forms.TypedChoiceField(
+                choices=[
+                    (state, ShiftAttendance.State(state).label)
+                    for state in CLOSE_OUT_STATES
+                ],
+                coerce=int,
+                initial=ShiftAttendance.State.DONE,
+                label="%s %s: %s"
+                % (
+                    attendance.shift.name,
+                    timezone.localtime(attendance.shift.start_time).strftime("%H:%M"),
+                    attendance.user.get_display_name(),
+                ),
+            )
+
+    @staticmethod
+    def _get_field_name(attendance: ShiftAttendance):
+        return "attendance_%d" % attendance.pk
+
+    def get_outcomes(self):
+        return {
+            attendance.pk: self.cleaned_data[self._get_field_name(attendance)]
+            for attendance in self.attendances
+        }
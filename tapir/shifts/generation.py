@@ -0,0 +1,314 @@
+import datetime
+import math
+import multiprocessing
+import time
+from collections import defaultdict
+
+from django.db import connection, connections, transaction
+from django.utils import timezone
+
+from tapir.shifts import day_cache
+from tapir.shifts.models import (
+    ExemptionCalendar,
+    Shift,
+    ShiftAttendance,
+    ShiftAttendanceTemplate,
+    ShiftTemplate,
+    ShiftTemplateGroup,
+    ShiftCycleDay,
+)
+
+# Length of the ABCD cycle, shift generation is locked per ShiftTemplateGroup and cycle
+CYCLE_LENGTH_DAYS = 28
+# Shifts per INSERT statement, keeps the number of parameters below the limit of SQLite
+INSERT_BATCH_SIZE = 100
+
+
+class QueryCounter:
+    """Execute wrapper counting the queries run on a connection, see connection.execute_wrapper()."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class ShiftGenerationResult:
+    def __init__(self, shift_count=0, attendance_count=0, query_count=0, duration=0):
+        self.shift_count = shift_count
+        self.attendance_count = attendance_count
+        self.query_count = query_count
+        # Duration in seconds
+        self.duration = duration
+
+    def add(self, other):
+        self.shift_count += other.shift_count
+        self.attendance_count += other.attendance_count
+        self.query_count += other.query_count
+
+    def __str__(self):
+        return "Created %d shifts and %d attendances in %.2fs using %d queries" % (
+            self.shift_count,
+            self.attendance_count,
+            self.duration,
+            self.query_count,
+        )
+
+
+def generate_shifts(
+    start_date: datetime.date, end_date: datetime.date, processes: int = 1
+) -> ShiftGenerationResult:
+    """Generate the missing Shifts of all grouped ShiftTemplates between start_date and end_date (inclusive).
+
+    In contrast to ShiftTemplateGroup.create_shifts(), this works on arbitrary date ranges and uses a constant number
+    of queries per ShiftTemplateGroup: the missing (template, start_time) pairs are computed in memory and the Shifts
+    as well as the ShiftAttendances derived from the ShiftAttendanceTemplates are inserted with bulk_create(). Existing
+    shifts are left untouched. Members don't get attendances during their ShiftExemptions, which are loaded once per
+    ShiftTemplateGroup.
+
+    Generation runs may overlap safely: shifts are inserted with ON CONFLICT DO NOTHING and each run holds a lock per
+    ShiftTemplateGroup and ABCD cycle while generating. With processes > 1 and PostgreSQL, the date range is
+    partitioned by group and cycle across a process pool."""
+
+    if end_date < start_date:
+        raise ValueError(
+            "End date {0} is before start date {1}".format(end_date, start_date)
+        )
+
+    started = time.monotonic()
+    result = ShiftGenerationResult()
+
+    query_counter = QueryCounter()
+    with connection.execute_wrapper(query_counter):
+        ShiftCycleDay.extend_calendar(end_date)
+        group_pks = list(
+            ShiftTemplateGroup.objects.filter(shift_templates__isnull=False)
+            .values_list("pk", flat=True)
+            .distinct()
+        )
+    result.query_count += query_counter.count
+
+    tasks = [
+        (group_pk, chunk_start, chunk_end)
+        for chunk_start, chunk_end in _partition(start_date, end_date, processes)
+        for group_pk in group_pks
+    ]
+    # Inside a transaction, closing the connection would break it and the workers wouldn't see its uncommitted rows
+    if (
+        processes > 1
+        and connection.vendor == "postgresql"
+        and not connection.in_atomic_block
+    ):
+        # Forked processes must not share the database connection of the parent
+        connections.close_all()
+        with multiprocessing.Pool(processes) as pool:
+            for task_result in pool.imap_unordered(_generate_shifts_task, tasks):
+                result.add(task_result)
+    else:
+        for task in tasks:
+            result.add(_generate_shifts_task(task))
+
+    result.duration = time.monotonic() - started
+    return result
+
+
+def _partition(start_date: datetime.date, end_date: datetime.date, processes: int):
+    """Split the date range into one chunk per process, aligned to the ABCD cycles."""
+    first_cycle = _get_cycle(start_date)
+    cycle_count = _get_cycle(end_date) - first_cycle + 1
+    cycles_per_chunk = math.ceil(cycle_count / processes)
+
+    for chunk_first_cycle in range(
+        first_cycle, first_cycle + cycle_count, cycles_per_chunk
+    ):
+        chunk_start = _get_cycle_start(chunk_first_cycle)
+        chunk_end = _get_cycle_start(
+            chunk_first_cycle + cycles_per_chunk
+        ) - datetime.timedelta(days=1)
+        yield max(chunk_start, start_date), min(chunk_end, end_date)
+
+
+def _get_cycle(date: datetime.date) -> int:
+    return (date - ShiftTemplateGroup.START_OF_ABCD_SYSTEM).days // CYCLE_LENGTH_DAYS
+
+
+def _get_cycle_start(cycle: int) -> datetime.date:
+    return ShiftTemplateGroup.START_OF_ABCD_SYSTEM + datetime.timedelta(
+        days=cycle * CYCLE_LENGTH_DAYS
+    )
+
+
+def _generate_shifts_task(task) -> ShiftGenerationResult:
+    group_pk, start_date, end_date = task
+
+    query_counter = QueryCounter()
+    with connection.execute_wrapper(query_counter), transaction.atomic():
+        _lock_template_group(group_pk, start_date, end_date)
+        shift_count, attendance_count = _generate_shifts(group_pk, start_date, end_date)
+
+    return ShiftGenerationResult(
+        shift_count=shift_count,
+        attendance_count=attendance_count,
+        query_count=query_counter.count,
+    )
+
+
+def _lock_template_group(group_pk, start_date: datetime.date, end_date: datetime.date):
+    """Lock the generation of the shifts of the group in the given date range until the end of the transaction.
+
+    Without the lock, two overlapping runs could both insert the same shift (one of which is dropped because of the
+    unique constraint) and then both create its attendances."""
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            # Always lock in ascending order to avoid deadlocks between runs
+            for cycle in range(_get_cycle(start_date), _get_cycle(end_date) + 1):
+                cursor.execute(
+                    "SELECT pg_advisory_xact_lock(%s, %s)", [group_pk, cycle]
+                )
+    else:
+        ShiftTemplateGroup.objects.select_for_update().get(pk=group_pk)
+
+
+def _generate_shifts(group_pk, start_date: datetime.date, end_date: datetime.date):
+    templates_by_week_index_and_weekday = defaultdict(list)
+    for shift_template in ShiftTemplate.objects.filter(
+        group=group_pk, weekday__isnull=False
+    ).select_related("group"):
+        templates_by_week_index_and_weekday[
+            (shift_template.group.week_index, shift_template.weekday)
+        ].append(shift_template)
+
+    planned_shifts = []
+    shift_date = start_date
+    while shift_date <= end_date:
+        week_index = ShiftTemplateGroup.get_week_index(shift_date)
+        for shift_template in templates_by_week_index_and_weekday[
+            (week_index, shift_date.weekday())
+        ]:
+            planned_shifts.append(shift_template._generate_shift(start_date=shift_date))
+        shift_date += datetime.timedelta(days=1)
+
+    if not planned_shifts:
+        return 0, 0
+
+    template_pks = {shift.shift_template_id for shift in planned_shifts}
+    start_time_range = (
+        min(shift.start_time for shift in planned_shifts),
+        max(shift.start_time for shift in planned_shifts),
+    )
+    existing_shift_keys = set(
+        Shift.objects.filter(
+            shift_template__in=template_pks, start_time__range=start_time_range
+        ).values_list("shift_template_id", "start_time")
+    )
+    new_shifts = [
+        shift
+        for shift in planned_shifts
+        if (shift.shift_template_id, shift.start_time) not in existing_shift_keys
+    ]
+    if not new_shifts:
+        return 0, 0
+
+    user_pks_by_template_pk = defaultdict(list)
+    for template_pk, user_pk in ShiftAttendanceTemplate.objects.filter(
+        shift_template__in=template_pks
+    ).values_list("shift_template_id", "user_id"):
+        user_pks_by_template_pk[template_pk].append(user_pk)
+
+    exemptions = ExemptionCalendar(
+        user_pks={
+            user_pk
+            for user_pks in user_pks_by_template_pk.values()
+            for user_pk in user_pks
+        },
+        start_date=start_date,
+        end_date=end_date,
+    )
+    attending_user_pks_by_key = {}
+    for shift in new_shifts:
+        shift_date = timezone.localtime(shift.start_time).date()
+        user_pks = [
+            user_pk
+            for user_pk in user_pks_by_template_pk[shift.shift_template_id]
+            if not exemptions.is_exempt(user_pk, shift_date)
+        ]
+        attending_user_pks_by_key[
+            (shift.shift_template_id, shift.start_time)
+        ] = user_pks
+        shift.valid_attendance_count = len(user_pks)
+        shift.free_slot_count = shift.num_slots - shift.valid_attendance_count
+
+    inserted_shifts = _insert_shifts(new_shifts)
+    attendances = [
+        ShiftAttendance(shift=shift, user_id=user_pk)
+        for shift in inserted_shifts
+        for user_pk in attending_user_pks_by_key[
+            (shift.shift_template_id, shift.start_time)
+        ]
+    ]
+    ShiftAttendance.objects.bulk_create(attendances)
+    day_cache.invalidate_days_of(shift.start_time for shift in inserted_shifts)
+
+    return len(inserted_shifts), len(attendances)
+
+
+def _insert_shifts(shifts):
+    """Insert the shifts and return the ones that were actually inserted, with their primary key set.
+
+    ShiftTemplate.create_shift() and virtual.materialize_shift() don't take the generation lock, so a planned shift
+    may have been stored by them in the meantime. Such a shift is skipped with ON CONFLICT DO NOTHING, its attendances
+    and counts are left to the writer that stored it."""
+    opts = Shift._meta
+    fields = [
+        opts.get_field(name)
+        for name in [
+            "shift_template",
+            "name",
+            "start_time",
+            "end_time",
+            "num_slots",
+            "valid_attendance_count",
+            "free_slot_count",
+        ]
+    ]
+    conflict_columns = [
+        opts.get_field(name).column for name in ["shift_template", "start_time"]
+    ]
+    quote_name = connection.ops.quote_name
+
+    inserted_pks = []
+    with connection.cursor() as cursor:
+        for batch_start in range(0, len(shifts), INSERT_BATCH_SIZE):
+            batch = shifts[batch_start : batch_start + INSERT_BATCH_SIZE]
+            placeholders = "(%s)" % ", ".join(["%s"] * len(fields))
+            cursor.execute(
+                "INSERT INTO %s (%s) VALUES %s ON CONFLICT (%s) DO NOTHING RETURNING %s"
+                % (
+                    quote_name(opts.db_table),
+                    ", ".join(quote_name(field.column) for field in fields),
+                    ", ".join([placeholders] * len(batch)),
+                    ", ".join(quote_name(column) for column in conflict_columns),
+                    quote_name(opts.pk.column),
+                ),
+                [
+                    field.get_db_prep_save(getattr(shift, field.attname), connection)
+                    for shift in batch
+                    for field in fields
+                ],
+            )
+            inserted_pks.extend(row[0] for row in cursor.fetchall())
+
+    pks_by_key = {
+        (template_pk, start_time): pk
+        for pk, template_pk, start_time in Shift.objects.filter(
+            pk__in=inserted_pks
+        ).values_list("pk", "shift_template_id", "start_time")
+    }
+    inserted_shifts = []
+    for shift in shifts:
+        shift.pk = pks_by_key.get((shift.shift_template_id, shift.start_time))
+        if shift.pk is not None:
+            inserted_shifts.append(shift)
+    return inserted_shifts
@@ -0,0 +1,401 @@
+"""iCalendar feeds of shifts, see RFC 5545.
+
+The feeds are requested by calendar clients without a session, the user is identified by the signed token in the URL
+(ShiftUserData.get_calendar_token()). The personal feed contains the upcoming shift attendances and the regular
+template slots as recurring events, the coordinator feed contains all upcoming shifts and is streamed. The recurring
+events are given in local time, defined by the VTIMEZONE at the start of the feeds."""
+import calendar
+import datetime
+import functools
+import hashlib
+
+from django.conf import settings
+from django.utils import timezone
+
+from tapir.shifts import virtual
+from tapir.shifts.models import (
+    ExemptionCalendar,
+    Shift,
+    ShiftAttendance,
+    ShiftAttendanceTemplate,
+    ShiftTemplateGroup,
+)
+
+# Shifts that started up to this many days ago are still included in the feeds
+PAST_DAYS = 7
+
+# Interval of the recurring events of the regular slots, one ABCD cycle
+RECURRENCE_INTERVAL = datetime.timedelta(weeks=4)
+
+WEEKDAY_CODES = ["MO", "TU", "WE", "TH", "FR", "SA", "SU"]
+
+CRLF = "\r\n"
+CONTENT_TYPE = "text/calendar; charset=utf-8"
+
+
+class UserCalendar:
+    """The data of the personal feed of a user, loaded with one lightweight query per kind of event."""
+
+    def __init__(self, user_pk: int):
+        self.user_pk = user_pk
+        self.attendances = list(
+            ShiftAttendance.objects.filter(
+                user=user_pk, shift__start_time__gte=_get_feed_start()
+            )
+            .order_by("shift__start_time", "pk")
+            .values_list(
+                "shift_id",
+                "state",
+                "shift__name",
+                "shift__start_time",
+                "shift__end_time",
+                "shift__shift_template_id",
+            )
+        )
+        self.attendance_templates = list(
+            ShiftAttendanceTemplate.objects.filter(
+                user=user_pk,
+                shift_template__weekday__isnull=False,
+                shift_template__group__isnull=False,
+            )
+            .order_by("pk")
+            .values_list(
+                "shift_template_id",
+                "shift_template__name",
+                "shift_template__weekday",
+                "shift_template__start_time",
+                "shift_template__end_time",
+                "shift_template__group__week_index",
+            )
+        )
+        # The regular slots don't take place for the user during their ShiftExemptions
+        self.exemption_periods = ExemptionCalendar(
+            user_pks=[user_pk], start_date=timezone.localdate()
+        ).periods_by_user_pk[user_pk]
+
+    def get_etag(self) -> str:
+        """Changes whenever the rendered feed would change, so that unchanged feeds aren't rendered at all."""
+        return hashlib.md5(
+            repr(
+                (self.attendances, self.attendance_templates, self.exemption_periods)
+            ).encode()
+        ).hexdigest()
+
+    def get_lines(self):
+        template_pks = {template[0] for template in self.attendance_templates}
+
+        yield from _get_calendar_start_lines()
+        for (
+            shift_pk,
+            state,
+            name,
+            start_time,
+            end_time,
+            template_pk,
+        ) in self.attendances:
+            # The shifts of the regular slots are covered by the recurring events
+            if template_pk in template_pks or state not in ShiftAttendance.VALID_STATES:
+                continue
+            yield from _get_event_lines(
+                uid="shift-%d" % shift_pk,
+                summary=name,
+                start_time=start_time,
+                end_time=end_time,
+            )
+
+        for (
+            template_pk,
+            name,
+            weekday,
+            start_time,
+            end_time,
+            week_index,
+        ) in self.attendance_templates:
+            first_date = _get_next_occurrence(week_index, weekday)
+            until_date = None
+            excluded_dates = []
+            for period_start, period_end in self.exemption_periods:
+                if period_end == datetime.date.max:
+                    until_date = period_start - datetime.timedelta(days=1)
+                    break
+                excluded_dates.extend(
+                    _get_occurrences(first_date, period_start, period_end)
+                )
+            if until_date is not None and until_date < first_date:
+                # Exempt from the first occurrence on
+                continue
+
+            # Shifts of the slot that the user doesn't attend this time or is exempt from
+            excluded_start_times = [
+                attendance[3]
+                for attendance in self.attendances
+                if attendance[5] == template_pk
+                and attendance[1] not in ShiftAttendance.VALID_STATES
+            ] + [_make_aware(date, start_time) for date in excluded_dates]
+            recurrence_rule = "FREQ=WEEKLY;INTERVAL=4"
+            if until_date is not None:
+                # UNTIL is given in UTC when DTSTART has a time zone
+                recurrence_rule += ";UNTIL=" + _format_utc(
+                    _make_aware(
+                        _get_occurrences(first_date, first_date, until_date)[-1],
+                        start_time,
+                    )
+                )
+            yield from _get_event_lines(
+                uid="shifttemplate-%d-user-%d" % (template_pk, self.user_pk),
+                summary=name,
+                start_time=_make_aware(first_date, start_time),
+                end_time=_make_aware(first_date, end_time),
+                recurrence_rule=recurrence_rule,
+                excluded_start_times=sorted(excluded_start_times),
+            )
+        yield from _get_calendar_end_lines()
+
+
+def get_all_shifts_lines():
+    """Generate the lines of the coordinator feed, iterating over the shifts in chunks instead of loading them all."""
+    yield from _get_calendar_start_lines()
+    shifts = (
+        Shift.objects.filter(start_time__gte=_get_feed_start())
+        .order_by("start_time", "pk")
+        .values_list(
+            "pk", "name", "start_time", "end_time", "num_slots", "free_slot_count"
+        )
+    )
+    for pk, name, start_time, end_time, num_slots, free_slot_count in shifts.iterator(
+        chunk_size=1000
+    ):
+        yield from _get_all_shifts_event_lines(
+            "shift-%d" % pk, name, start_time, end_time, num_slots, free_slot_count
+        )
+
+    if virtual.is_enabled():
+        today = timezone.localdate()
+        for shift in virtual.get_shifts(
+            today, today + datetime.timedelta(days=virtual.HORIZON_DAYS - 1)
+        ):
+            if shift.is_virtual():
+                yield from _get_all_shifts_event_lines(
+                    "shifttemplate-%d-%s"
+                    % (shift.shift_template_id, shift.start_time_local_date()),
+                    shift.name,
+                    shift.start_time,
+                    shift.end_time,
+                    shift.num_slots,
+                    shift.free_slot_count,
+                )
+    yield from _get_calendar_end_lines()
+
+
+def _get_all_shifts_event_lines(
+    uid, name, start_time, end_time, num_slots, free_slot_count
+):
+    return _get_event_lines(
+        uid=uid,
+        summary="%s (%d/%d)" % (name, num_slots - free_slot_count, num_slots),
+        start_time=start_time,
+        end_time=end_time,
+    )
+
+
+def _get_feed_start() -> datetime.datetime:
+    return timezone.now() - datetime.timedelta(days=PAST_DAYS)
+
+
+def _get_next_occurrence(week_index: int, weekday: int) -> datetime.date:
+    date = timezone.localdate()
+    while (
+        ShiftTemplateGroup.get_week_index(date) != week_index
+        or date.weekday() != weekday
+    ):
+        date += datetime.timedelta(days=1)
+    return date
+
+
+def _make_aware(date: datetime.date, time: datetime.time) -> datetime.datetime:
+    return timezone.make_aware(datetime.datetime.combine(date, time))
+
+
+def _get_occurrences(
+    first_date: datetime.date, start_date: datetime.date, end_date: datetime.date
+):
+    """The dates between start_date and end_date (inclusive) of a recurring event that first occurs on first_date."""
+    date = first_date
+    if start_date > first_date:
+        date += (
+            -((first_date - start_date) // RECURRENCE_INTERVAL) * RECURRENCE_INTERVAL
+        )
+    dates = []
+    while date <= end_date:
+        dates.append(date)
+        date += RECURRENCE_INTERVAL
+    return dates
+
+
+def _get_calendar_start_lines():
+    yield _line("BEGIN:VCALENDAR")
+    yield _line("VERSION:2.0")
+    yield _line("PRODID:-//Tapir//Shifts//EN")
+    yield _line("CALSCALE:GREGORIAN")
+    yield _line("X-WR-CALNAME:" + _escape("Tapir shifts"))
+    yield _line("X-WR-TIMEZONE:" + settings.TIME_ZONE)
+    for content in _get_timezone_contents(
+        settings.TIME_ZONE, timezone.localdate().year - 1
+    ):
+        yield _line(content)
+
+
+@functools.lru_cache()
+def _get_timezone_contents(time_zone: str, year: int):
+    """The content lines of the VTIMEZONE of the local time zone, which the TZIDs of the recurring events refer to.
+
+    The daylight saving time changes of the given year are repeated yearly. The year is the one before the feed
+    starts, so that every event of the feed is after the first change. time_zone is only part of the cache key."""
+    contents = ["BEGIN:VTIMEZONE", "TZID:" + time_zone]
+    transitions = _get_timezone_transitions(year)
+    if not transitions:
+        local_time = timezone.localtime(
+            datetime.datetime(year, 1, 1, tzinfo=datetime.timezone.utc)
+        )
+        offset = _format_offset(local_time.utcoffset())
+        contents += [
+            "BEGIN:STANDARD",
+            "DTSTART:%d0101T000000" % year,
+            "TZOFFSETFROM:" + offset,
+            "TZOFFSETTO:" + offset,
+            "TZNAME:" + local_time.tzname(),
+            "END:STANDARD",
+        ]
+    for before, after in transitions:
+        # The wall clock time at which the change happens, before it is turned
+        change_time = after.replace(tzinfo=None) - (
+            after.utcoffset() - before.utcoffset()
+        )
+        if change_time.day + 7 > calendar.monthrange(year, change_time.month)[1]:
+            week = -1
+        else:
+            week = (change_time.day - 1) // 7 + 1
+        component = "DAYLIGHT" if after.dst() else "STANDARD"
+        contents += [
+            "BEGIN:" + component,
+            "DTSTART:" + change_time.strftime("%Y%m%dT%H%M%S"),
+            "TZOFFSETFROM:" + _format_offset(before.utcoffset()),
+            "TZOFFSETTO:" + _format_offset(after.utcoffset()),
+            "TZNAME:" + after.tzname(),
+            "RRULE:FREQ=YEARLY;BYMONTH=%d;BYDAY=%d%s"
+            % (change_time.month, week, WEEKDAY_CODES[change_time.weekday()]),
+            "END:" + component,
+        ]
+    contents.append("END:VTIMEZONE")
+    return contents
+
+
+def _get_timezone_transitions(year: int):
+    """Return the changes of the UTC offset of the local time zone in the year, as pairs of the local times just before
+    and at the change."""
+    transitions = []
+    moment = datetime.datetime(year, 1, 1, tzinfo=datetime.timezone.utc)
+    end = datetime.datetime(year + 1, 1, 1, tzinfo=datetime.timezone.utc)
+    while moment < end:
+        next_moment = moment + datetime.timedelta(days=1)
+        if (
+            timezone.localtime(moment).utcoffset()
+            != timezone.localtime(next_moment).utcoffset()
+        ):
+            # Narrow the change down to the minute
+            low, high = moment, next_moment
+            while high - low > datetime.timedelta(minutes=1):
+                middle = low + (high - low) / 2
+                if (
+                    timezone.localtime(middle).utcoffset()
+                    == timezone.localtime(low).utcoffset()
+                ):
+                    low = middle
+                else:
+                    high = middle
+            high = high.replace(second=0, microsecond=0)
+            transitions.append(
+                (
+                    timezone.localtime(high - datetime.timedelta(minutes=1)),
+                    timezone.localtime(high),
+                )
+            )
+        moment = next_moment
+    return transitions
+
+
+def _format_offset(offset: datetime.timedelta) -> str:
+    minutes = int(offset.total_seconds()) // 60
+    return "%s%02d%02d" % (
+        "-" if minutes < 0 else "+",
+        abs(minutes) // 60,
+        abs(minutes) % 60,
+    )
+
+
+def _get_calendar_end_lines():
+    yield _line("END:VCALENDAR")
+
+
+def _get_event_lines(
+    uid,
+    summary,
+    start_time,
+    end_time,
+    recurrence_rule=None,
+    excluded_start_times=(),
+):
+    yield _line("BEGIN:VEVENT")
+    yield _line("UID:%s@%s" % (uid, _get_domain()))
+    yield _line("DTSTAMP:" + _format_utc(timezone.now()))
+    if recurrence_rule:
+        # Recurring events are anchored in local time, so that they follow the daylight saving time changes
+        yield _line(
+            "DTSTART;TZID=%s:%s" % (settings.TIME_ZONE, _format_local(start_time))
+        )
+        yield _line("DTEND;TZID=%s:%s" % (settings.TIME_ZONE, _format_local(end_time)))
+        yield _line("RRULE:" + recurrence_rule)
+        for excluded_start_time in excluded_start_times:
+            yield _line(
+                "EXDATE;TZID=%s:%s"
+                % (settings.TIME_ZONE, _format_local(excluded_start_time))
+            )
+    else:
+        yield _line("DTSTART:" + _format_utc(start_time))
+        yield _line("DTEND:" + _format_utc(end_time))
+    yield _line("SUMMARY:" + _escape(summary))
+    yield _line("END:VEVENT")
+
+
+def _get_domain():
+    return settings.SITE_URL.split("://")[-1].split(":")[0].split("/")[0]
+
+
+def _format_utc(value: datetime.datetime) -> str:
+    return value.astimezone(datetime.timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def _format_local(value: datetime.datetime) -> str:
+    return timezone.localtime(value).strftime("%Y%m%dT%H%M%S")
+
+
+def _escape(text: str) -> str:
+    return (
+        text.replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\n", "\\n")
+    )
+
+
+def _line(content: str) -> str:
+    """Fold the content line to at most 75 octets per line as required by RFC 5545."""
+    folded = []
+    line = ""
+    for character in content:
+        if len((line + character).encode()) > 75:
+            folded.append(line)
+            line = " "
+        line += character
+    folded.append(line)
+    return CRLF.join(folded) + CRLF
@@ -0,0 +1,100 @@
+"""Point-in-time shift account balances.
+
+The balance of a user as of a date is the sum of the values of all their ShiftAccountEntries dated up to that date.
+Instead of summing the whole history, the latest ShiftAccountBalanceSnapshot before the date is used and only the
+entries after it are added."""
+import datetime
+
+from django.db import transaction
+from django.db.models import (
+    F,
+    OuterRef,
+    Subquery,
+    Sum,
+    Value,
+    Window,
+    IntegerField,
+    DateTimeField,
+)
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from tapir.accounts.models import TapirUser
+from tapir.shifts.models import (
+    ShiftAccountBalanceSnapshot,
+    ShiftAccountEntry,
+    ShiftUserData,
+)
+
+# Used as the snapshot date of users without a snapshot, before any entry
+_BEGINNING_OF_TIME = timezone.make_aware(datetime.datetime(1970, 1, 1))
+
+
+def get_balances_as_of(date: datetime.datetime):
+    """ShiftUserData of all users, annotated with their account "balance" as of the date, in a single query."""
+    snapshots = ShiftAccountBalanceSnapshot.objects.filter(
+        user=OuterRef("user"), date__lte=date
+    ).order_by("-date")
+    entries_after_snapshot = (
+        ShiftAccountEntry.objects.filter(
+            user=OuterRef("user"),
+            date__gt=OuterRef("snapshot_date"),
+            date__lte=date,
+        )
+        .order_by()
+        .values("user")
+        .annotate(total=Sum("value"))
+        .values("total")
+    )
+    return ShiftUserData.objects.annotate(
+        snapshot_date=Coalesce(
+            Subquery(snapshots.values("date")[:1]),
+            Value(_BEGINNING_OF_TIME, output_field=DateTimeField()),
+        ),
+        snapshot_balance=Coalesce(
+            Subquery(snapshots.values("balance")[:1], output_field=IntegerField()),
+            0,
+        ),
+        balance=F("snapshot_balance")
+        + Coalesce(Subquery(entries_after_snapshot, output_field=IntegerField()), 0),
+    )
+
+
+def get_balance_as_of(user: TapirUser, date: datetime.datetime) -> int:
+    return get_balances_as_of(date).get(user=user).balance
+
+
+def get_balance_series(user: TapirUser, since: datetime.datetime = None):
+    """Return the user's ShiftAccountEntries in booking order, each with the running "balance" after it.
+
+    The running balance is computed by a window function over the entries. With since, only the entries after it are
+    loaded and the series starts from the balance as of since."""
+    entries = ShiftAccountEntry.objects.filter(user=user)
+    start_balance = 0
+    if since is not None:
+        entries = entries.filter(date__gt=since)
+        start_balance = get_balance_as_of(user, since)
+
+    entries = entries.annotate(
+        running_balance=Window(
+            expression=Sum("value"), order_by=[F("date").asc(), F("pk").asc()]
+        )
+    ).order_by("date", "pk")
+    for entry in entries:
+        entry.balance = start_balance + entry.running_balance
+    return list(entries)
+
+
+@transaction.atomic
+def create_snapshots(date: datetime.datetime) -> int:
+    """Snapshot the balances of all users as of the date and return the number of snapshots created.
+
+    Existing snapshots for the date are kept."""
+    snapshots = [
+        ShiftAccountBalanceSnapshot(user_id=user_pk, date=date, balance=balance)
+        for user_pk, balance in get_balances_as_of(date).values_list("user", "balance")
+    ]
+    ShiftAccountBalanceSnapshot.objects.bulk_create(
+        snapshots, batch_size=1000, ignore_conflicts=True
+    )
+    return len(snapshots)
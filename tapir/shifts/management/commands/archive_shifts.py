@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from tapir.shifts.archive import (
+    archive_shifts,
+    get_archivable_shifts,
+    ARCHIVE_BATCH_SIZE,
+)
+
+
+class Command(BaseCommand):
+    help = "Move closed-out shifts older than the given number of years and their attendances to the archive tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--years", type=int, default=2)
+        parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE)
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report the number of shifts that would be archived",
+        )
+
+    def handle(self, *args, **options):
+        now = timezone.localtime()
+        try:
+            before = now.replace(year=now.year - options["years"])
+        except ValueError:
+            # February 29th
+            before = now.replace(year=now.year - options["years"], day=28)
+
+        if options["dry_run"]:
+            self.stdout.write(
+                "%d shifts started before %s and are closed out"
+                % (get_archivable_shifts(before).count(), before.date())
+            )
+            return
+        self.stdout.write(str(archive_shifts(before, options["batch_size"])))
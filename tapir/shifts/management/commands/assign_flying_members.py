@@ -0,0 +1,60 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from tapir.shifts.flying import compute_proposal, DEFAULT_MAX_ASSIGNMENTS_PER_MEMBER
+
+
+class Command(BaseCommand):
+    help = "Propose flying members for the free slots of the upcoming shifts and optionally register them"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--start-date",
+            type=datetime.date.fromisoformat,
+            help="First day of the shifts to fill (YYYY-MM-DD), defaults to tomorrow",
+        )
+        parser.add_argument(
+            "--end-date",
+            type=datetime.date.fromisoformat,
+            help="Last day of the shifts to fill (YYYY-MM-DD), defaults to four weeks after the start date",
+        )
+        parser.add_argument(
+            "--max-assignments-per-member",
+            type=int,
+            default=DEFAULT_MAX_ASSIGNMENTS_PER_MEMBER,
+        )
+        parser.add_argument(
+            "--apply",
+            action="store_true",
+            help="Register the members instead of only reporting the proposal",
+        )
+
+    def handle(self, *args, **options):
+        start_date = options["start_date"] or timezone.localdate() + datetime.timedelta(
+            days=1
+        )
+        end_date = options["end_date"] or start_date + datetime.timedelta(days=27)
+
+        proposal = compute_proposal(
+            start_date, end_date, options["max_assignments_per_member"]
+        )
+        for assignment in proposal.assignments:
+            self.stdout.write(
+                "%s %s: user %d"
+                % (
+                    timezone.localtime(assignment.shift.start_time).strftime(
+                        "%Y-%m-%d %H:%M"
+                    ),
+                    assignment.shift.name,
+                    assignment.user_pk,
+                )
+            )
+        self.stdout.write(
+            "Proposed %d assignments, %d slots remain free"
+            % (len(proposal.assignments), proposal.unfilled_slot_count)
+        )
+
+        if options["apply"]:
+            self.stdout.write("Registered %d members" % proposal.apply())
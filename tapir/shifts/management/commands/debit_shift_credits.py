@@ -0,0 +1,29 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from tapir.shifts.debit import debit_shift_credits
+from tapir.shifts.management.commands.generate_shifts import parse_date
+from tapir.shifts.models import ShiftTemplateGroup
+
+
+class Command(BaseCommand):
+    help = (
+        "Debit every member one shift credit for the current ABCD cycle. Safe to run repeatedly, for example daily, "
+        "each member is only debited once per cycle"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--date",
+            type=parse_date,
+            help="A day of the cycle to debit (YYYY-MM-DD), defaults to today",
+        )
+
+    def handle(self, *args, **options):
+        date = options["date"] or datetime.date.today()
+        entry_count = debit_shift_credits(date)
+        self.stdout.write(
+            "Debited %d members for the cycle starting on %s"
+            % (entry_count, ShiftTemplateGroup.get_cycle_start_date(date))
+        )
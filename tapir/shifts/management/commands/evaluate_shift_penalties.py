@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from tapir.shifts.penalties import evaluate_penalties, apply_penalty_statuses
+
+
+class Command(BaseCommand):
+    help = "Evaluate the shift penalty rules for all members and store the changed penalty statuses"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report the status changes without storing them",
+        )
+
+    def handle(self, *args, **options):
+        evaluations = evaluate_penalties()
+        for evaluation in evaluations:
+            if evaluation.is_changed():
+                self.stdout.write(
+                    "User %d: %s -> %s"
+                    % (
+                        evaluation.user_id,
+                        evaluation.previous_status or "-",
+                        evaluation.status or "-",
+                    )
+                )
+
+        if options["dry_run"]:
+            return
+        changed_count = apply_penalty_statuses(evaluations)
+        self.stdout.write("Changed the penalty status of %d members" % changed_count)
@@ -0,0 +1,28 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from tapir.shifts.management.commands.generate_shifts import parse_date
+from tapir.shifts.models import ShiftCycleDay
+
+
+class Command(BaseCommand):
+    help = "Extend the ABCD cycle calendar (ShiftCycleDay) forward, by default to two years from today"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--end_date",
+            type=parse_date,
+            help="Last day the calendar should contain (YYYY-MM-DD)",
+        )
+
+    def handle(self, *args, **options):
+        end_date = options["end_date"] or datetime.date.today() + datetime.timedelta(
+            days=2 * 365
+        )
+        days_added = ShiftCycleDay.extend_calendar(end_date)
+        ShiftCycleDay.update_groups()
+        self.stdout.write(
+            "Added %d days to the ABCD cycle calendar, which now ends on %s"
+            % (days_added, max(end_date, ShiftCycleDay.objects.latest("date").date))
+        )
@@ -0,0 +1,42 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from tapir.shifts.generation import generate_shifts
+
+
+def parse_date(value: str) -> datetime.date:
+    return datetime.datetime.strptime(value, "%Y-%m-%d").date()
+
+
+class Command(BaseCommand):
+    help = "Generate the shifts of all ShiftTemplateGroups for a date range (one year from today by default)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--start_date",
+            type=parse_date,
+            help="First day to generate shifts for (YYYY-MM-DD), defaults to today",
+        )
+        parser.add_argument(
+            "--end_date",
+            type=parse_date,
+            help="Last day to generate shifts for (YYYY-MM-DD), defaults to one year after the start date",
+        )
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=1,
+            help="Number of worker processes to split the date range across (PostgreSQL only)",
+        )
+
+    def handle(self, *args, **options):
+        start_date = options["start_date"] or datetime.date.today()
+        end_date = options["end_date"] or start_date + datetime.timedelta(days=365)
+
+        result = generate_shifts(
+            start_date=start_date, end_date=end_date, processes=options["processes"]
+        )
+        self.stdout.write(
+            "Generated shifts from %s to %s: %s" % (start_date, end_date, result)
+        )
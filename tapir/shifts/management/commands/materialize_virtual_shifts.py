@@ -0,0 +1,25 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from tapir.shifts import virtual
+from tapir.shifts.management.commands.generate_shifts import parse_date
+
+
+class Command(BaseCommand):
+    help = (
+        "Store the virtual shifts of a day with the attendances from their templates, so that they can still be "
+        "closed out once the day has passed. Safe to run repeatedly, for example daily"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--date",
+            type=parse_date,
+            help="The day to store the shifts of (YYYY-MM-DD), defaults to today",
+        )
+
+    def handle(self, *args, **options):
+        date = options["date"] or datetime.date.today()
+        shifts = virtual.materialize_shifts(date, date)
+        self.stdout.write("Stored %d shifts on %s" % (len(shifts), date))
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from tapir.shifts.propagation import process_propagation_jobs
+
+
+class Command(BaseCommand):
+    help = "Worker propagating ShiftTemplate changes to the already-generated future shifts"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            help="Process the queued jobs and exit instead of polling the queue",
+            action="store_true",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=5,
+            help="Seconds to wait between polling the queue (default: 5)",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            processed_jobs = process_propagation_jobs()
+            if processed_jobs:
+                self.stdout.write("Processed %d propagation jobs" % processed_jobs)
+            if options["once"]:
+                break
+            time.sleep(options["interval"])
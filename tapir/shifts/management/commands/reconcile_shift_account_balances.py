@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from tapir.shifts.models import ShiftUserData
+
+
+class Command(BaseCommand):
+    help = "Recompute the stored shift account balances of all users and report how many were wrong"
+
+    def handle(self, *args, **options):
+        wrong_balance_count = ShiftUserData.objects.with_wrong_account_balance().count()
+        ShiftUserData.objects.update_account_balances()
+        self.stdout.write(
+            "Repaired the shift account balances of %d users" % wrong_balance_count
+        )
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from tapir.shifts.models import Shift
+
+
+class Command(BaseCommand):
+    help = "Recompute the denormalized attendance counts of all shifts and report how many were wrong"
+
+    def handle(self, *args, **options):
+        miscounted_shift_count = Shift.objects.with_miscounted_attendances().count()
+        Shift.objects.update_attendance_counts()
+        self.stdout.write(
+            "Repaired the attendance counts of %d shifts" % miscounted_shift_count
+        )
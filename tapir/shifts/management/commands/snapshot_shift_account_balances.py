@@ -0,0 +1,32 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from tapir.shifts import ledger
+from tapir.shifts.management.commands.generate_shifts import parse_date
+
+
+class Command(BaseCommand):
+    help = (
+        "Snapshot the shift account balances of all users as of the start of a day (today by default), so that "
+        "balances as of later dates only have to sum the entries after it"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--date",
+            type=parse_date,
+            help="Day to snapshot the balances at the start of (YYYY-MM-DD)",
+        )
+
+    def handle(self, *args, **options):
+        date = timezone.make_aware(
+            datetime.datetime.combine(
+                options["date"] or datetime.date.today(), datetime.time.min
+            )
+        )
+        snapshot_count = ledger.create_snapshots(date)
+        self.stdout.write(
+            "Snapshotted the balances of %d users as of %s" % (snapshot_count, date)
+        )
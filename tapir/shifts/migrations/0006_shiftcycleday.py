@@ -0,0 +1,45 @@
+# Generated by Django 3.1.14 on 2026-10-18 03:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shifts", "0005_shifttemplatepropagationjob"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ShiftCycleDay",
+            fields=[
+                ("date", models.DateField(primary_key=True, serialize=False)),
+                ("week_index", models.IntegerField(db_index=True)),
+                (
+                    "weekday",
+                    models.IntegerField(
+                        choices=[
+                            (0, "Monday"),
+                            (1, "Tuesday"),
+                            (2, "Wednesday"),
+                            (3, "Thursday"),
+                            (4, "Friday"),
+                            (5, "Saturday"),
+                            (6, "Sunday"),
+                        ]
+                    ),
+                ),
+                (
+                    "group",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="cycle_days",
+                        to="shifts.shifttemplategroup",
+                    ),
+                ),
+            ],
+        ),
+    ]
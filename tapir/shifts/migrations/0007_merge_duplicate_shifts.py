@@ -0,0 +1,76 @@
+# Generated by Django 3.1.14 on 2026-10-18 03:08
+
+from django.db import migrations, models
+
+
+def merge_duplicate_shifts(apps, schema_editor):
+    """Merge shifts generated twice from the same template into the oldest one."""
+    Shift = apps.get_model("shifts", "Shift")
+    ShiftAttendance = apps.get_model("shifts", "ShiftAttendance")
+
+    duplicates = (
+        Shift.objects.filter(shift_template__isnull=False)
+        .values("shift_template", "start_time")
+        .annotate(count=models.Count("id"), kept_pk=models.Min("id"))
+        .filter(count__gt=1)
+    )
+    for duplicate in duplicates:
+        kept_shift = Shift.objects.get(pk=duplicate["kept_pk"])
+        duplicate_shifts = Shift.objects.filter(
+            shift_template=duplicate["shift_template"],
+            start_time=duplicate["start_time"],
+        ).exclude(pk=kept_shift.pk)
+
+        kept_user_pks = set(kept_shift.attendances.values_list("user", flat=True))
+        for attendance in ShiftAttendance.objects.filter(shift__in=duplicate_shifts):
+            if (
+                attendance.user_id in kept_user_pks
+                and attendance.account_entry_id is None
+            ):
+                attendance.delete()
+                continue
+            attendance.shift = kept_shift
+            attendance.save()
+            kept_user_pks.add(attendance.user_id)
+        duplicate_shifts.delete()
+
+
+def merge_duplicate_attendances(apps, schema_editor):
+    """Keep one attendance per shift and user, preferring the one with an account entry, then a valid one.
+
+    Duplicates were created when shift generation raced with other writers of the same shift. The other attendances
+    are deleted, except those with an account entry."""
+    ShiftAttendance = apps.get_model("shifts", "ShiftAttendance")
+
+    duplicates = (
+        ShiftAttendance.objects.values("shift", "user")
+        .annotate(count=models.Count("id"))
+        .filter(count__gt=1)
+    )
+    for duplicate in duplicates:
+        attendances = sorted(
+            ShiftAttendance.objects.filter(
+                shift=duplicate["shift"], user=duplicate["user"]
+            ),
+            # ShiftAttendance.VALID_STATES: pending and done
+            key=lambda attendance: (
+                attendance.account_entry_id is None,
+                attendance.state not in [1, 2],
+                attendance.pk,
+            ),
+        )
+        for attendance in attendances[1:]:
+            if attendance.account_entry_id is None:
+                attendance.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shifts", "0006_shiftcycleday"),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_shifts, migrations.RunPython.noop),
+        migrations.RunPython(merge_duplicate_attendances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 3.1.14 on 2026-10-18 03:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shifts", "0007_merge_duplicate_shifts"),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name="shift",
+            constraint=models.UniqueConstraint(
+                fields=("shift_template", "start_time"),
+                name="unique_shift_template_start_time",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="shiftattendance",
+            constraint=models.UniqueConstraint(
+                fields=("shift", "user"), name="unique_shift_attendance_user"
+            ),
+        ),
+    ]
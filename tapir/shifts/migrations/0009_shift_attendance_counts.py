@@ -0,0 +1,49 @@
+# Generated by Django 3.1.14 on 2026-10-18 03:11
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def count_attendances(apps, schema_editor):
+    Shift = apps.get_model("shifts", "Shift")
+    ShiftAttendance = apps.get_model("shifts", "ShiftAttendance")
+
+    # ShiftAttendance.VALID_STATES: pending and done
+    valid_attendance_count = Coalesce(
+        models.Subquery(
+            ShiftAttendance.objects.filter(
+                shift=models.OuterRef("pk"), state__in=[1, 2]
+            )
+            .order_by()
+            .values("shift")
+            .annotate(count=models.Count("pk"))
+            .values("count"),
+            output_field=models.IntegerField(),
+        ),
+        0,
+    )
+    Shift.objects.update(
+        valid_attendance_count=valid_attendance_count,
+        free_slot_count=models.F("num_slots") - valid_attendance_count,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shifts", "0008_unique_shift_template_start_time"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="shift",
+            name="free_slot_count",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="shift",
+            name="valid_attendance_count",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_attendances, migrations.RunPython.noop),
+    ]
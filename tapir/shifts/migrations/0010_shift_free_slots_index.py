@@ -0,0 +1,21 @@
+# Generated by Django 3.1.14 on 2026-10-18 03:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shifts", "0009_shift_attendance_counts"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="shift",
+            index=models.Index(
+                condition=models.Q(free_slot_count__gt=0),
+                fields=["start_time"],
+                name="shift_free_slots_start_idx",
+            ),
+        ),
+    ]
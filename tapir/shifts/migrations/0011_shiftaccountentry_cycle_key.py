@@ -0,0 +1,25 @@
+# Generated by Django 3.1.14 on 2026-10-18 03:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shifts", "0010_shift_free_slots_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="shiftaccountentry",
+            name="cycle_key",
+            field=models.CharField(blank=True, max_length=32, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name="shiftaccountentry",
+            constraint=models.UniqueConstraint(
+                fields=("user", "cycle_key"),
+                name="unique_shift_account_entry_cycle_key",
+            ),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 3.1.14 on 2026-10-18 03:17
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def compute_account_balances(apps, schema_editor):
+    ShiftUserData = apps.get_model("shifts", "ShiftUserData")
+    ShiftAccountEntry = apps.get_model("shifts", "ShiftAccountEntry")
+
+    ShiftUserData.objects.update(
+        account_balance=Coalesce(
+            models.Subquery(
+                ShiftAccountEntry.objects.filter(user=models.OuterRef("user"))
+                .order_by()
+                .values("user")
+                .annotate(balance=models.Sum("value"))
+                .values("balance"),
+                output_field=models.IntegerField(),
+            ),
+            0,
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shifts", "0011_shiftaccountentry_cycle_key"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="shiftuserdata",
+            name="account_balance",
+            field=models.IntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.RunPython(compute_account_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 3.1.14 on 2026-10-18 03:18
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("shifts", "0012_shiftuserdata_account_balance"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ShiftAccountBalanceSnapshot",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateTimeField()),
+                ("balance", models.IntegerField()),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="shift_account_balance_snapshots",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="shiftaccountbalancesnapshot",
+            constraint=models.UniqueConstraint(
+                fields=("user", "date"),
+                name="unique_shift_account_balance_snapshot_date",
+            ),
+        ),
+    ]
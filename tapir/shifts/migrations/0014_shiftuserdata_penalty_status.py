@@ -0,0 +1,20 @@
+# Generated by Django 3.1.14 on 2026-10-18 03:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shifts", "0013_shiftaccountbalancesnapshot"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="shiftuserdata",
+            name="penalty_status",
+            field=models.CharField(
+                blank=True, db_index=True, default="", editable=False, max_length=32
+            ),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 3.1.14 on 2026-10-18 03:29
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("shifts", "0014_shiftuserdata_penalty_status"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ShiftWaitlistEntry",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created_date", models.DateTimeField(auto_now_add=True)),
+                (
+                    "shift",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="waitlist_entries",
+                        to="shifts.shift",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="shift_waitlist_entries",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["created_date", "pk"],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="shiftwaitlistentry",
+            constraint=models.UniqueConstraint(
+                fields=("shift", "user"), name="unique_shift_waitlist_entry"
+            ),
+        ),
+    ]
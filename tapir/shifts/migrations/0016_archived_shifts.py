@@ -0,0 +1,77 @@
+# Generated by Django 3.1.14 on 2026-10-18 03:34
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("shifts", "0015_shiftwaitlistentry"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedShift",
+            fields=[
+                ("id", models.IntegerField(primary_key=True, serialize=False)),
+                ("shift_template_id", models.IntegerField(blank=True, null=True)),
+                ("name", models.CharField(max_length=255)),
+                ("start_time", models.DateTimeField(db_index=True)),
+                ("end_time", models.DateTimeField()),
+                ("num_slots", models.IntegerField()),
+                ("valid_attendance_count", models.IntegerField()),
+            ],
+        ),
+        migrations.AlterModelOptions(
+            name="shiftattendance",
+            options={},
+        ),
+        migrations.CreateModel(
+            name="ArchivedShiftAttendance",
+            fields=[
+                ("id", models.IntegerField(primary_key=True, serialize=False)),
+                (
+                    "state",
+                    models.IntegerField(
+                        choices=[
+                            (1, "Pending"),
+                            (2, "Done"),
+                            (3, "Cancelled"),
+                            (4, "Missed"),
+                            (5, "Missed Excused"),
+                        ]
+                    ),
+                ),
+                ("excused_reason", models.TextField(blank=True)),
+                (
+                    "account_entry",
+                    models.OneToOneField(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="archived_shift_attendance",
+                        to="shifts.shiftaccountentry",
+                    ),
+                ),
+                (
+                    "shift",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="attendances",
+                        to="shifts.archivedshift",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="archived_shift_attendances",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 3.1.14 on 2026-10-18 03:36
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("shifts", "0016_archived_shifts"),
+    ]
+
+    # The indexes are created before the indexes of the foreign keys they replace are dropped
+    operations = [
+        migrations.AddIndex(
+            model_name="shift",
+            index=models.Index(fields=["start_time"], name="shift_start_time_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="shiftaccountentry",
+            index=models.Index(
+                fields=["user", "date", "value"], name="shift_account_user_date_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="shiftattendance",
+            index=models.Index(
+                fields=["user", "state"], name="shift_attendance_user_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="shiftattendance",
+            index=models.Index(
+                fields=["shift", "state"], name="shift_attendance_shift_idx"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="shiftaccountentry",
+            name="user",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="shift_account_entries",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="shiftattendance",
+            name="shift",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="attendances",
+                to="shifts.shift",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="shiftattendance",
+            name="user",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="shift_attendances",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+    ]
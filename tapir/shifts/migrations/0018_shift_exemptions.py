@@ -0,0 +1,45 @@
+# Generated by Django 3.1.14 on 2026-10-18 03:39
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("shifts", "0017_query_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ShiftExemption",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("start_date", models.DateField(db_index=True)),
+                ("end_date", models.DateField(blank=True, db_index=True, null=True)),
+                ("description", models.CharField(blank=True, max_length=255)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="shift_exemptions",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-start_date"],
+                "abstract": False,
+            },
+        ),
+    ]
@@ -1,13 +1,33 @@
+import bisect
 import datetime
 import math
+import operator
+from collections import defaultdict
+from functools import reduce
 
 from django.contrib.postgres.fields import ArrayField
-from django.db import models
-from django.db.models import Sum
+from django.core import signing
+from django.db import models, transaction
+from django.db.models import (
+    Sum,
+    Max,
+    Count,
+    F,
+    Exists,
+    OuterRef,
+    Prefetch,
+    Subquery,
+    ExpressionWrapper,
+    Q,
+)
+from django.db.models.functions import TruncDate, Coalesce
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.translation import gettext as _
 
 from tapir.accounts.models import TapirUser
+from tapir.shifts import day_cache
+from tapir.utils.models import DurationModelMixin
 
 
 class ShiftTemplateGroup(models.Model):
@@ -23,6 +43,10 @@ class ShiftTemplateGroup(models.Model):
     def __str__(self):
         return "%s: %s" % (self.__class__.__name__, self.name)
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        ShiftCycleDay.update_groups()
+
     def create_shifts(self, start_date: datetime.date):
         if start_date.weekday() != 0:
             raise ValueError("Start date for shift generation must be a Monday")
@@ -46,6 +70,12 @@ class ShiftTemplateGroup(models.Model):
         days_diff = (date - ShiftTemplateGroup.START_OF_ABCD_SYSTEM).days
         return (int(math.floor(days_diff / 7)) % 4) + 1
 
+    @staticmethod
+    def get_cycle_start_date(date: datetime.date) -> datetime.date:
+        """Return the first day (week A, Monday) of the ABCD cycle the date is in."""
+        days_diff = (date - ShiftTemplateGroup.START_OF_ABCD_SYSTEM).days
+        return date - datetime.timedelta(days=days_diff % 28)
+
 
 # TODO(Leon Handreke): There must be a library to supply this
 WEEKDAY_CHOICES = [
@@ -59,6 +89,201 @@ WEEKDAY_CHOICES = [
 ]
 
 
+class ShiftCycleDay(models.Model):
+    """ShiftCycleDay maps a date to its position in the ABCD system.
+
+    This is a materialized version of ShiftTemplateGroup.get_week_index() that can be joined on in SQL, for example to
+    get all shifts in week C or all Mondays of group B in a year without loading rows into Python. The calendar is
+    extended forward with the extend_shift_cycle_calendar command."""
+
+    date = models.DateField(primary_key=True)
+    week_index = models.IntegerField(db_index=True)
+    weekday = models.IntegerField(choices=WEEKDAY_CHOICES)
+    group = models.ForeignKey(
+        ShiftTemplateGroup,
+        null=True,
+        blank=True,
+        related_name="cycle_days",
+        on_delete=models.SET_NULL,
+    )
+
+    def __str__(self):
+        return "%s: %s (week %d)" % (
+            self.__class__.__name__,
+            self.date,
+            self.week_index,
+        )
+
+    @classmethod
+    def extend_calendar(cls, end_date: datetime.date) -> int:
+        """Add the days up to end_date (inclusive) to the calendar and return the number of days added."""
+        last_date = cls.objects.aggregate(last_date=Max("date"))["last_date"]
+        day = (
+            last_date + datetime.timedelta(days=1)
+            if last_date
+            else ShiftTemplateGroup.START_OF_ABCD_SYSTEM
+        )
+
+        groups_by_week_index = cls._get_groups_by_week_index()
+        days = []
+        while day <= end_date:
+            week_index = ShiftTemplateGroup.get_week_index(day)
+            days.append(
+                cls(
+                    date=day,
+                    week_index=week_index,
+                    weekday=day.weekday(),
+                    group=groups_by_week_index.get(week_index),
+                )
+            )
+            day += datetime.timedelta(days=1)
+
+        cls.objects.bulk_create(days, batch_size=1000, ignore_conflicts=True)
+        return len(days)
+
+    @classmethod
+    def update_groups(cls):
+        """Update the group of all calendar days, to be called when the ShiftTemplateGroups change."""
+        groups_by_week_index = cls._get_groups_by_week_index()
+        for week_index, group in groups_by_week_index.items():
+            cls.objects.filter(week_index=week_index).exclude(group=group).update(
+                group=group
+            )
+        cls.objects.exclude(week_index__in=groups_by_week_index.keys()).exclude(
+            group=None
+        ).update(group=None)
+
+    @staticmethod
+    def _get_groups_by_week_index():
+        groups_by_week_index = {}
+        for group in ShiftTemplateGroup.objects.order_by("-pk"):
+            groups_by_week_index[group.week_index] = group
+        return groups_by_week_index
+
+
+class ShiftQuerySet(models.QuerySet):
+    def _cycle_days(self):
+        start_time = ExpressionWrapper(
+            OuterRef("start_time"), output_field=models.DateTimeField()
+        )
+        return ShiftCycleDay.objects.filter(date=TruncDate(start_time))
+
+    def with_cycle_position(self):
+        """Annotate the week index and the ShiftTemplateGroup of the day each shift takes place on."""
+        return self.annotate(
+            cycle_week_index=Subquery(self._cycle_days().values("week_index")[:1]),
+            cycle_group=Subquery(self._cycle_days().values("group")[:1]),
+        )
+
+    def in_week_index(self, week_index: int):
+        return self.filter(Exists(self._cycle_days().filter(week_index=week_index)))
+
+    def in_cycle_group(self, group: ShiftTemplateGroup):
+        return self.filter(Exists(self._cycle_days().filter(group=group)))
+
+    def with_free_slots(
+        self,
+        start_date: datetime.date = None,
+        end_date: datetime.date = None,
+        weekdays=None,
+        earliest_start_time: datetime.time = None,
+        latest_end_time: datetime.time = None,
+        group: ShiftTemplateGroup = None,
+    ):
+        """Shifts that have at least one free slot, ordered by start time.
+
+        The date range is inclusive and weekdays are numbered like WEEKDAY_CHOICES. The time window applies to the
+        local time of the shifts. The date range is resolved by the partial index on the start time of the shifts with
+        free slots, the other filters are applied to the rows found in the index."""
+        shifts = self.filter(free_slot_count__gt=0)
+        if start_date is not None:
+            shifts = shifts.filter(
+                start_time__gte=timezone.make_aware(
+                    datetime.datetime.combine(start_date, datetime.time.min)
+                )
+            )
+        if end_date is not None:
+            shifts = shifts.filter(
+                start_time__lt=timezone.make_aware(
+                    datetime.datetime.combine(
+                        end_date + datetime.timedelta(days=1), datetime.time.min
+                    )
+                )
+            )
+        if weekdays:
+            # ISO weekdays start at 1 for Monday
+            shifts = shifts.filter(
+                start_time__iso_week_day__in=[weekday + 1 for weekday in weekdays]
+            )
+        if earliest_start_time is not None:
+            shifts = shifts.filter(start_time__time__gte=earliest_start_time)
+        if latest_end_time is not None:
+            shifts = shifts.filter(end_time__time__lte=latest_end_time)
+        if group is not None:
+            shifts = shifts.filter(shift_template__group=group)
+        return shifts.order_by("start_time")
+
+    def with_valid_attendances(self):
+        """Prefetch the valid attendances of the shifts and their users into Shift.valid_attendances."""
+        return self.prefetch_related(
+            Prefetch(
+                "attendances",
+                queryset=ShiftAttendance.objects.filter(
+                    state__in=ShiftAttendance.VALID_STATES
+                )
+                .select_related("user")
+                .order_by("pk"),
+                to_attr="valid_attendances",
+            )
+        )
+
+    def update_attendance_counts(self) -> int:
+        """Recompute the denormalized attendance counts of the shifts in a single UPDATE.
+
+        Must be called after changing attendances in bulk (bulk_create(), QuerySet.update() or QuerySet.delete()),
+        which bypasses the bookkeeping in ShiftAttendance.save() and ShiftAttendance.delete(). This also invalidates
+        the cached days of the shifts."""
+        day_cache.invalidate_days_of(self.values_list("start_time", flat=True))
+        return self.update(
+            valid_attendance_count=self._valid_attendance_count(),
+            free_slot_count=F("num_slots") - self._valid_attendance_count(),
+        )
+
+    def with_miscounted_attendances(self):
+        return self.annotate(
+            actual_valid_attendance_count=self._valid_attendance_count()
+        ).exclude(valid_attendance_count=F("actual_valid_attendance_count"))
+
+    @staticmethod
+    def _valid_attendance_count():
+        return Coalesce(
+            Subquery(
+                ShiftAttendance.objects.filter(
+                    shift=OuterRef("pk"), state__in=ShiftAttendance.VALID_STATES
+                )
+                .order_by()
+                .values("shift")
+                .annotate(count=Count("pk"))
+                .values("count"),
+                output_field=models.IntegerField(),
+            ),
+            0,
+        )
+
+
+class NumSlotsPropagationResult:
+    def __init__(self, updated_shift_count, overbooked_shifts):
+        self.updated_shift_count = updated_shift_count
+        # Future shifts with more valid attendances than slots
+        self.overbooked_shifts = overbooked_shifts
+
+    def __str__(self):
+        return "Updated the number of slots of %d future shifts, %d are overbooked" % (
+            self.updated_shift_count,
+            len(self.overbooked_shifts),
+        )
+
+
 class ShiftTemplate(models.Model):
     """ShiftTemplate represents a (usually recurring) shift that may be instantiated as a concrete Shift.
 
@@ -89,9 +314,20 @@ class ShiftTemplate(models.Model):
     start_time = models.TimeField(blank=False)
     end_time = models.TimeField(blank=False)
 
-    # TODO(Leon Handreke): Update slots for all future shifts as well when updating?
+    # Changes are applied to the future generated shifts on save, see propagate_num_slots()
     num_slots = models.IntegerField(blank=False, default=3)
 
+    # Number of slots the template was loaded with, to detect changes on save
+    _loaded_num_slots = None
+    # NumSlotsPropagationResult of the last save that changed num_slots
+    num_slots_propagation = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_num_slots = instance.__dict__.get("num_slots")
+        return instance
+
     def __str__(self):
         display_name = "%s: %s %s %s-%s" % (
             self.__class__.__name__,
@@ -127,6 +363,10 @@ class ShiftTemplate(models.Model):
         # timezone here, but store aware dates for sure.
         start_time = datetime.datetime.combine(shift_date, self.start_time)
         end_time = datetime.datetime.combine(shift_date, self.end_time)
+        if timezone.is_naive(start_time):
+            start_time = timezone.make_aware(start_time)
+        if timezone.is_naive(end_time):
+            end_time = timezone.make_aware(end_time)
 
         return Shift(
             shift_template=self,
@@ -137,28 +377,175 @@ class ShiftTemplate(models.Model):
         )
 
     def create_shift(self, start_date: datetime.date):
-        shift = self._generate_shift(start_date=start_date)
+        generated_shift = self._generate_shift(start_date=start_date)
 
-        if Shift.objects.filter(
-            shift_template=self, start_time=shift.start_time
-        ).count():
-            shift = Shift.objects.get(shift_template=self, start_time=shift.start_time)
-        else:
-            shift.save()
+        # Safe against concurrent inserts thanks to the unique constraint on (shift_template, start_time)
+        shift, created = Shift.objects.get_or_create(
+            shift_template=self,
+            start_time=generated_shift.start_time,
+            defaults={
+                "name": generated_shift.name,
+                "end_time": generated_shift.end_time,
+                "num_slots": generated_shift.num_slots,
+            },
+        )
 
         self.update_future_shift_attendances()
 
         return shift
 
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        self.update_future_shift_attendances()
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if (
+                self._loaded_num_slots is not None
+                and self._loaded_num_slots != self.num_slots
+            ):
+                self.num_slots_propagation = self.propagate_num_slots()
+            self._loaded_num_slots = self.num_slots
+            # Rewriting the attendances of the future shifts takes long, so leave it to the propagation worker
+            ShiftTemplatePropagationJob.objects.create(shift_template=self)
+
+    def propagate_num_slots(self):
+        """Set the number of slots of all future generated shifts to the one of the template with a single UPDATE.
+
+        Attendances are never removed: the shifts that now have more valid attendances than slots are returned in the
+        NumSlotsPropagationResult, so that they can be sorted out by hand."""
+        changed_shifts = self.get_future_generated_shifts().exclude(
+            num_slots=self.num_slots
+        )
+        changed_shifts_start_times = list(
+            changed_shifts.values_list("pk", "start_time")
+        )
+        if not changed_shifts_start_times:
+            return NumSlotsPropagationResult(0, [])
 
-    def update_future_shift_attendances(self):
-        for shift in self.generated_shifts.filter(
-            start_time__gt=datetime.datetime.now()
+        changed_shift_pks = [pk for pk, start_time in changed_shifts_start_times]
+        Shift.objects.filter(pk__in=changed_shift_pks).update(
+            num_slots=self.num_slots,
+            free_slot_count=self.num_slots - F("valid_attendance_count"),
+        )
+        day_cache.invalidate_days_of(
+            start_time for pk, start_time in changed_shifts_start_times
+        )
+
+        # Bulk updates bypass Shift.save(), which gives new slots to the waitlist
+        for shift_pk in (
+            ShiftWaitlistEntry.objects.filter(
+                shift__in=changed_shift_pks, shift__free_slot_count__gt=0
+            )
+            .order_by()
+            .values_list("shift", flat=True)
+            .distinct()
         ):
-            shift.update_attendances_from_shift_template()
+            _promote_waitlist(shift_pk)
+
+        return NumSlotsPropagationResult(
+            len(changed_shift_pks),
+            list(
+                Shift.objects.filter(
+                    pk__in=changed_shift_pks, free_slot_count__lt=0
+                ).order_by("start_time")
+            ),
+        )
+
+    def is_propagation_pending(self) -> bool:
+        return self.propagation_jobs.exists()
+
+    def get_future_generated_shifts(self):
+        return self.generated_shifts.filter(start_time__gt=timezone.now())
+
+    def update_future_shift_attendances(self):
+        """Bring the attendances of all future generated shifts in line with the ShiftAttendanceTemplates.
+
+        Members don't get attendances during their ShiftExemptions."""
+        future_shifts = self.get_future_generated_shifts()
+        template_user_pks = set(
+            self.attendance_templates.values_list("user", flat=True)
+        )
+        exemptions = ExemptionCalendar(
+            user_pks=template_user_pks, start_date=timezone.localdate()
+        )
+
+        future_attendances = ShiftAttendance.objects.filter(shift__in=future_shifts)
+        future_attendances.exclude(user__in=template_user_pks).delete()
+        exemptions.filter_attendances(future_attendances).delete()
+        self._create_missing_future_shift_attendances(
+            future_shifts, template_user_pks, exemptions
+        )
+        future_shifts.update_attendance_counts()
+
+    def propagate_attendance_template_changes(
+        self, added_user_pks=(), removed_user_pks=()
+    ):
+        """Apply a change in the ShiftAttendanceTemplates to all future generated shifts.
+
+        Instead of re-checking every attendance of every shift like update_future_shift_attendances(), only the delta is
+        applied: the attendances of the removed users are deleted with one statement and the attendances of the added
+        users are inserted with one bulk_create(). The cost thus scales with the size of the change. The added users
+        may already be in the template, their attendances are then brought in line with their ShiftExemptions."""
+        future_shifts = self.get_future_generated_shifts()
+
+        if removed_user_pks:
+            ShiftAttendance.objects.filter(
+                shift__in=future_shifts, user__in=removed_user_pks
+            ).delete()
+        if added_user_pks:
+            exemptions = ExemptionCalendar(
+                user_pks=added_user_pks, start_date=timezone.localdate()
+            )
+            exemptions.filter_attendances(
+                ShiftAttendance.objects.filter(shift__in=future_shifts)
+            ).delete()
+            self._create_missing_future_shift_attendances(
+                future_shifts, set(added_user_pks), exemptions
+            )
+        if added_user_pks or removed_user_pks:
+            future_shifts.update_attendance_counts()
+
+    def _create_missing_future_shift_attendances(
+        self, future_shifts, user_pks, exemptions
+    ):
+        if not user_pks:
+            return
+
+        existing_attendances = set(
+            ShiftAttendance.objects.filter(
+                shift__in=future_shifts, user__in=user_pks
+            ).values_list("shift_id", "user_id")
+        )
+        ShiftAttendance.objects.bulk_create(
+            [
+                ShiftAttendance(shift_id=shift_pk, user_id=user_pk)
+                for shift_pk, start_time in future_shifts.values_list(
+                    "pk", "start_time"
+                )
+                for user_pk in sorted(user_pks)
+                if (shift_pk, user_pk) not in existing_attendances
+                and not exemptions.is_exempt(
+                    user_pk, timezone.localtime(start_time).date()
+                )
+            ],
+            # Attendances created concurrently, for example by shift generation, are kept
+            ignore_conflicts=True,
+        )
+
+
+class ShiftTemplatePropagationJob(models.Model):
+    """ShiftTemplatePropagationJob represents a pending update of the future shifts generated from a ShiftTemplate.
+
+    Propagating a change of a ShiftTemplate rewrites the attendances of all already-generated future shifts, which is
+    too slow to be done while handling a request. Jobs are therefore queued here and processed by the
+    process_propagation_jobs worker. A job for a user only propagates the change of that user's
+    ShiftAttendanceTemplate, a job without a user resyncs all attendances of the future shifts."""
+
+    shift_template = models.ForeignKey(
+        ShiftTemplate, related_name="propagation_jobs", on_delete=models.CASCADE
+    )
+    user = models.ForeignKey(
+        TapirUser, null=True, blank=True, related_name="+", on_delete=models.CASCADE
+    )
+    created_date = models.DateTimeField(auto_now_add=True)
 
 
 class ShiftAttendanceTemplate(models.Model):
@@ -170,6 +557,123 @@ class ShiftAttendanceTemplate(models.Model):
     )
 
 
+class ShiftExemption(DurationModelMixin, models.Model):
+    """ShiftExemption represents a period in which a member doesn't work shifts, for example a parental or sick leave.
+
+    During the period, the member gets no attendances from their ShiftAttendanceTemplates, isn't assigned to free
+    slots as a flying member and isn't debited for the cycles starting in it. Without end date, the exemption lasts
+    until it is ended."""
+
+    user = models.ForeignKey(
+        TapirUser, related_name="shift_exemptions", on_delete=models.CASCADE
+    )
+    description = models.CharField(blank=True, max_length=255)
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            previous_user_pk = None
+            if not self._state.adding:
+                previous_user_pk = (
+                    ShiftExemption.objects.filter(pk=self.pk)
+                    .values_list("user_id", flat=True)
+                    .first()
+                )
+            super().save(*args, **kwargs)
+            self._enqueue_propagation({self.user_id, previous_user_pk} - {None})
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            self._enqueue_propagation({self.user_id})
+        return result
+
+    @staticmethod
+    def _enqueue_propagation(user_pks):
+        """Queue the update of the future shifts of the templates of the users, see tapir.shifts.propagation."""
+        ShiftTemplatePropagationJob.objects.bulk_create(
+            [
+                ShiftTemplatePropagationJob(
+                    shift_template_id=shift_template_pk, user_id=user_pk
+                )
+                for shift_template_pk, user_pk in ShiftAttendanceTemplate.objects.filter(
+                    user__in=user_pks
+                )
+                .order_by()
+                .values_list("shift_template", "user")
+                .distinct()
+            ]
+        )
+
+
+class ExemptionCalendar:
+    """The ShiftExemptions of a set of users, loaded with a single query, to look up who is exempt on a given date.
+
+    Overlapping exemptions of a user are merged, so that a lookup is a binary search over the user's periods."""
+
+    def __init__(
+        self,
+        user_pks=None,
+        start_date: datetime.date = None,
+        end_date: datetime.date = None,
+    ):
+        exemptions = ShiftExemption.objects.all()
+        if user_pks is not None:
+            exemptions = exemptions.filter(user__in=user_pks)
+        if start_date is not None:
+            exemptions = exemptions.filter(
+                Q(end_date__gte=start_date) | Q(end_date__isnull=True)
+            )
+        if end_date is not None:
+            exemptions = exemptions.filter(start_date__lte=end_date)
+
+        # Maps user pks to their (start_date, end_date) periods in chronological order. Open ends are date.max.
+        self.periods_by_user_pk = defaultdict(list)
+        for user_pk, period_start, period_end in exemptions.order_by(
+            "user", "start_date"
+        ).values_list("user", "start_date", "end_date"):
+            period_end = period_end or datetime.date.max
+            periods = self.periods_by_user_pk[user_pk]
+            if periods and period_start <= periods[-1][1]:
+                periods[-1] = (periods[-1][0], max(periods[-1][1], period_end))
+            else:
+                periods.append((period_start, period_end))
+        self._start_dates_by_user_pk = {
+            user_pk: [period[0] for period in periods]
+            for user_pk, periods in self.periods_by_user_pk.items()
+        }
+
+    def is_exempt(self, user_pk, date: datetime.date) -> bool:
+        start_dates = self._start_dates_by_user_pk.get(user_pk)
+        if not start_dates:
+            return False
+        index = bisect.bisect_right(start_dates, date) - 1
+        return index >= 0 and date <= self.periods_by_user_pk[user_pk][index][1]
+
+    def filter_attendances(self, attendances):
+        """Filter the ShiftAttendances to those of shifts during an exemption of their user."""
+        conditions = []
+        for user_pk, periods in self.periods_by_user_pk.items():
+            for period_start, period_end in periods:
+                condition = Q(
+                    user=user_pk, shift__start_time__gte=start_of_day(period_start)
+                )
+                if period_end != datetime.date.max:
+                    condition &= Q(
+                        shift__start_time__lt=start_of_day(
+                            period_end + datetime.timedelta(days=1)
+                        )
+                    )
+                conditions.append(condition)
+        if not conditions:
+            return attendances.none()
+        return attendances.filter(reduce(operator.or_, conditions))
+
+
+def start_of_day(date: datetime.date) -> datetime.datetime:
+    """The aware datetime at which the date starts in the local time zone."""
+    return timezone.make_aware(datetime.datetime.combine(date, datetime.time.min))
+
+
 class Shift(models.Model):
     # ShiftTemplate that this shift was generated from, may be null for manually-created shifts
     shift_template = models.ForeignKey(
@@ -188,6 +692,31 @@ class Shift(models.Model):
 
     num_slots = models.IntegerField(blank=False, default=3)
 
+    # Denormalized from the attendances so that listing shifts doesn't need a COUNT query per shift. Kept up to date
+    # by ShiftAttendance.save() and ShiftAttendance.delete(), bulk changes must call update_attendance_counts().
+    valid_attendance_count = models.IntegerField(default=0, editable=False)
+    free_slot_count = models.IntegerField(default=0, editable=False)
+
+    objects = ShiftQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["shift_template", "start_time"],
+                name="unique_shift_template_start_time",
+            )
+        ]
+        # The shifts of a template by start time are found with the index of the unique constraint
+        indexes = [
+            models.Index(fields=["start_time"], name="shift_start_time_idx"),
+            # Only covers the shifts that can still be joined, see ShiftQuerySet.with_free_slots()
+            models.Index(
+                fields=["start_time"],
+                condition=Q(free_slot_count__gt=0),
+                name="shift_free_slots_start_idx",
+            ),
+        ]
+
     def __str__(self):
         display_name = "%s: %s %s-%s" % (
             self.__class__.__name__,
@@ -200,7 +729,7 @@ class Shift(models.Model):
 
         display_name = "%s [%d/%d]" % (
             display_name,
-            self.get_valid_attendances().count(),
+            self.valid_attendance_count,
             self.num_slots,
         )
 
@@ -216,18 +745,63 @@ class Shift(models.Model):
 
         display_name = "%s [%d/%d]" % (
             display_name,
-            self.get_valid_attendances().count(),
+            self.valid_attendance_count,
             self.num_slots,
         )
 
         return display_name
 
+    # Start time the shift was loaded with, to invalidate the cached day it is moved away from
+    _loaded_start_time = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_start_time = instance.__dict__.get("start_time")
+        return instance
+
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            self.free_slot_count = self.num_slots - self.valid_attendance_count
+            super().save(*args, **kwargs)
+            return
+
+        # Never write back the attendance counts, they may have been changed concurrently
+        if kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in ["valid_attendance_count", "free_slot_count"]
+            ]
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            Shift.objects.filter(pk=self.pk).update(
+                free_slot_count=F("num_slots") - F("valid_attendance_count")
+            )
+        self.refresh_from_db(fields=["valid_attendance_count", "free_slot_count"])
+        # More slots may have been added
+        if self.free_slot_count > 0:
+            _promote_waitlist(self.pk)
+
     def get_absolute_url(self):
+        if self.is_virtual():
+            return reverse(
+                "shifts:virtual_shift_detail",
+                args=[self.shift_template_id, self.start_time_local_date()],
+            )
         return reverse("shifts:shift_detail", args=[self.pk])
 
+    def is_virtual(self) -> bool:
+        """Virtual shifts are expanded from their ShiftTemplate on the fly and not stored, see tapir.shifts.virtual."""
+        return self.pk is None and self.shift_template_id is not None
+
+    def start_time_local_date(self) -> datetime.date:
+        return timezone.localtime(self.start_time).date()
+
     def get_valid_attendances(self) -> models.QuerySet:
-        return self.attendances.filter(
-            state__in=[ShiftAttendance.State.PENDING, ShiftAttendance.State.DONE]
+        return self.attendances.filter(state__in=ShiftAttendance.VALID_STATES).order_by(
+            "pk"
         )
 
     def update_attendances_from_shift_template(self):
@@ -238,17 +812,27 @@ class Shift(models.Model):
         if not self.shift_template:
             return
 
-        shift_attendance_template_user_pks = (
-            self.shift_template.attendance_templates.values_list("user", flat=True)
+        template_user_pks = set(
+            self.shift_template.attendance_templates.exclude(
+                user__in=ShiftExemption.objects.active_temporal(
+                    self.start_time_local_date()
+                ).values("user")
+            ).values_list("user", flat=True)
         )
 
-        # Remove the attendances that are no longer in the template
-        for attendance in self.attendances.all():
-            if attendance.user.pk not in shift_attendance_template_user_pks:
-                attendance.delete()
-        for user_pk in shift_attendance_template_user_pks:
-            if user_pk not in self.attendances.values_list("user", flat=True):
-                ShiftAttendance.objects.create(shift=self, user=TapirUser(pk=user_pk))
+        # Remove the attendances that are no longer in the template or whose members are exempt
+        self.attendances.exclude(user__in=template_user_pks).delete()
+
+        attending_user_pks = set(self.attendances.values_list("user", flat=True))
+        ShiftAttendance.objects.bulk_create(
+            [
+                ShiftAttendance(shift=self, user_id=user_pk)
+                for user_pk in sorted(template_user_pks - attending_user_pks)
+            ],
+            ignore_conflicts=True,
+        )
+        Shift.objects.filter(pk=self.pk).update_attendance_counts()
+        self.refresh_from_db(fields=["valid_attendance_count", "free_slot_count"])
 
 
 class ShiftAccountEntry(models.Model):
@@ -260,8 +844,12 @@ class ShiftAccountEntry(models.Model):
     balance has been -2 for four weeks (TBD, this is just an example), the cooperator's right to shop will be revoked.
     """
 
+    # Indexed by shift_account_user_date_idx
     user = models.ForeignKey(
-        TapirUser, related_name="shift_account_entries", on_delete=models.PROTECT
+        TapirUser,
+        related_name="shift_account_entries",
+        on_delete=models.PROTECT,
+        db_index=False,
     )
 
     # Value of the transaction, may be negative (for example for missed shifts)
@@ -269,17 +857,113 @@ class ShiftAccountEntry(models.Model):
     # Date the transaction is debited, credited
     date = models.DateTimeField(blank=False)
     description = models.CharField(blank=True, max_length=255)
+    # Identifies the periodic booking this entry was created by, for example the debit of an ABCD cycle (see
+    # tapir.shifts.debit), so that it is never booked twice for the same user. Empty for all other entries.
+    cycle_key = models.CharField(blank=True, null=True, max_length=32)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "cycle_key"],
+                name="unique_shift_account_entry_cycle_key",
+            )
+        ]
+        indexes = [
+            # Includes the value so that balances are summed from the index alone, see tapir.shifts.ledger
+            models.Index(
+                fields=["user", "date", "value"],
+                name="shift_account_user_date_idx",
+            )
+        ]
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            previous = None
+            if not self._state.adding:
+                previous = (
+                    ShiftAccountEntry.objects.filter(pk=self.pk)
+                    .values_list("user_id", "value", "date")
+                    .first()
+                )
+            super().save(*args, **kwargs)
+            if previous is not None:
+                ShiftUserData.objects.filter(user=previous[0]).update(
+                    account_balance=F("account_balance") - previous[1]
+                )
+                ShiftAccountBalanceSnapshot.invalidate([previous[0]], previous[2])
+            ShiftUserData.objects.filter(user=self.user_id).update(
+                account_balance=F("account_balance") + self.value
+            )
+            ShiftAccountBalanceSnapshot.invalidate([self.user_id], self.date)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            # The stored value counts, the instance may have been changed in the meantime
+            stored = (
+                ShiftAccountEntry.objects.filter(pk=self.pk)
+                .values_list("user_id", "value", "date")
+                .first()
+            )
+            result = super().delete(*args, **kwargs)
+            if stored is not None:
+                ShiftUserData.objects.filter(user=stored[0]).update(
+                    account_balance=F("account_balance") - stored[1]
+                )
+                ShiftAccountBalanceSnapshot.invalidate([stored[0]], stored[2])
+        return result
 
 
-class ShiftAttendance(models.Model):
+class ShiftAccountBalanceSnapshot(models.Model):
+    """The account balance of a user as of a point in time, that is the sum of all entries dated up to that time.
+
+    Snapshots are taken periodically so that balances as of arbitrary dates only need to sum the entries after the
+    latest snapshot, see tapir.shifts.ledger. Writing an entry dated at or before a snapshot makes the snapshot wrong,
+    so it is deleted then."""
+
+    user = models.ForeignKey(
+        TapirUser,
+        related_name="shift_account_balance_snapshots",
+        on_delete=models.CASCADE,
+    )
+    date = models.DateTimeField()
+    balance = models.IntegerField()
+
     class Meta:
-        ordering = ["shift__start_time"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "date"],
+                name="unique_shift_account_balance_snapshot_date",
+            )
+        ]
+
+    @staticmethod
+    def invalidate(user_pks, date):
+        """Delete the snapshots of the users that include entries dated at or after the given date."""
+        if isinstance(date, datetime.date) and not isinstance(date, datetime.datetime):
+            date = timezone.make_aware(
+                datetime.datetime.combine(date, datetime.time.min)
+            )
+        ShiftAccountBalanceSnapshot.objects.filter(
+            user__in=user_pks, date__gte=date
+        ).delete()
+
 
+# Marker for attendances loaded without the fields needed to know which shift they are counted in
+_NOT_LOADED = object()
+
+
+class ShiftAttendance(models.Model):
+    # No default ordering, ordering by the start time of the shift would join the shifts into every query
+
+    # Both foreign keys are indexed by the indexes in Meta
     user = models.ForeignKey(
-        TapirUser, related_name="shift_attendances", on_delete=models.PROTECT
+        TapirUser,
+        related_name="shift_attendances",
+        on_delete=models.PROTECT,
+        db_index=False,
     )
     shift = models.ForeignKey(
-        Shift, related_name="attendances", on_delete=models.PROTECT
+        Shift, related_name="attendances", on_delete=models.PROTECT, db_index=False
     )
 
     class State(models.IntegerChoices):
@@ -289,6 +973,11 @@ class ShiftAttendance(models.Model):
         MISSED = 4
         MISSED_EXCUSED = 5
 
+    # States in which the attendance occupies a slot of the shift
+    VALID_STATES = [State.PENDING, State.DONE]
+    # Value of the ShiftAccountEntry booked when an attendance ends in the given state
+    ACCOUNT_ENTRY_VALUES = {State.DONE: 1, State.MISSED: -1}
+
     state = models.IntegerField(choices=State.choices, default=State.PENDING)
 
     # Only filled if state is MISSED_EXCUSED
@@ -302,28 +991,215 @@ class ShiftAttendance(models.Model):
         related_name="shift_attendance",
     )
 
+    class Meta:
+        # A member attends a shift at most once, whatever the state of the attendance
+        constraints = [
+            models.UniqueConstraint(
+                fields=["shift", "user"], name="unique_shift_attendance_user"
+            )
+        ]
+        indexes = [
+            models.Index(fields=["user", "state"], name="shift_attendance_user_idx"),
+            models.Index(fields=["shift", "state"], name="shift_attendance_shift_idx"),
+        ]
+
+    # Shift whose valid_attendance_count this attendance is currently counted in, if any
+    _counted_shift_pk = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if instance.get_deferred_fields() & {"shift_id", "state"}:
+            instance._counted_shift_pk = _NOT_LOADED
+        else:
+            instance._counted_shift_pk = instance._get_counting_shift_pk()
+        return instance
+
+    def _get_counting_shift_pk(self):
+        return self.shift_id if self.state in self.VALID_STATES else None
+
+    # The cached day of the shift is invalidated here rather than by a post_delete receiver, which would keep
+    # QuerySet.delete() from deleting the attendances with a single statement. Bulk changes must call
+    # ShiftQuerySet.update_attendance_counts(), which also invalidates the days.
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            self._load_counted_shift_pk()
+            super().save(*args, **kwargs)
+            self._update_attendance_count(self._get_counting_shift_pk())
+        self._invalidate_day()
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            self._load_counted_shift_pk()
+            result = super().delete(*args, **kwargs)
+            self._update_attendance_count(None)
+        self._invalidate_day()
+        return result
+
+    def _invalidate_day(self):
+        day_cache.invalidate_days_of(
+            Shift.objects.filter(pk=self.shift_id).values_list("start_time", flat=True)
+        )
+
+    def _load_counted_shift_pk(self):
+        if self._counted_shift_pk is not _NOT_LOADED:
+            return
+        stored = ShiftAttendance.objects.get(pk=self.pk)
+        self._counted_shift_pk = stored._get_counting_shift_pk()
+
+    def _update_attendance_count(self, counting_shift_pk):
+        if counting_shift_pk == self._counted_shift_pk:
+            return
+
+        freed_shift_pk = self._counted_shift_pk
+        if freed_shift_pk is not None:
+            Shift.objects.filter(pk=freed_shift_pk).update(
+                valid_attendance_count=F("valid_attendance_count") - 1,
+                free_slot_count=F("free_slot_count") + 1,
+            )
+        if counting_shift_pk is not None:
+            Shift.objects.filter(pk=counting_shift_pk).update(
+                valid_attendance_count=F("valid_attendance_count") + 1,
+                free_slot_count=F("free_slot_count") - 1,
+            )
+        self._counted_shift_pk = counting_shift_pk
+
+        if freed_shift_pk is not None:
+            _promote_waitlist(freed_shift_pk)
+
+    def build_account_entry(self) -> ShiftAccountEntry:
+        """Return the unsaved ShiftAccountEntry booked for the current state, None if the state books nothing."""
+        if self.state not in self.ACCOUNT_ENTRY_VALUES:
+            return None
+        return ShiftAccountEntry(
+            user_id=self.user_id,
+            value=self.ACCOUNT_ENTRY_VALUES[self.state],
+            date=self.shift.start_time.date(),
+        )
+
     def mark_done(self):
         self.state = __class__.State.DONE
-        # TODO(Leon Handreke): The exact scores here should either be a constant or calculated elsewhere?
-        self.account_entry = ShiftAccountEntry.objects.create(
-            user=self.user, value=1, date=self.shift.start_time.date()
-        )
+        self.account_entry = self.build_account_entry()
+        self.account_entry.save()
         self.save()
 
     def mark_missed(self):
         self.state = __class__.State.MISSED
-        # TODO(Leon Handreke): The exact scores here should either be a constant or calculated elsewhere?
-        self.account_entry = ShiftAccountEntry.objects.create(
-            user=self.user, value=-1, date=self.shift.start_time.date()
-        )
+        self.account_entry = self.build_account_entry()
+        self.account_entry.save()
         self.save()
 
 
+class ShiftWaitlistEntry(models.Model):
+    """A user waiting for a slot of a full shift. Users are promoted in the order they joined the waitlist as soon as
+    slots free up, see tapir.shifts.reservation."""
+
+    shift = models.ForeignKey(
+        Shift, related_name="waitlist_entries", on_delete=models.CASCADE
+    )
+    user = models.ForeignKey(
+        TapirUser, related_name="shift_waitlist_entries", on_delete=models.CASCADE
+    )
+    created_date = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["created_date", "pk"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["shift", "user"], name="unique_shift_waitlist_entry"
+            )
+        ]
+
+
+class ArchivedShift(models.Model):
+    """A closed-out Shift moved out of the shifts table by the archive_shifts command, see tapir.shifts.archive.
+
+    Archived shifts keep the primary key they had as Shift, their template is only referenced by its primary key so
+    that templates can still be deleted."""
+
+    id = models.IntegerField(primary_key=True)
+    shift_template_id = models.IntegerField(null=True, blank=True)
+    name = models.CharField(max_length=255)
+    start_time = models.DateTimeField(db_index=True)
+    end_time = models.DateTimeField()
+    num_slots = models.IntegerField()
+    valid_attendance_count = models.IntegerField()
+
+    def __str__(self):
+        return "%s: %s %s" % (self.__class__.__name__, self.name, self.start_time)
+
+
+class ArchivedShiftAttendance(models.Model):
+    """A ShiftAttendance of an ArchivedShift, keeping the primary key it had as ShiftAttendance."""
+
+    id = models.IntegerField(primary_key=True)
+    shift = models.ForeignKey(
+        ArchivedShift, related_name="attendances", on_delete=models.CASCADE
+    )
+    user = models.ForeignKey(
+        TapirUser, related_name="archived_shift_attendances", on_delete=models.PROTECT
+    )
+    state = models.IntegerField(choices=ShiftAttendance.State.choices)
+    excused_reason = models.TextField(blank=True)
+    account_entry = models.OneToOneField(
+        ShiftAccountEntry,
+        null=True,
+        blank=True,
+        on_delete=models.PROTECT,
+        related_name="archived_shift_attendance",
+    )
+
+
+def _promote_waitlist(shift_pk):
+    # The reservation module builds upon the models
+    from tapir.shifts.reservation import promote_waitlist
+
+    promote_waitlist(shift_pk)
+
+
+class ShiftUserDataQuerySet(models.QuerySet):
+    def update_account_balances(self) -> int:
+        """Recompute the account balances from the ShiftAccountEntries in a single UPDATE.
+
+        Must be called after writing entries in bulk, which bypasses ShiftAccountEntry.save() and delete()."""
+        return self.update(account_balance=self._account_balance())
+
+    def with_wrong_account_balance(self):
+        return self.annotate(actual_account_balance=self._account_balance()).exclude(
+            account_balance=F("actual_account_balance")
+        )
+
+    @staticmethod
+    def _account_balance():
+        return Coalesce(
+            Subquery(
+                ShiftAccountEntry.objects.filter(user=OuterRef("user"))
+                .order_by()
+                .values("user")
+                .annotate(balance=Sum("value"))
+                .values("balance"),
+                output_field=models.IntegerField(),
+            ),
+            0,
+        )
+
+
 class ShiftUserData(models.Model):
     user = models.OneToOneField(
         TapirUser, null=False, on_delete=models.PROTECT, related_name="shift_user_data"
     )
 
+    # Sum of the values of the user's ShiftAccountEntries. Kept up to date by ShiftAccountEntry.save() and
+    # ShiftAccountEntry.delete(), bulk changes must call update_account_balances().
+    account_balance = models.IntegerField(default=0, editable=False, db_index=True)
+    # Status of the last of settings.SHIFT_PENALTY_RULES the user matched, empty if none. Written in bulk by the
+    # evaluate_shift_penalties command.
+    penalty_status = models.CharField(
+        max_length=32, blank=True, default="", editable=False, db_index=True
+    )
+
+    objects = ShiftUserDataQuerySet.as_manager()
+
     SHIFT_ATTENDANCE_MODES = [
         ("regular", _("Regular")),
         ("flying", _("Flying")),
@@ -333,17 +1209,25 @@ class ShiftUserData(models.Model):
         max_length=32, choices=SHIFT_ATTENDANCE_MODES, default="regular", blank=False
     )
 
+    # Salt of the signed tokens in the calendar feed URLs, see tapir.shifts.ical
+    CALENDAR_TOKEN_SALT = "tapir.shifts.calendar"
+
+    def get_calendar_token(self) -> str:
+        return signing.Signer(salt=self.CALENDAR_TOKEN_SALT).sign(str(self.user_id))
+
+    @staticmethod
+    def get_user_pk_from_calendar_token(token: str) -> int:
+        """Raises signing.BadSignature if the token is invalid."""
+        return int(signing.Signer(salt=ShiftUserData.CALENDAR_TOKEN_SALT).unsign(token))
+
     def get_upcoming_shift_attendances(self):
+        """The upcoming attendances in stored shifts, see also virtual.get_upcoming_attendances()."""
         return self.user.shift_attendances.filter(
-            shift__start_time__gt=datetime.datetime.now()
-        )
+            shift__start_time__gt=timezone.now()
+        ).order_by("shift__start_time")
 
     def get_account_balance(self):
-        # Might return None if no objects, so "or 0"
-        return (
-            self.user.shift_account_entries.aggregate(balance=Sum("value"))["balance"]
-            or 0
-        )
+        return self.account_balance
 
     def is_balance_ok(self):
         balance = self.get_account_balance()
@@ -363,3 +1247,23 @@ def create_shift_user_data(instance, **kwargs):
 
 
 models.signals.post_save.connect(create_shift_user_data, sender=TapirUser)
+
+
+def invalidate_shift_day(instance: Shift, **kwargs):
+    day_cache.invalidate_days_of([instance.start_time, instance._loaded_start_time])
+
+
+def invalidate_templates(**kwargs):
+    day_cache.invalidate_templates()
+
+
+models.signals.post_save.connect(invalidate_shift_day, sender=Shift)
+models.signals.post_delete.connect(invalidate_shift_day, sender=Shift)
+models.signals.post_save.connect(invalidate_templates, sender=ShiftTemplateGroup)
+models.signals.post_delete.connect(invalidate_templates, sender=ShiftTemplateGroup)
+models.signals.post_save.connect(invalidate_templates, sender=ShiftTemplate)
+models.signals.post_delete.connect(invalidate_templates, sender=ShiftTemplate)
+models.signals.post_save.connect(invalidate_templates, sender=ShiftAttendanceTemplate)
+models.signals.post_delete.connect(invalidate_templates, sender=ShiftAttendanceTemplate)
+models.signals.post_save.connect(invalidate_templates, sender=ShiftExemption)
+models.signals.post_delete.connect(invalidate_templates, sender=ShiftExemption)
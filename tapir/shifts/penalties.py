@@ -0,0 +1,166 @@
+"""Penalties for members whose shift account balance stays negative.
+
+settings.SHIFT_PENALTY_RULES lists rules like "below -1 for 28 days", most severe last. For all members at once, a
+single query computes since when their balance has been continuously below each threshold. A member gets the status
+of the last rule they match."""
+import datetime
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from tapir.shifts.models import ShiftAccountEntry, ShiftUserData
+
+
+class PenaltyEvaluation:
+    def __init__(self, user_id, account_balance, below_since):
+        self.user_id = user_id
+        self.account_balance = account_balance
+        # Maps each threshold to the date since which the balance has been below it, None if it isn't
+        self.below_since = below_since
+        self.rule = None
+        self.previous_status = ""
+
+    def get_below_since_dates(self):
+        """The dates of below_since ordered by threshold, see get_thresholds()."""
+        return [self.below_since[threshold] for threshold in sorted(self.below_since)]
+
+    @property
+    def status(self):
+        return self.rule["status"] if self.rule else ""
+
+    def is_changed(self):
+        return self.status != self.previous_status
+
+
+def get_penalty_rules():
+    return settings.SHIFT_PENALTY_RULES
+
+
+def get_thresholds():
+    return sorted({rule["below"] for rule in get_penalty_rules()})
+
+
+def evaluate_penalties(now: datetime.datetime = None):
+    """Return the PenaltyEvaluations of all members whose balance is below a threshold or who have a penalty status."""
+    now = now or timezone.now()
+    rules = get_penalty_rules()
+    thresholds = get_thresholds()
+
+    evaluations = {
+        evaluation.user_id: evaluation
+        for evaluation in _query_below_since(thresholds, now)
+    }
+    for user_id, penalty_status in ShiftUserData.objects.exclude(
+        penalty_status=""
+    ).values_list("user", "penalty_status"):
+        if user_id not in evaluations:
+            evaluations[user_id] = PenaltyEvaluation(
+                user_id, None, {threshold: None for threshold in thresholds}
+            )
+        evaluations[user_id].previous_status = penalty_status
+
+    for evaluation in evaluations.values():
+        for rule in rules:
+            below_since = evaluation.below_since[rule["below"]]
+            if below_since is not None and now - below_since >= datetime.timedelta(
+                days=rule["days"]
+            ):
+                evaluation.rule = rule
+
+    return sorted(evaluations.values(), key=lambda evaluation: evaluation.user_id)
+
+
+@transaction.atomic
+def apply_penalty_statuses(evaluations) -> int:
+    """Store the changed statuses with one UPDATE per status and return the number of changed members."""
+    user_pks_by_status = {}
+    for evaluation in evaluations:
+        if evaluation.is_changed():
+            user_pks_by_status.setdefault(evaluation.status, []).append(
+                evaluation.user_id
+            )
+    for status, user_pks in user_pks_by_status.items():
+        ShiftUserData.objects.filter(user__in=user_pks).update(penalty_status=status)
+    return sum(len(user_pks) for user_pks in user_pks_by_status.values())
+
+
+def _query_below_since(thresholds, now: datetime.datetime):
+    """Compute since when the balance of each member has been below each threshold in one query.
+
+    The running balance is computed with a window function. For each threshold, the balance has been below it since
+    the first entry after the last entry that left the balance at or above the threshold."""
+    if not thresholds:
+        return []
+
+    opts = ShiftAccountEntry._meta
+    quote_name = connection.ops.quote_name
+    last_ok_columns = []
+    below_since_columns = []
+    params = [connection.ops.adapt_datetimefield_value(now)]
+    for index, threshold in enumerate(thresholds):
+        last_ok_columns.append(
+            "MAX(CASE WHEN balance >= %%s THEN seq END) AS last_ok_%d" % index
+        )
+        below_since_columns.append(
+            "MIN(CASE WHEN running.seq > COALESCE(last_ok.last_ok_{0}, 0) THEN running.date END) "
+            "AS below_since_{0}".format(index)
+        )
+    params += thresholds
+
+    sql = """
+        WITH running AS (
+            SELECT
+                {user} AS user_id,
+                {date} AS date,
+                SUM({value}) OVER (PARTITION BY {user} ORDER BY {date}, {id}) AS balance,
+                ROW_NUMBER() OVER (PARTITION BY {user} ORDER BY {date}, {id}) AS seq,
+                COUNT(*) OVER (PARTITION BY {user}) AS entry_count
+            FROM {table}
+            WHERE {date} <= %s
+        ),
+        last_ok AS (
+            SELECT user_id, {last_ok_columns}
+            FROM running
+            GROUP BY user_id
+        )
+        SELECT
+            running.user_id,
+            MAX(CASE WHEN running.seq = running.entry_count THEN running.balance END),
+            {below_since_columns}
+        FROM running
+        JOIN last_ok ON last_ok.user_id = running.user_id
+        GROUP BY running.user_id
+    """.format(
+        table=quote_name(opts.db_table),
+        user=quote_name(opts.get_field("user").column),
+        date=quote_name(opts.get_field("date").column),
+        value=quote_name(opts.get_field("value").column),
+        id=quote_name(opts.pk.column),
+        last_ok_columns=", ".join(last_ok_columns),
+        below_since_columns=", ".join(below_since_columns),
+    )
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    evaluations = []
+    for row in rows:
+        below_since = {
+            threshold: _to_datetime(value)
+            for threshold, value in zip(thresholds, row[2:])
+        }
+        if any(below_since.values()):
+            evaluations.append(PenaltyEvaluation(row[0], row[1], below_since))
+    return evaluations
+
+
+def _to_datetime(value):
+    """Aggregates over a date column in raw SQL come back as strings on SQLite."""
+    if isinstance(value, str):
+        value = parse_datetime(value)
+        if timezone.is_naive(value):
+            value = timezone.make_aware(value, timezone.utc)
+    return value
@@ -0,0 +1,57 @@
+from django.db import transaction
+
+from tapir.shifts.models import ShiftTemplate, ShiftTemplatePropagationJob
+
+
+def enqueue_attendance_template_change(shift_template: ShiftTemplate, user):
+    ShiftTemplatePropagationJob.objects.create(shift_template=shift_template, user=user)
+
+
+def process_propagation_jobs() -> int:
+    """Process all queued ShiftTemplatePropagationJobs and return the number of jobs done.
+
+    All jobs queued for the same ShiftTemplate are coalesced and applied at once. Jobs are locked with
+    SKIP LOCKED, so several workers can process the queue concurrently."""
+    processed_jobs = 0
+    while True:
+        with transaction.atomic():
+            job = (
+                ShiftTemplatePropagationJob.objects.select_for_update(skip_locked=True)
+                .order_by("created_date", "pk")
+                .first()
+            )
+            if job is None:
+                return processed_jobs
+
+            # Serializes the workers processing the same template
+            shift_template = ShiftTemplate.objects.select_for_update().get(
+                pk=job.shift_template_id
+            )
+            jobs = list(
+                ShiftTemplatePropagationJob.objects.select_for_update(
+                    skip_locked=True
+                ).filter(shift_template=shift_template)
+            )
+            _propagate(shift_template, jobs)
+            ShiftTemplatePropagationJob.objects.filter(
+                pk__in=[j.pk for j in jobs]
+            ).delete()
+            processed_jobs += len(jobs)
+
+
+def _propagate(shift_template: ShiftTemplate, jobs):
+    if any(job.user_id is None for job in jobs):
+        shift_template.update_future_shift_attendances()
+        return
+
+    # Whatever happened in between, the current ShiftAttendanceTemplates are what counts
+    changed_user_pks = {job.user_id for job in jobs}
+    template_user_pks = set(
+        shift_template.attendance_templates.filter(
+            user__in=changed_user_pks
+        ).values_list("user", flat=True)
+    )
+    shift_template.propagate_attendance_template_changes(
+        added_user_pks=template_user_pks,
+        removed_user_pks=changed_user_pks - template_user_pks,
+    )
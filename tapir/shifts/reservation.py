@@ -0,0 +1,78 @@
+"""Registration of users to shifts that never exceeds the number of slots, even under concurrent registrations.
+
+The shift row is locked while its free slots are checked and the attendance is created, so concurrent registrations
+to the same shift are serialized. Users can join the waitlist of a full shift instead, they are promoted as soon as a
+slot frees up."""
+from django.db import transaction
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+from tapir.shifts.eligibility import JoinEligibility, get_join_eligibility
+from tapir.shifts.models import Shift, ShiftAttendance, ShiftWaitlistEntry
+
+SHIFT_FULL = "shift_full"
+
+
+class ReservationError(Exception):
+    """The user can't get a slot of the shift, reason is SHIFT_FULL or one of the JoinEligibility reasons."""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+    def get_message(self):
+        if self.reason == SHIFT_FULL:
+            return _("The shift is full.")
+        return JoinEligibility.REASON_MESSAGES[self.reason]
+
+
+def reserve_slot(user, shift_pk: int, join_waitlist: bool = False):
+    """Create a ShiftAttendance of the user if the shift has a free slot.
+
+    If the shift is full, the user is put on its waitlist if join_waitlist is set and the ShiftWaitlistEntry is
+    returned instead, otherwise ReservationError is raised."""
+    with transaction.atomic():
+        shift = Shift.objects.select_for_update(of=("self",)).get(pk=shift_pk)
+        eligibility = get_join_eligibility(user, shift)
+        if not eligibility.can_join:
+            raise ReservationError(eligibility.reason)
+
+        if shift.free_slot_count > 0:
+            return ShiftAttendance.objects.create(shift=shift, user=user)
+        if not join_waitlist:
+            raise ReservationError(SHIFT_FULL)
+        waitlist_entry, _ = ShiftWaitlistEntry.objects.get_or_create(
+            shift=shift, user=user
+        )
+        return waitlist_entry
+
+
+def promote_waitlist(shift_pk: int) -> list:
+    """Give the free slots of the shift to the users on its waitlist and return the created attendances.
+
+    Users that can't join the shift anymore are removed from the waitlist. Nobody is promoted once the shift started."""
+    if not ShiftWaitlistEntry.objects.filter(shift=shift_pk).exists():
+        return []
+
+    promoted_attendances = []
+    with transaction.atomic():
+        shift = Shift.objects.select_for_update(of=("self",)).get(pk=shift_pk)
+        if shift.start_time <= timezone.now():
+            return []
+
+        waitlist_entries = ShiftWaitlistEntry.objects.filter(
+            shift=shift
+        ).select_related("user")
+        free_slot_count = shift.free_slot_count
+        for waitlist_entry in waitlist_entries:
+            if free_slot_count <= 0:
+                break
+            if get_join_eligibility(waitlist_entry.user, shift).can_join:
+                promoted_attendances.append(
+                    ShiftAttendance.objects.create(
+                        shift=shift, user=waitlist_entry.user
+                    )
+                )
+                free_slot_count -= 1
+            waitlist_entry.delete()
+    return promoted_attendances
@@ -0,0 +1,57 @@
+"""The weekday × start time × ShiftTemplateGroup pivot of the ShiftTemplates shown by ShiftTemplateOverview.
+
+The pivot is built from a single query and only contains plain values. It is cached under the version of the
+templates (see tapir.shifts.day_cache), which changes whenever a ShiftTemplate, ShiftTemplateGroup or
+ShiftAttendanceTemplate changes."""
+from collections import OrderedDict
+
+from django.core.cache import cache
+from django.db.models import Count
+
+from tapir.shifts import day_cache
+from tapir.shifts.models import ShiftTemplate, WEEKDAY_CHOICES
+from tapir.shifts.templatetags.shifts import shift_template_to_block_object
+
+
+def get_template_overview() -> dict:
+    cache_key = "shifts:template_overview:%s" % day_cache.get_templates_version()
+    overview = cache.get(cache_key)
+    if overview is None:
+        overview = build_template_overview()
+        cache.set(cache_key, overview, None)
+    return overview
+
+
+def build_template_overview() -> dict:
+    """Return the names of the groups and, per weekday and start time, the templates of each group by name.
+
+    Each template is represented by its primary key and its block object (see shift_template_to_block_object()),
+    slots of a group without a template of that name are None."""
+    shift_templates = list(
+        ShiftTemplate.objects.filter(weekday__isnull=False, group__isnull=False)
+        .select_related("group")
+        .annotate(attendance_template_count=Count("attendance_templates"))
+        .order_by("start_time", "pk")
+    )
+    group_names = sorted(
+        {shift_template.group.name for shift_template in shift_templates}
+    )
+
+    days = OrderedDict((weekday[1], OrderedDict()) for weekday in WEEKDAY_CHOICES)
+    for shift_template in shift_templates:
+        time_group = days[WEEKDAY_CHOICES[shift_template.weekday][1]].setdefault(
+            str(shift_template.start_time),
+            OrderedDict((group_name, OrderedDict()) for group_name in group_names),
+        )
+        for template_group_group in time_group.values():
+            template_group_group.setdefault(shift_template.name, None)
+        time_group[shift_template.group.name][shift_template.name] = {
+            "pk": shift_template.pk,
+            "block": shift_template_to_block_object(
+                shift_template,
+                fill_parent=False,
+                attendance_template_count=shift_template.attendance_template_count,
+            ),
+        }
+
+    return {"groups": group_names, "days": days}
@@ -1,10 +1,13 @@
 from builtins import enumerate
 
 from django import template
+from django.db.models import Exists, OuterRef
 from django.urls import reverse
 
+from tapir.shifts import virtual
 from tapir.shifts.models import (
     Shift,
+    ShiftAttendance,
     ShiftTemplate,
     ShiftAttendanceTemplate,
     WEEKDAY_CHOICES,
@@ -16,12 +19,31 @@ register = template.Library()
 @register.inclusion_tag("shifts/user_shifts_overview_tag.html", takes_context=True)
 def user_shifts_overview(context, user):
     context["user"] = user
+    if virtual.is_enabled():
+        upcoming_shift_attendances = virtual.get_upcoming_attendances(user)
+    else:
+        upcoming_shift_attendances = list(
+            user.shift_user_data.get_upcoming_shift_attendances().select_related(
+                "shift"
+            )
+        )
+    context["upcoming_shift_attendances"] = upcoming_shift_attendances
+    context["shift_blocks"] = get_shift_block_objects(
+        [attendance.shift for attendance in upcoming_shift_attendances]
+    )
     return context
 
 
 @register.inclusion_tag("shifts/shift_block_tag.html", takes_context=True)
 def shift_block(context, shift: Shift, fill_parent=False):
-    context["shift"] = shift_to_block_object(shift, fill_parent)
+    """Uses the block object from context["shift_blocks"] if the caller preloaded it with get_shift_block_objects()."""
+    shift_blocks = context.get("shift_blocks") or {}
+    if shift.pk in shift_blocks:
+        context["shift"] = dict(
+            shift_blocks[shift.pk], style=_get_block_style(fill_parent)
+        )
+    else:
+        context["shift"] = shift_to_block_object(shift, fill_parent)
     return context
 
 
@@ -31,35 +53,92 @@ def shift_template_block(context, shift_template: ShiftTemplate, fill_parent=Fal
     return context
 
 
+@register.inclusion_tag("shifts/shift_block_tag.html", takes_context=True)
+def timetable_shift_block(context, shift: dict, fill_parent=False):
+    context["shift"] = timetable_shift_to_block_object(shift, fill_parent)
+    return context
+
+
 def shift_to_block_object(shift: Shift, fill_parent: bool):
-    attendances = ["empty" for _ in range(shift.num_slots)]
-    for index, attendance in enumerate(shift.get_valid_attendances()):
-        attendances[index] = "single"
-        if (
+    if shift.is_virtual():
+        # The attendances of a virtual shift all come from its ShiftAttendanceTemplates
+        attendance_is_template = [True for _ in shift.virtual_attendances]
+    else:
+        attendance_is_template = [
             shift.shift_template is not None
             and ShiftAttendanceTemplate.objects.filter(
                 shift_template=shift.shift_template, user=attendance.user
-            ).count()
-            > 0
-        ):
-            attendances[index] = "template"
-
-    template_group = None
+            ).exists()
+            for attendance in shift.get_valid_attendances()
+        ]
+    template_group_name = None
     if shift.shift_template is not None:
-        template_group = template_group_name_to_character(
-            shift.shift_template.group.name
+        template_group_name = shift.shift_template.group.name
+    return _build_shift_block_object(
+        shift, attendance_is_template, template_group_name, fill_parent
+    )
+
+
+def get_shift_block_objects(shifts, fill_parent=False) -> dict:
+    """Return the block objects of the shifts by primary key, using two queries for any number of shifts."""
+    shifts = [shift for shift in shifts if shift.pk is not None]
+    if not shifts:
+        return {}
+
+    template_group_names = dict(
+        ShiftTemplate.objects.filter(
+            pk__in={shift.shift_template_id for shift in shifts}
+        ).values_list("pk", "group__name")
+    )
+
+    attendance_is_template_by_shift_pk = {shift.pk: [] for shift in shifts}
+    for shift_pk, is_template in (
+        ShiftAttendance.objects.filter(
+            shift__in=attendance_is_template_by_shift_pk.keys(),
+            state__in=ShiftAttendance.VALID_STATES,
         )
+        .annotate(
+            is_template=Exists(
+                ShiftAttendanceTemplate.objects.filter(
+                    shift_template=OuterRef("shift__shift_template"),
+                    user=OuterRef("user"),
+                )
+            )
+        )
+        .order_by("pk")
+        .values_list("shift_id", "is_template")
+    ):
+        attendance_is_template_by_shift_pk[shift_pk].append(is_template)
+
+    return {
+        shift.pk: _build_shift_block_object(
+            shift,
+            attendance_is_template_by_shift_pk[shift.pk],
+            template_group_names.get(shift.shift_template_id),
+            fill_parent,
+        )
+        for shift in shifts
+    }
+
+
+def _build_shift_block_object(
+    shift: Shift, attendance_is_template, template_group_name, fill_parent: bool
+):
+    """attendance_is_template tells for each valid attendance whether its user is registered to the template."""
+    attendances = ["empty" for _ in range(shift.num_slots)]
+    for index, is_template in enumerate(attendance_is_template[: shift.num_slots]):
+        attendances[index] = "template" if is_template else "single"
+
+    template_group = None
+    if template_group_name is not None:
+        template_group = template_group_name_to_character(template_group_name)
 
     background = "success"
-    if shift.get_valid_attendances().count() == 0:
+    if shift.valid_attendance_count == 0:
         background = "danger"
-    elif shift.get_valid_attendances().count() < shift.num_slots:
+    elif shift.free_slot_count > 0:
         background = "warning"
 
-    style = ""
-    if fill_parent:
-        style = "height:100%; width: 100%;"
-
     return {
         "attendances": attendances,
         "name": shift.name,
@@ -70,29 +149,73 @@ def shift_to_block_object(shift: Shift, fill_parent: bool):
         "weekday": None,
         "template_group": template_group,
         "background": background,
-        "style": style,
+        "style": _get_block_style(fill_parent),
         "id": shift.id,
         "is_template": False,
     }
 
 
-def shift_template_to_block_object(shift_template: ShiftTemplate, fill_parent: bool):
-    attendances = ["empty" for _ in range(shift_template.num_slots)]
-    attendance_templates = ShiftAttendanceTemplate.objects.filter(
-        shift_template=shift_template
+def _get_block_style(fill_parent: bool) -> str:
+    if fill_parent:
+        return "height:100%; width: 100%;"
+    return ""
+
+
+def timetable_shift_to_block_object(shift: dict, fill_parent: bool):
+    """Like shift_to_block_object(), for a shift of the layout of tapir.shifts.timetable."""
+    single_attendance_count = (
+        shift["valid_attendance_count"] - shift["template_attendance_count"]
+    )
+    attendances = (
+        ["template"] * shift["template_attendance_count"]
+        + ["single"] * single_attendance_count
+        + ["empty"] * shift["free_slot_count"]
     )
-    for index in range(attendance_templates.count()):
-        attendances[index] = "template"
+
+    template_group = None
+    if shift["group"] is not None:
+        template_group = template_group_name_to_character(shift["group"])
 
     background = "success"
-    if attendance_templates.count() == 0:
+    if shift["valid_attendance_count"] == 0:
         background = "danger"
-    elif attendance_templates.count() < shift_template.num_slots:
+    elif shift["free_slot_count"] > 0:
         background = "warning"
 
-    style = ""
-    if fill_parent:
-        style = "height:100%; width: 100%;"
+    return {
+        "attendances": attendances,
+        "name": shift["name"],
+        "num_slots": shift["num_slots"],
+        "start_time": shift["start_time"],
+        "end_time": shift["end_time"],
+        "start_date": shift["start_time"],
+        "weekday": None,
+        "template_group": template_group,
+        "background": background,
+        "style": _get_block_style(fill_parent),
+        "id": shift["id"],
+        "is_template": False,
+    }
+
+
+def shift_template_to_block_object(
+    shift_template: ShiftTemplate, fill_parent: bool, attendance_template_count=None
+):
+    """The attendance_template_count can be passed if it was already annotated, to avoid the query."""
+    if attendance_template_count is None:
+        attendance_template_count = ShiftAttendanceTemplate.objects.filter(
+            shift_template=shift_template
+        ).count()
+
+    attendances = ["empty" for _ in range(shift_template.num_slots)]
+    for index in range(min(attendance_template_count, shift_template.num_slots)):
+        attendances[index] = "template"
+
+    background = "success"
+    if attendance_template_count == 0:
+        background = "danger"
+    elif attendance_template_count < shift_template.num_slots:
+        background = "warning"
 
     return {
         "attendances": attendances,
@@ -104,7 +227,7 @@ def shift_template_to_block_object(shift_template: ShiftTemplate, fill_parent: b
         "weekday": WEEKDAY_CHOICES[shift_template.weekday][1],
         "template_group": template_group_name_to_character(shift_template.group.name),
         "background": background,
-        "style": style,
+        "style": _get_block_style(fill_parent),
         "id": shift_template.id,
         "is_template": True,
     }
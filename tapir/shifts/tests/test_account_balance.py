@@ -0,0 +1,52 @@
+from django.test import TestCase
+from django.utils import timezone
+
+from tapir.accounts.models import TapirUser
+from tapir.shifts.models import ShiftAccountEntry, ShiftUserData
+
+
+class AccountBalanceTestCase(TestCase):
+    def setUp(self):
+        self.user = TapirUser.objects.create(username="hilda.balance")
+        self.other_user = TapirUser.objects.create(username="hilda.other")
+
+    def get_balance(self, user):
+        return ShiftUserData.objects.get(user=user).account_balance
+
+    def create_entry(self, value):
+        return ShiftAccountEntry.objects.create(
+            user=self.user, value=value, date=timezone.now()
+        )
+
+    def test_balance_follows_entries(self):
+        entry = self.create_entry(1)
+        self.create_entry(-3)
+        self.assertEqual(self.get_balance(self.user), -2)
+
+        entry.value = 2
+        entry.save()
+        self.assertEqual(self.get_balance(self.user), -1)
+
+        entry.user = self.other_user
+        entry.save()
+        self.assertEqual(self.get_balance(self.user), -3)
+        self.assertEqual(self.get_balance(self.other_user), 2)
+
+        entry.delete()
+        self.assertEqual(self.get_balance(self.other_user), 0)
+        self.assertFalse(ShiftUserData.objects.get(user=self.user).is_balance_ok())
+
+    def test_update_account_balances(self):
+        ShiftAccountEntry.objects.bulk_create(
+            [
+                ShiftAccountEntry(user=self.user, value=-1, date=timezone.now())
+                for _ in range(2)
+            ]
+        )
+        self.assertEqual(ShiftUserData.objects.with_wrong_account_balance().count(), 1)
+
+        ShiftUserData.objects.update_account_balances()
+
+        self.assertEqual(ShiftUserData.objects.with_wrong_account_balance().count(), 0)
+        self.assertEqual(self.get_balance(self.user), -2)
+        self.assertEqual(self.get_balance(self.other_user), 0)
@@ -0,0 +1,66 @@
+import datetime
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from tapir.accounts.models import TapirUser
+from tapir.shifts.archive import archive_shifts
+from tapir.shifts.models import (
+    ArchivedShift,
+    ArchivedShiftAttendance,
+    Shift,
+    ShiftAccountEntry,
+    ShiftAttendance,
+)
+from tapir.shifts.tests.utils import create_shift
+
+
+class ArchiveShiftsTestCase(TestCase):
+    def setUp(self):
+        self.user = TapirUser.objects.create(username="hilda.archived")
+        self.old_shifts = [self.create_shift(days=-800 - i) for i in range(3)]
+        for shift in self.old_shifts:
+            ShiftAttendance.objects.create(shift=shift, user=self.user).mark_done()
+        self.pending_old_shift = self.create_shift(days=-900)
+        ShiftAttendance.objects.create(shift=self.pending_old_shift, user=self.user)
+        self.recent_shift = self.create_shift(days=-10)
+        ShiftAttendance.objects.create(shift=self.recent_shift, user=self.user)
+
+    @staticmethod
+    def create_shift(days):
+        return create_shift(timezone.now() + datetime.timedelta(days=days))
+
+    def test_archive_shifts(self):
+        result = archive_shifts(
+            timezone.now() - datetime.timedelta(days=730), batch_size=2
+        )
+
+        self.assertEqual((result.shift_count, result.attendance_count), (3, 3))
+        self.assertEqual(
+            set(Shift.objects.values_list("pk", flat=True)),
+            {self.pending_old_shift.pk, self.recent_shift.pk},
+        )
+        self.assertEqual(
+            set(ArchivedShift.objects.values_list("pk", flat=True)),
+            {shift.pk for shift in self.old_shifts},
+        )
+        archived_attendance = ArchivedShiftAttendance.objects.get(
+            shift=self.old_shifts[0].pk
+        )
+        self.assertEqual(archived_attendance.state, ShiftAttendance.State.DONE)
+        self.assertEqual(archived_attendance.user, self.user)
+        # The balance is untouched
+        self.assertEqual(
+            archived_attendance.account_entry,
+            ShiftAccountEntry.objects.filter(user=self.user).order_by("pk").first(),
+        )
+        self.user.shift_user_data.refresh_from_db()
+        self.assertEqual(self.user.shift_user_data.account_balance, 3)
+
+    def test_command(self):
+        call_command("archive_shifts", "--years=2", "--dry-run")
+        self.assertFalse(ArchivedShift.objects.exists())
+
+        call_command("archive_shifts", "--years=2")
+        self.assertEqual(ArchivedShift.objects.count(), 3)
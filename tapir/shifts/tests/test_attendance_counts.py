@@ -0,0 +1,85 @@
+import datetime
+
+from django.test import TestCase
+from django.utils import timezone
+
+from tapir.accounts.models import TapirUser
+from tapir.shifts.models import (
+    Shift,
+    ShiftAttendance,
+    ShiftAttendanceTemplate,
+    ShiftTemplate,
+)
+
+
+class AttendanceCountTestCase(TestCase):
+    def setUp(self):
+        self.users = [
+            TapirUser.objects.create(username="hilda.counter%d" % index)
+            for index in range(3)
+        ]
+        start_time = timezone.now() + datetime.timedelta(days=7)
+        self.shift = Shift.objects.create(
+            name="Supermarket",
+            start_time=start_time,
+            end_time=start_time + datetime.timedelta(hours=3),
+            num_slots=2,
+        )
+
+    def assertCounts(self, valid_attendance_count, free_slot_count):
+        self.shift.refresh_from_db()
+        self.assertEqual(self.shift.valid_attendance_count, valid_attendance_count)
+        self.assertEqual(self.shift.free_slot_count, free_slot_count)
+
+    def test_counts_follow_attendances(self):
+        attendance = ShiftAttendance.objects.create(
+            shift=self.shift, user=self.users[0]
+        )
+        ShiftAttendance.objects.create(shift=self.shift, user=self.users[1])
+        self.assertCounts(2, 0)
+
+        attendance.state = ShiftAttendance.State.CANCELLED
+        attendance.save()
+        self.assertCounts(1, 1)
+
+        # Changing an attendance loaded from the database
+        attendance = ShiftAttendance.objects.get(pk=attendance.pk)
+        attendance.state = ShiftAttendance.State.PENDING
+        attendance.save()
+        self.assertCounts(2, 0)
+
+        attendance.delete()
+        self.assertCounts(1, 1)
+
+        self.shift.num_slots = 4
+        self.shift.save()
+        self.assertCounts(1, 3)
+
+    def test_counts_after_bulk_changes(self):
+        shift_template = ShiftTemplate.objects.create(
+            start_time=datetime.time(9, 0), end_time=datetime.time(12, 0), num_slots=2
+        )
+        shift = shift_template.create_shift(
+            start_date=datetime.date.today() + datetime.timedelta(days=7)
+        )
+        for user in self.users[:2]:
+            ShiftAttendanceTemplate.objects.create(
+                user=user, shift_template=shift_template
+            )
+        shift_template.propagate_attendance_template_changes(
+            added_user_pks=[user.pk for user in self.users[:2]]
+        )
+        shift.refresh_from_db()
+        self.assertEqual(shift.valid_attendance_count, 2)
+        self.assertEqual(shift.free_slot_count, 0)
+
+    def test_repair_counts(self):
+        ShiftAttendance.objects.bulk_create(
+            [ShiftAttendance(shift=self.shift, user=user) for user in self.users]
+        )
+        self.assertEqual(Shift.objects.with_miscounted_attendances().count(), 1)
+
+        Shift.objects.update_attendance_counts()
+
+        self.assertEqual(Shift.objects.with_miscounted_attendances().count(), 0)
+        self.assertCounts(3, -1)
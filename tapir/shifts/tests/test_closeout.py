@@ -0,0 +1,87 @@
+import datetime
+
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from tapir.accounts.models import TapirUser
+from tapir.shifts.closeout import close_out_attendances
+from tapir.shifts.models import Shift, ShiftAccountEntry, ShiftAttendance
+from tapir.shifts.tests.utils import login_as_staff
+
+
+class CloseOutTestCase(TestCase):
+    def setUp(self):
+        start_time = timezone.now().replace(hour=9, minute=0, second=0)
+        self.shift = Shift.objects.create(
+            name="Supermarket",
+            start_time=start_time,
+            end_time=start_time + datetime.timedelta(hours=3),
+            num_slots=3,
+        )
+        self.attendances = [
+            ShiftAttendance.objects.create(
+                shift=self.shift,
+                user=TapirUser.objects.create(username="hilda.closer%d" % index),
+            )
+            for index in range(3)
+        ]
+
+    def get_outcomes(self):
+        return {
+            self.attendances[0].pk: ShiftAttendance.State.DONE,
+            self.attendances[1].pk: ShiftAttendance.State.MISSED,
+            self.attendances[2].pk: ShiftAttendance.State.MISSED_EXCUSED,
+        }
+
+    def test_close_out_attendances(self):
+        self.assertEqual(close_out_attendances(self.get_outcomes()), 3)
+
+        for attendance, state, value in zip(
+            self.attendances,
+            [
+                ShiftAttendance.State.DONE,
+                ShiftAttendance.State.MISSED,
+                ShiftAttendance.State.MISSED_EXCUSED,
+            ],
+            [1, -1, None],
+        ):
+            attendance.refresh_from_db()
+            self.assertEqual(attendance.state, state)
+            self.assertEqual(
+                attendance.account_entry and attendance.account_entry.value, value
+            )
+        self.assertEqual(ShiftAccountEntry.objects.count(), 2)
+        self.shift.refresh_from_db()
+        self.assertEqual(self.shift.valid_attendance_count, 1)
+
+        # Submitting the same outcomes again doesn't book anything
+        self.assertEqual(close_out_attendances(self.get_outcomes()), 0)
+        self.assertEqual(ShiftAccountEntry.objects.count(), 2)
+
+    def test_close_out_rejects_pending(self):
+        with self.assertRaises(ValueError):
+            close_out_attendances(
+                {self.attendances[0].pk: ShiftAttendance.State.PENDING}
+            )
+
+    def test_close_out_day_view(self):
+        login_as_staff(self.client)
+        url = reverse("shifts:close_out_day", args=[timezone.localdate()])
+
+        response = self.client.get(url)
+        self.assertEqual(len(response.context["form"].fields), 3)
+
+        response = self.client.post(
+            url,
+            {
+                "attendance_%d" % pk: state.value
+                for pk, state in self.get_outcomes().items()
+            },
+        )
+
+        self.assertRedirects(response, reverse("shifts:shift_upcoming"))
+        self.assertEqual(
+            ShiftAttendance.objects.filter(state=ShiftAttendance.State.PENDING).count(),
+            0,
+        )
@@ -0,0 +1,62 @@
+import datetime
+
+from django.test import TestCase
+
+from tapir.shifts.generation import generate_shifts
+from tapir.shifts.models import (
+    ShiftTemplateGroup,
+    ShiftTemplate,
+    ShiftCycleDay,
+    Shift,
+)
+
+
+class ShiftCycleDayTestCase(TestCase):
+    def setUp(self):
+        self.groups = []
+        for index, week in enumerate(["A", "B", "C", "D"]):
+            group = ShiftTemplateGroup.objects.create(
+                name="Week " + week, week_index=index + 1
+            )
+            ShiftTemplate.objects.create(
+                name="Supermarket",
+                group=group,
+                weekday=0,
+                start_time=datetime.time(9, 0),
+                end_time=datetime.time(12, 0),
+            )
+            self.groups.append(group)
+
+    def test_calendar_matches_week_index(self):
+        end_date = ShiftTemplateGroup.START_OF_ABCD_SYSTEM + datetime.timedelta(
+            days=100
+        )
+        self.assertEqual(ShiftCycleDay.extend_calendar(end_date), 101)
+        self.assertEqual(ShiftCycleDay.extend_calendar(end_date), 0)
+
+        for day in ShiftCycleDay.objects.all():
+            self.assertEqual(
+                day.week_index, ShiftTemplateGroup.get_week_index(day.date)
+            )
+            self.assertEqual(day.group.week_index, day.week_index)
+            self.assertEqual(day.weekday, day.date.weekday())
+
+    def test_filter_shifts_by_cycle_position(self):
+        start_date = ShiftTemplateGroup.START_OF_ABCD_SYSTEM
+        generate_shifts(
+            start_date=start_date, end_date=start_date + datetime.timedelta(weeks=8)
+        )
+
+        shifts_in_week_c = Shift.objects.in_week_index(3)
+        self.assertEqual(shifts_in_week_c.count(), 2)
+        for shift in shifts_in_week_c:
+            self.assertEqual(shift.shift_template.group, self.groups[2])
+        self.assertEqual(
+            list(Shift.objects.in_cycle_group(self.groups[1])),
+            list(Shift.objects.filter(shift_template__group=self.groups[1])),
+        )
+        for shift in Shift.objects.with_cycle_position():
+            self.assertEqual(
+                shift.cycle_week_index, shift.shift_template.group.week_index
+            )
+            self.assertEqual(shift.cycle_group, shift.shift_template.group.pk)
@@ -0,0 +1,51 @@
+import datetime
+
+from django.test import TestCase
+from django.utils import timezone
+
+from tapir.accounts.models import TapirUser
+from tapir.coop.models import ShareOwner, ShareOwnership
+from tapir.shifts.debit import debit_shift_credits
+from tapir.shifts.models import ShiftAccountEntry, ShiftTemplateGroup, ShiftUserData
+
+
+class DebitShiftCreditsTestCase(TestCase):
+    def setUp(self):
+        self.cycle_start_date = ShiftTemplateGroup.START_OF_ABCD_SYSTEM
+        self.member = self.create_member("hilda.member")
+        self.create_member("hilda.investing", is_investing=True)
+        self.create_member(
+            "hilda.former",
+            end_date=self.cycle_start_date - datetime.timedelta(days=1),
+        )
+        TapirUser.objects.create(username="hilda.staff")
+
+    def create_member(self, username, is_investing=False, end_date=None):
+        user = TapirUser.objects.create(username=username)
+        share_owner = ShareOwner.objects.create(user=user, is_investing=is_investing)
+        ShareOwnership.objects.create(
+            owner=share_owner,
+            start_date=self.cycle_start_date - datetime.timedelta(days=100),
+            end_date=end_date,
+        )
+        return user
+
+    def test_debit_shift_credits(self):
+        date = self.cycle_start_date + datetime.timedelta(days=10)
+
+        self.assertEqual(debit_shift_credits(date), 1)
+
+        entry = ShiftAccountEntry.objects.get()
+        self.assertEqual(entry.user, self.member)
+        self.assertEqual(entry.value, -1)
+        self.assertEqual(timezone.localtime(entry.date).date(), self.cycle_start_date)
+
+        # Running again in the same cycle doesn't debit twice
+        self.assertEqual(debit_shift_credits(self.cycle_start_date), 0)
+        self.assertEqual(ShiftAccountEntry.objects.count(), 1)
+        self.assertEqual(
+            ShiftUserData.objects.get(user=self.member).account_balance, -1
+        )
+
+        debit_shift_credits(self.cycle_start_date + datetime.timedelta(days=28))
+        self.assertEqual(ShiftAccountEntry.objects.filter(user=self.member).count(), 2)
@@ -0,0 +1,75 @@
+import datetime
+
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from tapir.accounts.models import TapirUser
+from tapir.coop.models import ShareOwner
+from tapir.shifts.eligibility import (
+    JoinEligibility,
+    get_join_eligibilities,
+    user_can_join_shift,
+)
+from tapir.shifts.models import ShiftAttendance
+from tapir.shifts.tests.utils import create_shift, local_datetime, login
+
+
+class JoinEligibilityTestCase(TestCase):
+    def setUp(self):
+        self.user = TapirUser.objects.create(username="hilda.joiner", is_superuser=True)
+        self.date = timezone.localdate() + datetime.timedelta(days=1)
+        self.attended_shift = create_shift(local_datetime(self.date, 9))
+        self.overlapping_shift = create_shift(
+            local_datetime(self.date, 11), name="Cashier"
+        )
+        self.free_shift = create_shift(local_datetime(self.date, 12))
+        ShiftAttendance.objects.create(shift=self.attended_shift, user=self.user)
+
+    def test_get_join_eligibilities(self):
+        shifts = [self.attended_shift, self.overlapping_shift, self.free_shift]
+        with self.assertNumQueries(2):
+            eligibilities = get_join_eligibilities(self.user, shifts)
+
+        self.assertEqual(
+            [eligibility.reason for eligibility in eligibilities],
+            [
+                JoinEligibility.ALREADY_REGISTERED,
+                JoinEligibility.OVERLAPPING_ATTENDANCE,
+                None,
+            ],
+        )
+        self.assertTrue(user_can_join_shift(self.user, self.free_shift))
+
+    def test_cancelled_attendance_does_not_overlap(self):
+        attendance = self.attended_shift.attendances.get()
+        attendance.state = ShiftAttendance.State.CANCELLED
+        attendance.save()
+
+        self.assertFalse(user_can_join_shift(self.user, self.attended_shift))
+        self.assertTrue(user_can_join_shift(self.user, self.overlapping_shift))
+
+    def test_investing_member(self):
+        ShareOwner.objects.create(user=self.user, is_investing=True)
+
+        with self.assertNumQueries(1):
+            eligibilities = get_join_eligibilities(
+                self.user, [self.free_shift, self.overlapping_shift]
+            )
+        self.assertEqual(
+            {eligibility.reason for eligibility in eligibilities},
+            {JoinEligibility.INVESTING_MEMBER},
+        )
+
+    def test_free_slot_search(self):
+        login(self.client, self.user)
+        response = self.client.get(reverse("shifts:search_free_slots"))
+
+        self.assertEqual(
+            {shift["id"]: shift["can_join"] for shift in response.json()["shifts"]},
+            {
+                self.attended_shift.pk: False,
+                self.overlapping_shift.pk: False,
+                self.free_shift.pk: True,
+            },
+        )
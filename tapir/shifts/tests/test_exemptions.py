@@ -0,0 +1,192 @@
+import datetime
+
+from django.test import TestCase
+from django.utils import timezone
+
+from tapir.accounts.models import TapirUser
+from tapir.coop.models import ShareOwner, ShareOwnership
+from tapir.shifts import flying, virtual
+from tapir.shifts.debit import debit_shift_credits
+from tapir.shifts.generation import generate_shifts
+from tapir.shifts.models import (
+    ExemptionCalendar,
+    Shift,
+    ShiftAccountEntry,
+    ShiftAttendance,
+    ShiftAttendanceTemplate,
+    ShiftExemption,
+    ShiftTemplate,
+    ShiftTemplateGroup,
+    ShiftUserData,
+)
+from tapir.shifts.propagation import process_propagation_jobs
+
+
+class ShiftExemptionTestCase(TestCase):
+    def setUp(self):
+        self.user = TapirUser.objects.create(username="hilda.leave")
+        self.other_user = TapirUser.objects.create(username="hilda.present")
+        # The template occurs tomorrow and every four weeks after
+        self.start_date = timezone.localdate() + datetime.timedelta(days=1)
+        group = ShiftTemplateGroup.objects.create(
+            name="Week A", week_index=ShiftTemplateGroup.get_week_index(self.start_date)
+        )
+        self.shift_template = ShiftTemplate.objects.create(
+            name="Supermarket",
+            group=group,
+            weekday=self.start_date.weekday(),
+            start_time=datetime.time(9, 0),
+            end_time=datetime.time(12, 0),
+        )
+        for user in [self.user, self.other_user]:
+            ShiftAttendanceTemplate.objects.create(
+                user=user, shift_template=self.shift_template
+            )
+        process_propagation_jobs()
+
+    def get_date(self, weeks):
+        return self.start_date + datetime.timedelta(weeks=weeks)
+
+    def create_exemption(self, start_weeks, end_weeks=None, user=None):
+        return ShiftExemption.objects.create(
+            user=user or self.user,
+            start_date=self.get_date(start_weeks),
+            end_date=None if end_weeks is None else self.get_date(end_weeks),
+        )
+
+    def get_attending_users(self, weeks):
+        return list(
+            ShiftAttendance.objects.filter(shift__start_time__date=self.get_date(weeks))
+            .order_by("user")
+            .values_list("user__username", flat=True)
+        )
+
+    def test_exemption_calendar(self):
+        self.create_exemption(0, 2)
+        self.create_exemption(1, 3)
+        self.create_exemption(6)
+        self.create_exemption(0, 10, user=self.other_user)
+
+        with self.assertNumQueries(1):
+            exemptions = ExemptionCalendar(user_pks=[self.user.pk])
+
+        # The overlapping exemptions are merged
+        self.assertEqual(
+            exemptions.periods_by_user_pk[self.user.pk],
+            [
+                (self.get_date(0), self.get_date(3)),
+                (self.get_date(6), datetime.date.max),
+            ],
+        )
+        self.assertFalse(exemptions.is_exempt(self.user.pk, self.get_date(-1)))
+        self.assertTrue(exemptions.is_exempt(self.user.pk, self.get_date(0)))
+        self.assertTrue(exemptions.is_exempt(self.user.pk, self.get_date(3)))
+        self.assertFalse(exemptions.is_exempt(self.user.pk, self.get_date(4)))
+        self.assertTrue(exemptions.is_exempt(self.user.pk, self.get_date(100)))
+        self.assertFalse(exemptions.is_exempt(self.other_user.pk, self.get_date(0)))
+
+    def test_generation_skips_exempt_members(self):
+        self.create_exemption(0, 1)
+        process_propagation_jobs()
+
+        result = generate_shifts(self.get_date(0), self.get_date(8))
+
+        self.assertEqual(result.shift_count, 3)
+        self.assertEqual(self.get_attending_users(0), ["hilda.present"])
+        self.assertEqual(self.get_attending_users(4), ["hilda.leave", "hilda.present"])
+        shift = Shift.objects.get(start_time__date=self.get_date(0))
+        self.assertEqual(shift.valid_attendance_count, 1)
+
+    def test_propagation_follows_exemptions(self):
+        generate_shifts(self.get_date(0), self.get_date(8))
+        self.assertEqual(ShiftAttendance.objects.filter(user=self.user).count(), 3)
+
+        exemption = self.create_exemption(3, 5)
+        process_propagation_jobs()
+        self.assertEqual(self.get_attending_users(4), ["hilda.present"])
+        self.assertEqual(
+            Shift.objects.get(start_time__date=self.get_date(4)).free_slot_count,
+            self.shift_template.num_slots - 1,
+        )
+        self.assertEqual(ShiftAttendance.objects.filter(user=self.user).count(), 2)
+
+        # Ended early, the member is back in the shift
+        exemption.end_date = self.get_date(3)
+        exemption.save()
+        process_propagation_jobs()
+        self.assertEqual(self.get_attending_users(4), ["hilda.leave", "hilda.present"])
+
+        exemption.end_date = None
+        exemption.save()
+        process_propagation_jobs()
+        self.assertEqual(ShiftAttendance.objects.filter(user=self.user).count(), 1)
+
+        exemption.delete()
+        process_propagation_jobs()
+        self.assertEqual(ShiftAttendance.objects.filter(user=self.user).count(), 3)
+
+    def test_virtual_shifts_skip_exempt_members(self):
+        self.create_exemption(0, 1)
+
+        shifts = virtual.get_shifts(self.get_date(0), self.get_date(4))
+
+        self.assertEqual(
+            [
+                [attendance.user for attendance in shift.virtual_attendances]
+                for shift in shifts
+            ],
+            [[self.other_user], [self.user, self.other_user]],
+        )
+        self.assertEqual(
+            virtual.get_virtual_shift(
+                self.shift_template, self.get_date(0)
+            ).valid_attendance_count,
+            1,
+        )
+
+    def test_debit_skips_exempt_members(self):
+        cycle_start_date = ShiftTemplateGroup.get_cycle_start_date(self.start_date)
+        for user in [self.user, self.other_user]:
+            ShareOwnership.objects.create(
+                owner=ShareOwner.objects.create(user=user),
+                start_date=cycle_start_date - datetime.timedelta(days=100),
+            )
+        ShiftExemption.objects.create(
+            user=self.user,
+            start_date=cycle_start_date - datetime.timedelta(days=1),
+            end_date=cycle_start_date + datetime.timedelta(days=1),
+        )
+
+        self.assertEqual(debit_shift_credits(cycle_start_date), 1)
+        self.assertEqual(ShiftAccountEntry.objects.get().user, self.other_user)
+
+        # Back for the next cycle
+        self.assertEqual(
+            debit_shift_credits(cycle_start_date + datetime.timedelta(days=28)), 2
+        )
+
+    def test_flying_assignment_skips_exempt_members(self):
+        ShiftUserData.objects.filter(user__in=[self.user, self.other_user]).update(
+            attendance_mode="flying"
+        )
+        start_time = timezone.make_aware(
+            datetime.datetime.combine(self.get_date(0), datetime.time(15, 0))
+        )
+        shift = Shift.objects.create(
+            name="Evening",
+            start_time=start_time,
+            end_time=start_time + datetime.timedelta(hours=3),
+            num_slots=2,
+        )
+        self.create_exemption(0)
+
+        proposal = flying.compute_proposal(self.get_date(0), self.get_date(0))
+
+        self.assertEqual(
+            [
+                (assignment.shift.pk, assignment.user_pk)
+                for assignment in proposal.assignments
+            ],
+            [(shift.pk, self.other_user.pk)],
+        )
+        self.assertEqual(proposal.unfilled_slot_count, 1)
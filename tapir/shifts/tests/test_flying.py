@@ -0,0 +1,156 @@
+import datetime
+import random
+from types import SimpleNamespace
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from tapir.accounts.models import TapirUser
+from tapir.coop.models import ShareOwner
+from tapir.shifts import flying
+from tapir.shifts.models import Shift, ShiftAttendance, ShiftUserData
+from tapir.shifts.tests.utils import create_shift, local_datetime, login_as_staff
+
+
+class FlyingAssignmentTestCase(TestCase):
+    def setUp(self):
+        self.date = timezone.localdate() + datetime.timedelta(days=2)
+        self.morning_shift = create_shift(local_datetime(self.date, 9), num_slots=2)
+        self.noon_shift = create_shift(local_datetime(self.date, 11), num_slots=1)
+
+        self.busy_member = self.create_flying_member("hilda.busy", balance=-5)
+        self.rested_member = self.create_flying_member("hilda.rested", balance=0)
+        self.owing_member = self.create_flying_member("hilda.owing", balance=-2)
+        self.create_flying_member("hilda.investing", balance=-10, is_investing=True)
+        TapirUser.objects.create(username="hilda.regular")
+
+        # Recently worked a shift
+        past_shift = create_shift(
+            local_datetime(self.date - datetime.timedelta(days=7), 9), num_slots=1
+        )
+        ShiftAttendance.objects.create(shift=past_shift, user=self.busy_member)
+
+    @staticmethod
+    def create_flying_member(username, balance, is_investing=False):
+        user = TapirUser.objects.create(username=username)
+        ShiftUserData.objects.filter(user=user).update(
+            attendance_mode="flying", account_balance=balance
+        )
+        if is_investing:
+            ShareOwner.objects.create(user=user, is_investing=True)
+        return user
+
+    def get_proposal(self, **kwargs):
+        return flying.compute_proposal(self.date, self.date, **kwargs)
+
+    def test_compute_proposal(self):
+        proposal = self.get_proposal()
+
+        self.assertEqual(
+            [
+                (assignment.shift.pk, assignment.user_pk)
+                for assignment in proposal.assignments
+            ],
+            [
+                # No recent load and owes more shifts than hilda.rested
+                (self.morning_shift.pk, self.owing_member.pk),
+                (self.morning_shift.pk, self.rested_member.pk),
+                (self.noon_shift.pk, self.busy_member.pk),
+            ],
+        )
+        self.assertEqual(proposal.unfilled_slot_count, 0)
+
+    def test_overlapping_shifts_are_skipped(self):
+        proposal = self.get_proposal(max_assignments_per_member=2)
+        assigned = {
+            (assignment.shift.pk, assignment.user_pk)
+            for assignment in proposal.assignments
+        }
+        for user in [self.owing_member, self.rested_member]:
+            self.assertNotIn((self.noon_shift.pk, user.pk), assigned)
+
+    def test_apply(self):
+        proposal = self.get_proposal()
+        # Meanwhile somebody else took the noon shift
+        ShiftAttendance.objects.create(
+            shift=self.noon_shift,
+            user=TapirUser.objects.create(username="hilda.quick"),
+        )
+
+        self.assertEqual(proposal.apply(), 2)
+        self.morning_shift.refresh_from_db()
+        self.assertEqual(self.morning_shift.free_slot_count, 0)
+        self.assertEqual(
+            set(self.morning_shift.attendances.values_list("user", flat=True)),
+            {self.owing_member.pk, self.rested_member.pk},
+        )
+        self.assertFalse(self.noon_shift.attendances.filter(user=self.busy_member))
+
+    def test_view(self):
+        login_as_staff(self.client)
+        dates = {"start_date": self.date, "end_date": self.date}
+        response = self.client.get(reverse("shifts:flying_assignment"), dates)
+        keys = [
+            assignment.get_key()
+            for assignment in response.context["proposal"].assignments
+        ]
+        self.assertEqual(len(keys), 3)
+
+        self.client.post(
+            reverse("shifts:flying_assignment"), dict(dates, assignment=keys[:1])
+        )
+        self.assertEqual(
+            list(
+                ShiftAttendance.objects.filter(shift=self.morning_shift).values_list(
+                    "user", flat=True
+                )
+            ),
+            [self.owing_member.pk],
+        )
+
+    def test_command(self):
+        call_command(
+            "assign_flying_members",
+            "--start-date=%s" % self.date,
+            "--end-date=%s" % self.date,
+            "--apply",
+        )
+        self.assertEqual(
+            Shift.objects.filter(pk__in=[self.morning_shift.pk, self.noon_shift.pk])
+            .filter(free_slot_count=0)
+            .count(),
+            2,
+        )
+
+
+class AssignTestCase(TestCase):
+    def test_assign_month_with_thousands_of_members(self):
+        start = timezone.now()
+        shifts = [
+            SimpleNamespace(
+                start_time=start + datetime.timedelta(hours=hour),
+                end_time=start + datetime.timedelta(hours=hour + 3),
+                free_slot_count=3,
+            )
+            for day in range(31)
+            for hour in range(24 * day + 8, 24 * day + 20, 3)
+        ]
+        members = [
+            (user_pk, random.randint(0, 3), random.randint(-5, 5))
+            for user_pk in range(5000)
+        ]
+
+        proposal = flying.assign(shifts, members, {}, max_assignments_per_member=1)
+
+        self.assertEqual(len(proposal.assignments), len(shifts) * 3)
+        self.assertEqual(proposal.unfilled_slot_count, 0)
+        assigned_user_pks = [assignment.user_pk for assignment in proposal.assignments]
+        self.assertEqual(len(set(assigned_user_pks)), len(assigned_user_pks))
+        # The members with the lowest recent load are assigned first
+        loads = {user_pk: load for user_pk, load, balance in members}
+        self.assertLessEqual(
+            max(loads[user_pk] for user_pk in assigned_user_pks),
+            min(loads[user_pk] for user_pk in loads.keys() - set(assigned_user_pks)),
+        )
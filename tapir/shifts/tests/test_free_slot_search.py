@@ -0,0 +1,93 @@
+import datetime
+
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from tapir.accounts.models import TapirUser
+from tapir.shifts.models import (
+    Shift,
+    ShiftAttendance,
+    ShiftTemplate,
+    ShiftTemplateGroup,
+)
+from tapir.shifts.tests.utils import create_shift, local_datetime, login_as_staff
+
+
+class FreeSlotSearchTestCase(TestCase):
+    def setUp(self):
+        self.user = TapirUser.objects.create(username="hilda.search")
+        self.group = ShiftTemplateGroup.objects.create(name="Week A", week_index=1)
+        self.shift_template = ShiftTemplate.objects.create(
+            name="Supermarket",
+            group=self.group,
+            start_time=datetime.time(9, 0),
+            end_time=datetime.time(12, 0),
+        )
+        # Next Monday, so that the weekdays are known
+        self.monday = timezone.localdate() + datetime.timedelta(
+            days=7 - timezone.localdate().weekday()
+        )
+
+        self.morning_shift = self.create_shift(self.monday, 9, self.shift_template)
+        self.evening_shift = self.create_shift(self.monday, 18)
+        self.tuesday_shift = self.create_shift(
+            self.monday + datetime.timedelta(days=1), 9
+        )
+        self.full_shift = self.create_shift(self.monday, 12, num_slots=1)
+        ShiftAttendance.objects.create(shift=self.full_shift, user=self.user)
+
+    @staticmethod
+    def create_shift(date, hour, shift_template=None, num_slots=2):
+        return create_shift(
+            local_datetime(date, hour),
+            name="Shift %d" % hour,
+            num_slots=num_slots,
+            shift_template=shift_template,
+        )
+
+    def assertShifts(self, shifts, expected_shifts):
+        self.assertEqual(list(shifts), expected_shifts)
+
+    def test_with_free_slots(self):
+        self.assertShifts(
+            Shift.objects.with_free_slots(),
+            [self.morning_shift, self.evening_shift, self.tuesday_shift],
+        )
+        self.assertShifts(
+            Shift.objects.with_free_slots(start_date=self.monday, end_date=self.monday),
+            [self.morning_shift, self.evening_shift],
+        )
+        self.assertShifts(
+            Shift.objects.with_free_slots(weekdays=[1]), [self.tuesday_shift]
+        )
+        self.assertShifts(
+            Shift.objects.with_free_slots(latest_end_time=datetime.time(14, 0)),
+            [self.morning_shift, self.tuesday_shift],
+        )
+        self.assertShifts(
+            Shift.objects.with_free_slots(earliest_start_time=datetime.time(10, 0)),
+            [self.evening_shift],
+        )
+        self.assertShifts(
+            Shift.objects.with_free_slots(group=self.group), [self.morning_shift]
+        )
+
+    def test_search_free_slots_view(self):
+        login_as_staff(self.client)
+
+        response = self.client.get(
+            reverse("shifts:search_free_slots"),
+            {"weekdays": [0], "earliest_start_time": "10:00"},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [shift["id"] for shift in response.json()["shifts"]],
+            [self.evening_shift.pk],
+        )
+
+        response = self.client.get(
+            reverse("shifts:search_free_slots"), {"weekdays": [9]}
+        )
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,106 @@
+import datetime
+
+from django.test import TestCase
+
+from tapir.accounts.models import TapirUser
+from tapir.shifts.generation import _insert_shifts, generate_shifts
+from tapir.shifts.models import (
+    ShiftTemplateGroup,
+    ShiftTemplate,
+    ShiftAttendanceTemplate,
+    Shift,
+    ShiftAttendance,
+)
+
+
+class GenerateShiftsTestCase(TestCase):
+    def setUp(self):
+        self.user = TapirUser.objects.create(username="hilda.generator")
+        for index, week in enumerate(["A", "B", "C", "D"]):
+            group = ShiftTemplateGroup.objects.create(
+                name="Week " + week, week_index=index + 1
+            )
+            for weekday in [1, 3]:
+                ShiftTemplate.objects.create(
+                    name="Supermarket",
+                    group=group,
+                    weekday=weekday,
+                    start_time=datetime.time(9, 0),
+                    end_time=datetime.time(12, 0),
+                )
+        self.template = ShiftTemplate.objects.filter(
+            group__week_index=1, weekday=1
+        ).first()
+        ShiftAttendanceTemplate.objects.create(
+            user=self.user, shift_template=self.template
+        )
+
+    def test_generate_shifts(self):
+        # Eight weeks contain each group twice, with two templates each
+        start_date = ShiftTemplateGroup.START_OF_ABCD_SYSTEM
+        end_date = start_date + datetime.timedelta(weeks=8, days=-1)
+
+        result = generate_shifts(start_date=start_date, end_date=end_date)
+
+        self.assertEqual(result.shift_count, 16)
+        self.assertEqual(Shift.objects.count(), 16)
+        for shift in Shift.objects.all():
+            self.assertEqual(
+                ShiftTemplateGroup.get_week_index(shift.start_time.date()),
+                shift.shift_template.group.week_index,
+            )
+            self.assertEqual(shift.start_time.weekday(), shift.shift_template.weekday)
+        self.assertEqual(
+            list(ShiftAttendance.objects.values_list("user", "shift__shift_template")),
+            [(self.user.pk, self.template.pk)] * 2,
+        )
+
+    def test_generate_shifts_skips_existing(self):
+        start_date = ShiftTemplateGroup.START_OF_ABCD_SYSTEM
+        self.template.create_shift(start_date=start_date)
+
+        end_date = start_date + datetime.timedelta(weeks=5)
+
+        result = generate_shifts(start_date=start_date, end_date=end_date)
+
+        self.assertEqual(result.shift_count, 9)
+        self.assertEqual(Shift.objects.count(), 10)
+        # Only the newly generated shift of the template in week 5 gets an attendance
+        self.assertEqual(ShiftAttendance.objects.count(), 1)
+
+        result = generate_shifts(start_date=start_date, end_date=end_date)
+        self.assertEqual(result.shift_count, 0)
+
+    def test_generate_shifts_partitioned(self):
+        start_date = ShiftTemplateGroup.START_OF_ABCD_SYSTEM + datetime.timedelta(
+            days=3
+        )
+        end_date = start_date + datetime.timedelta(weeks=20)
+
+        result = generate_shifts(start_date=start_date, end_date=end_date, processes=3)
+
+        # From a Thursday to the Thursday 20 weeks later: 21 Thursdays and 20 Tuesdays
+        self.assertEqual(result.shift_count, 41)
+        self.assertEqual(
+            Shift.objects.filter(
+                start_time__date__gte=start_date, start_time__date__lte=end_date
+            ).count(),
+            41,
+        )
+
+    def test_shifts_stored_concurrently_are_skipped(self):
+        # Planned by a generation run while ShiftTemplate.create_shift() stores the first shift
+        start_date = ShiftTemplateGroup.START_OF_ABCD_SYSTEM
+        planned_shifts = [
+            self.template._generate_shift(start_date=start_date),
+            self.template._generate_shift(
+                start_date=start_date + datetime.timedelta(weeks=4)
+            ),
+        ]
+        stored_shift = self.template.create_shift(start_date=start_date)
+
+        inserted_shifts = _insert_shifts(planned_shifts)
+
+        self.assertEqual(inserted_shifts, [planned_shifts[1]])
+        self.assertNotEqual(inserted_shifts[0].pk, stored_shift.pk)
+        self.assertEqual(Shift.objects.count(), 2)
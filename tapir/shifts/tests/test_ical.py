@@ -0,0 +1,134 @@
+import datetime
+
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from tapir.accounts.models import TapirUser
+from tapir.shifts import ical
+from tapir.shifts.models import (
+    Shift,
+    ShiftAttendance,
+    ShiftAttendanceTemplate,
+    ShiftExemption,
+    ShiftTemplate,
+    ShiftTemplateGroup,
+)
+
+
+class CalendarFeedTestCase(TestCase):
+    def setUp(self):
+        self.user = TapirUser.objects.create(username="hilda.calendar")
+        group = ShiftTemplateGroup.objects.create(name="Week A", week_index=1)
+        self.shift_template = ShiftTemplate.objects.create(
+            name="Supermarket",
+            group=group,
+            weekday=1,
+            start_time=datetime.time(9, 0),
+            end_time=datetime.time(12, 0),
+        )
+        ShiftAttendanceTemplate.objects.create(
+            user=self.user, shift_template=self.shift_template
+        )
+        start_time = timezone.now() + datetime.timedelta(days=3)
+        self.shift = Shift.objects.create(
+            name="Inventory, extra",
+            start_time=start_time,
+            end_time=start_time + datetime.timedelta(hours=3),
+        )
+        ShiftAttendance.objects.create(shift=self.shift, user=self.user)
+        self.url = reverse(
+            "shifts:user_calendar",
+            args=[self.user.shift_user_data.get_calendar_token()],
+        )
+
+    def test_user_calendar(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        content = response.content.decode()
+        self.assertIn("SUMMARY:Inventory\\, extra\r\n", content)
+        self.assertIn("RRULE:FREQ=WEEKLY;INTERVAL=4\r\n", content)
+        self.assertEqual(content.count("BEGIN:VEVENT"), 2)
+
+    def test_user_calendar_time_zone(self):
+        content = self.client.get(self.url).content.decode()
+
+        self.assertIn("BEGIN:VTIMEZONE\r\nTZID:Europe/Berlin\r\n", content)
+        self.assertIn(
+            "TZOFFSETFROM:+0100\r\nTZOFFSETTO:+0200\r\nTZNAME:CEST\r\n"
+            "RRULE:FREQ=YEARLY;BYMONTH=3;BYDAY=-1SU\r\n",
+            content,
+        )
+        self.assertIn(
+            "TZOFFSETFROM:+0200\r\nTZOFFSETTO:+0100\r\nTZNAME:CET\r\n"
+            "RRULE:FREQ=YEARLY;BYMONTH=10;BYDAY=-1SU\r\n",
+            content,
+        )
+        self.assertIn("DTSTART;TZID=Europe/Berlin:", content)
+
+    def test_user_calendar_exemptions(self):
+        first_date = ical._get_next_occurrence(1, 1)
+        ShiftExemption.objects.create(
+            user=self.user,
+            start_date=first_date + datetime.timedelta(weeks=4),
+            end_date=first_date + datetime.timedelta(weeks=4),
+        )
+        exemption = ShiftExemption.objects.create(
+            user=self.user, start_date=first_date + datetime.timedelta(weeks=10)
+        )
+
+        content = self.client.get(self.url).content.decode()
+        self.assertIn(
+            "EXDATE;TZID=Europe/Berlin:%s\r\n"
+            % (first_date + datetime.timedelta(weeks=4)).strftime("%Y%m%dT090000"),
+            content,
+        )
+        until = timezone.make_aware(
+            datetime.datetime.combine(
+                first_date + datetime.timedelta(weeks=8), datetime.time(9, 0)
+            )
+        )
+        self.assertIn(
+            "RRULE:FREQ=WEEKLY;INTERVAL=4;UNTIL=%s\r\n"
+            % until.astimezone(datetime.timezone.utc).strftime("%Y%m%dT%H%M%SZ"),
+            content,
+        )
+
+        # Exempt from the first occurrence on, only the one-off shift is left
+        exemption.start_date = first_date
+        exemption.save()
+        content = self.client.get(self.url).content.decode()
+        self.assertNotIn("RRULE:FREQ=WEEKLY", content)
+        self.assertEqual(content.count("BEGIN:VEVENT"), 1)
+
+    def test_user_calendar_conditional_get(self):
+        etag = self.client.get(self.url)["ETag"]
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        ShiftAttendance.objects.update(state=ShiftAttendance.State.CANCELLED)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content.decode().count("BEGIN:VEVENT"), 1)
+
+    def test_invalid_token(self):
+        response = self.client.get(
+            reverse("shifts:user_calendar", args=["%d:forged" % self.user.pk])
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_all_shifts_calendar(self):
+        url = reverse(
+            "shifts:all_shifts_calendar",
+            args=[self.user.shift_user_data.get_calendar_token()],
+        )
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.user.is_superuser = True
+        self.user.save()
+        response = self.client.get(url)
+        self.assertEqual(
+            b"".join(response.streaming_content).decode().count("BEGIN:VEVENT"), 1
+        )
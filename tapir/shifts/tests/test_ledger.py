@@ -0,0 +1,69 @@
+import datetime
+
+from django.test import TestCase
+from django.utils import timezone
+
+from tapir.accounts.models import TapirUser
+from tapir.shifts import ledger
+from tapir.shifts.models import ShiftAccountBalanceSnapshot, ShiftAccountEntry
+
+
+class LedgerTestCase(TestCase):
+    def setUp(self):
+        self.user = TapirUser.objects.create(username="hilda.ledger")
+        self.other_user = TapirUser.objects.create(username="hilda.other")
+        self.start = timezone.make_aware(datetime.datetime(2021, 1, 4))
+        for days, value in [(0, -1), (10, 1), (28, -1), (30, -1)]:
+            self.create_entry(days, value)
+
+    def create_entry(self, days, value):
+        return ShiftAccountEntry.objects.create(
+            user=self.user,
+            value=value,
+            date=self.start + datetime.timedelta(days=days),
+        )
+
+    def get_date(self, days):
+        return self.start + datetime.timedelta(days=days)
+
+    def test_balances_as_of(self):
+        balances = dict(
+            ledger.get_balances_as_of(self.get_date(29)).values_list("user", "balance")
+        )
+        self.assertEqual(balances, {self.user.pk: -1, self.other_user.pk: 0})
+
+        self.assertEqual(ledger.create_snapshots(self.get_date(20)), 2)
+        # Entries before the snapshot are not summed again
+        ShiftAccountEntry.objects.filter(date__lte=self.get_date(20)).update(value=0)
+        self.assertEqual(ledger.get_balance_as_of(self.user, self.get_date(40)), -2)
+
+    def test_backdated_entry_invalidates_snapshots(self):
+        ledger.create_snapshots(self.get_date(20))
+        ledger.create_snapshots(self.get_date(40))
+
+        self.create_entry(15, 3)
+
+        # Both snapshots of the user include the day of the new entry
+        self.assertFalse(
+            ShiftAccountBalanceSnapshot.objects.filter(user=self.user).exists()
+        )
+        self.assertEqual(
+            ShiftAccountBalanceSnapshot.objects.filter(user=self.other_user).count(), 2
+        )
+        self.assertEqual(ledger.get_balance_as_of(self.user, self.get_date(40)), 1)
+
+    def test_balance_series(self):
+        self.assertEqual(
+            [entry.balance for entry in ledger.get_balance_series(self.user)],
+            [-1, 0, -1, -2],
+        )
+        ledger.create_snapshots(self.get_date(5))
+        self.assertEqual(
+            [
+                entry.balance
+                for entry in ledger.get_balance_series(
+                    self.user, since=self.get_date(20)
+                )
+            ],
+            [-1, -2],
+        )
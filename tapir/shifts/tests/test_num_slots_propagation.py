@@ -0,0 +1,111 @@
+import datetime
+
+from django.contrib import admin
+from django.contrib.messages import get_messages
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from tapir.accounts.models import TapirUser
+from tapir.shifts.admin import ShiftTemplateAdmin
+from tapir.shifts.models import (
+    Shift,
+    ShiftAttendance,
+    ShiftTemplate,
+    ShiftTemplateGroup,
+    ShiftWaitlistEntry,
+)
+
+
+class NumSlotsPropagationTestCase(TestCase):
+    def setUp(self):
+        self.shift_template = ShiftTemplate.objects.create(
+            name="Supermarket",
+            group=ShiftTemplateGroup.objects.create(name="Week A", week_index=1),
+            weekday=0,
+            start_time=datetime.time(9, 0),
+            end_time=datetime.time(12, 0),
+            num_slots=3,
+        )
+        today = timezone.localdate()
+        self.past_shift = self.shift_template.create_shift(
+            start_date=today - datetime.timedelta(weeks=2)
+        )
+        self.future_shifts = [
+            self.shift_template.create_shift(
+                start_date=today + datetime.timedelta(weeks=week)
+            )
+            for week in range(1, 4)
+        ]
+        self.users = [
+            TapirUser.objects.create(username="hilda.%d" % i) for i in range(3)
+        ]
+        for user in self.users:
+            ShiftAttendance.objects.create(shift=self.future_shifts[0], user=user)
+        self.shift_template = ShiftTemplate.objects.get(pk=self.shift_template.pk)
+
+    def test_reduce_num_slots(self):
+        self.shift_template.num_slots = 2
+        with CaptureQueriesContext(connection) as queries:
+            result = self.shift_template.propagate_num_slots()
+        self.assertEqual(
+            len(
+                [
+                    query
+                    for query in queries.captured_queries
+                    if query["sql"].startswith('UPDATE "shifts_shift"')
+                ]
+            ),
+            1,
+        )
+
+        self.assertEqual(result.updated_shift_count, 3)
+        self.assertEqual(result.overbooked_shifts, [self.future_shifts[0]])
+        self.assertEqual(result.overbooked_shifts[0].free_slot_count, -1)
+        # Nobody is removed from the overbooked shift
+        self.assertEqual(self.future_shifts[0].attendances.count(), 3)
+        for shift in self.future_shifts[1:]:
+            shift.refresh_from_db()
+            self.assertEqual((shift.num_slots, shift.free_slot_count), (2, 2))
+        self.past_shift.refresh_from_db()
+        self.assertEqual(self.past_shift.num_slots, 3)
+
+    def test_save_propagates_num_slots(self):
+        waiting_user = TapirUser.objects.create(username="hilda.waiting")
+        ShiftWaitlistEntry.objects.create(
+            shift=self.future_shifts[0], user=waiting_user
+        )
+
+        self.shift_template.num_slots = 4
+        self.shift_template.save()
+
+        self.assertEqual(
+            self.shift_template.num_slots_propagation.updated_shift_count, 3
+        )
+        self.assertEqual(
+            self.shift_template.num_slots_propagation.overbooked_shifts, []
+        )
+        # The new slot went to the waitlist
+        self.assertTrue(
+            self.future_shifts[0].attendances.filter(user=waiting_user).exists()
+        )
+        self.assertEqual(
+            Shift.objects.get(pk=self.future_shifts[0].pk).free_slot_count, 0
+        )
+
+    def test_admin_reports_overbooked_shifts(self):
+        request = RequestFactory().post("/")
+        request.user = TapirUser.objects.create(username="hilda.admin")
+        setattr(request, "_messages", CookieStorage(request))
+
+        self.shift_template.num_slots = 2
+        ShiftTemplateAdmin(ShiftTemplate, admin.site).save_model(
+            request, self.shift_template, None, True
+        )
+
+        self.assertIn(
+            "3 valid attendances for 2 slots",
+            [str(message) for message in get_messages(request)][-1],
+        )
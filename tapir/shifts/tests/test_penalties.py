@@ -0,0 +1,85 @@
+import datetime
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from tapir.accounts.models import TapirUser
+from tapir.shifts.penalties import evaluate_penalties, apply_penalty_statuses
+from tapir.shifts.models import ShiftAccountEntry, ShiftUserData
+from tapir.shifts.tests.utils import login_as_staff
+
+
+@override_settings(
+    SHIFT_PENALTY_RULES=[
+        {"status": "warned", "label": "Warned", "below": -1, "days": 0},
+        {"status": "blocked", "label": "Blocked", "below": -1, "days": 28},
+        {"status": "deep", "label": "Deep", "below": -3, "days": 0},
+    ]
+)
+class PenaltyTestCase(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        self.blocked_user = self.create_user("hilda.blocked", [(40, -2)])
+        # Was below -1 for long, but only since the last entry again
+        self.warned_user = self.create_user(
+            "hilda.warned", [(60, -2), (50, 2), (10, -2)]
+        )
+        self.deep_user = self.create_user("hilda.deep", [(5, -4)])
+        self.ok_user = self.create_user("hilda.ok", [(60, -2), (5, 2)])
+
+    def create_user(self, username, entries):
+        user = TapirUser.objects.create(username=username)
+        for days_ago, value in entries:
+            ShiftAccountEntry.objects.create(
+                user=user, value=value, date=self.now - datetime.timedelta(days_ago)
+            )
+        return user
+
+    def get_statuses(self):
+        return dict(
+            ShiftUserData.objects.exclude(penalty_status="").values_list(
+                "user", "penalty_status"
+            )
+        )
+
+    def test_evaluate_penalties(self):
+        evaluations = {
+            evaluation.user_id: evaluation for evaluation in evaluate_penalties()
+        }
+
+        self.assertEqual(
+            {user_pk: evaluation.status for user_pk, evaluation in evaluations.items()},
+            {
+                self.blocked_user.pk: "blocked",
+                self.warned_user.pk: "warned",
+                self.deep_user.pk: "deep",
+            },
+        )
+        self.assertEqual(
+            evaluations[self.warned_user.pk].below_since[-1],
+            self.now - datetime.timedelta(days=10),
+        )
+        self.assertIsNone(evaluations[self.warned_user.pk].below_since[-3])
+
+        self.assertEqual(apply_penalty_statuses(evaluations.values()), 3)
+        self.assertEqual(
+            self.get_statuses(),
+            {
+                self.blocked_user.pk: "blocked",
+                self.warned_user.pk: "warned",
+                self.deep_user.pk: "deep",
+            },
+        )
+
+        # Once the balance is fine again, the status is reset
+        ShiftAccountEntry.objects.create(
+            user=self.deep_user, value=4, date=self.now - datetime.timedelta(days=1)
+        )
+        self.assertEqual(apply_penalty_statuses(evaluate_penalties()), 1)
+        self.assertNotIn(self.deep_user.pk, self.get_statuses())
+
+    def test_penalty_report(self):
+        login_as_staff(self.client)
+        response = self.client.get(reverse("shifts:penalty_report"))
+        self.assertEqual(len(response.context["evaluations"]), 3)
@@ -0,0 +1,62 @@
+import datetime
+
+from django.test import TestCase
+
+from tapir.accounts.models import TapirUser
+from tapir.shifts.models import (
+    ShiftTemplate,
+    ShiftAttendanceTemplate,
+    ShiftTemplatePropagationJob,
+)
+from tapir.shifts.propagation import (
+    enqueue_attendance_template_change,
+    process_propagation_jobs,
+)
+
+
+class PropagationJobTestCase(TestCase):
+    def setUp(self):
+        self.user = TapirUser.objects.create(username="hilda.queue")
+        self.shift_template = ShiftTemplate.objects.create(
+            start_time=datetime.time(9, 0), end_time=datetime.time(12, 0)
+        )
+        self.shift = self.shift_template.create_shift(
+            start_date=datetime.date.today() + datetime.timedelta(days=7)
+        )
+        process_propagation_jobs()
+
+    def test_jobs_are_coalesced(self):
+        ShiftAttendanceTemplate.objects.create(
+            user=self.user, shift_template=self.shift_template
+        )
+        enqueue_attendance_template_change(self.shift_template, self.user)
+        ShiftAttendanceTemplate.objects.filter(user=self.user).delete()
+        enqueue_attendance_template_change(self.shift_template, self.user)
+        ShiftAttendanceTemplate.objects.create(
+            user=self.user, shift_template=self.shift_template
+        )
+        enqueue_attendance_template_change(self.shift_template, self.user)
+
+        self.assertTrue(self.shift_template.is_propagation_pending())
+        self.assertEqual(self.shift.attendances.count(), 0)
+
+        self.assertEqual(process_propagation_jobs(), 3)
+
+        self.assertFalse(self.shift_template.is_propagation_pending())
+        self.assertEqual(
+            list(self.shift.attendances.values_list("user", flat=True)),
+            [self.user.pk],
+        )
+
+    def test_template_save_enqueues_resync(self):
+        ShiftAttendanceTemplate.objects.create(
+            user=self.user, shift_template=self.shift_template
+        )
+        self.shift_template.num_slots = 5
+        self.shift_template.save()
+
+        self.assertEqual(
+            ShiftTemplatePropagationJob.objects.filter(user__isnull=True).count(), 1
+        )
+        process_propagation_jobs()
+        self.assertEqual(self.shift.attendances.count(), 1)
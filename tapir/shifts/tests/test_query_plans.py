@@ -0,0 +1,168 @@
+import datetime
+import re
+
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+
+from tapir.accounts.models import TapirUser
+from tapir.shifts import ledger
+from tapir.shifts.models import (
+    Shift,
+    ShiftAccountEntry,
+    ShiftAttendance,
+    ShiftTemplate,
+    ShiftTemplateGroup,
+    ShiftUserData,
+)
+
+USER_COUNT = 200
+DAY_COUNT = 365
+# Days of the dataset from today on, most shifts are in the past as in production
+FUTURE_DAY_COUNT = 28
+SHIFTS_PER_DAY = 8
+
+
+def get_sequential_scans(queryset):
+    """Return the tables that SQLite would scan sequentially to evaluate the queryset, and the plan.
+
+    The tests run on SQLite (see the settings), the plans of PostgreSQL aren't checked."""
+    plan = queryset.explain()
+    # A SEARCH finds the rows in an index, a SCAN reads the whole table. Tables in subqueries are only named by their
+    # alias, so any SCAN counts.
+    return re.findall(r"\bSCAN (?:TABLE )?(\w+)", plan), plan
+
+
+class QueryPlanTestCase(TestCase):
+    """Checks that the key querysets are answered from the indexes, on a dataset of a year of shifts."""
+
+    @classmethod
+    def setUpTestData(cls):
+        TapirUser.objects.bulk_create(
+            [TapirUser(username="hilda.plan%d" % index) for index in range(USER_COUNT)]
+        )
+        cls.users = list(
+            TapirUser.objects.filter(username__startswith="hilda.plan").order_by("pk")
+        )
+        ShiftUserData.objects.bulk_create(
+            [
+                ShiftUserData(user=user)
+                for user in cls.users
+                if not ShiftUserData.objects.filter(user=user).exists()
+            ]
+        )
+        cls.user = cls.users[0]
+
+        group = ShiftTemplateGroup.objects.create(name="Week A", week_index=1)
+        shift_template = ShiftTemplate.objects.create(
+            name="Supermarket",
+            group=group,
+            start_time=datetime.time(9, 0),
+            end_time=datetime.time(12, 0),
+        )
+
+        cls.start = timezone.make_aware(
+            datetime.datetime.combine(
+                timezone.localdate()
+                - datetime.timedelta(days=DAY_COUNT - FUTURE_DAY_COUNT),
+                datetime.time(6, 0),
+            )
+        )
+        shifts = []
+        for day in range(DAY_COUNT):
+            for index in range(SHIFTS_PER_DAY):
+                start_time = cls.start + datetime.timedelta(days=day, hours=index)
+                shifts.append(
+                    Shift(
+                        name="Supermarket",
+                        shift_template=shift_template if index == 0 else None,
+                        start_time=start_time,
+                        end_time=start_time + datetime.timedelta(hours=3),
+                        num_slots=3,
+                    )
+                )
+        Shift.objects.bulk_create(shifts)
+
+        now = timezone.now()
+        ShiftAttendance.objects.bulk_create(
+            [
+                ShiftAttendance(
+                    shift_id=shift_pk,
+                    user=cls.users[(index + slot) % USER_COUNT],
+                    state=ShiftAttendance.State.DONE
+                    if start_time < now
+                    else ShiftAttendance.State.PENDING,
+                )
+                for index, (shift_pk, start_time) in enumerate(
+                    Shift.objects.order_by("start_time").values_list("pk", "start_time")
+                )
+                for slot in range(2)
+            ]
+        )
+        Shift.objects.update_attendance_counts()
+
+        ShiftAccountEntry.objects.bulk_create(
+            [
+                ShiftAccountEntry(
+                    user=user,
+                    value=-1,
+                    date=cls.start + datetime.timedelta(days=day),
+                    description="Debit",
+                )
+                for user in cls.users
+                for day in range(0, DAY_COUNT, 28)
+            ]
+        )
+
+        # Up to date statistics, as maintained by autovacuum in production
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def assertNoSequentialScan(self, queryset):
+        tables, plan = get_sequential_scans(queryset)
+        self.assertEqual(tables, [], "Sequential scan in the plan:\n%s" % plan)
+
+    def test_upcoming_days(self):
+        today = timezone.localdate()
+        shifts = Shift.objects.filter(
+            start_time__gte=timezone.make_aware(
+                datetime.datetime.combine(today, datetime.time.min)
+            ),
+            start_time__lt=timezone.make_aware(
+                datetime.datetime.combine(
+                    today + datetime.timedelta(days=14), datetime.time.min
+                )
+            ),
+        ).order_by("start_time")
+        self.assertNoSequentialScan(shifts)
+
+        # The valid attendances prefetched by Shift.objects.with_valid_attendances()
+        self.assertNoSequentialScan(
+            ShiftAttendance.objects.filter(
+                shift__in=list(shifts.values_list("pk", flat=True)),
+                state__in=ShiftAttendance.VALID_STATES,
+            )
+        )
+
+    def test_user_upcoming_attendances(self):
+        self.assertNoSequentialScan(
+            self.user.shift_user_data.get_upcoming_shift_attendances()
+        )
+
+    def test_balance(self):
+        self.assertNoSequentialScan(
+            ledger.get_balances_as_of(timezone.now()).filter(user=self.user)
+        )
+        self.assertNoSequentialScan(
+            ShiftAccountEntry.objects.filter(
+                user=self.user, date__gt=self.start + datetime.timedelta(days=100)
+            ).order_by("date")
+        )
+
+    def test_free_slot_search(self):
+        today = timezone.localdate()
+        self.assertNoSequentialScan(
+            Shift.objects.with_free_slots(
+                start_date=today, end_date=today + datetime.timedelta(days=28)
+            )
+        )
@@ -0,0 +1,169 @@
+import datetime
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from tapir.accounts.models import TapirUser
+from tapir.shifts.eligibility import JoinEligibility
+from tapir.shifts.models import ShiftAttendance, ShiftWaitlistEntry
+from tapir.shifts.reservation import (
+    SHIFT_FULL,
+    ReservationError,
+    promote_waitlist,
+    reserve_slot,
+)
+from tapir.shifts.tests.utils import create_shift, login_as_staff
+
+
+class ReservationTestCase(TestCase):
+    def setUp(self):
+        self.shift = create_shift(
+            timezone.now() + datetime.timedelta(days=1), num_slots=2
+        )
+        self.users = [
+            TapirUser.objects.create(username="hilda.%d" % i) for i in range(4)
+        ]
+
+    def test_reserve_slot(self):
+        reserve_slot(self.users[0], self.shift.pk)
+        reserve_slot(self.users[1], self.shift.pk)
+
+        with self.assertRaises(ReservationError) as context:
+            reserve_slot(self.users[2], self.shift.pk)
+        self.assertEqual(context.exception.reason, SHIFT_FULL)
+        with self.assertRaises(ReservationError) as context:
+            reserve_slot(self.users[0], self.shift.pk)
+        self.assertEqual(context.exception.reason, JoinEligibility.ALREADY_REGISTERED)
+
+        self.shift.refresh_from_db()
+        self.assertEqual(self.shift.valid_attendance_count, 2)
+        self.assertEqual(self.shift.free_slot_count, 0)
+
+    def test_waitlist_promoted_when_slot_frees_up(self):
+        first_attendance = reserve_slot(self.users[0], self.shift.pk)
+        reserve_slot(self.users[1], self.shift.pk)
+        for user in self.users[2:]:
+            self.assertIsInstance(
+                reserve_slot(user, self.shift.pk, join_waitlist=True),
+                ShiftWaitlistEntry,
+            )
+
+        first_attendance.state = ShiftAttendance.State.CANCELLED
+        first_attendance.save()
+
+        self.assertTrue(
+            ShiftAttendance.objects.filter(
+                shift=self.shift,
+                user=self.users[2],
+                state=ShiftAttendance.State.PENDING,
+            ).exists()
+        )
+        self.assertEqual(
+            list(self.shift.waitlist_entries.values_list("user", flat=True)),
+            [self.users[3].pk],
+        )
+        self.shift.refresh_from_db()
+        self.assertEqual(self.shift.free_slot_count, 0)
+
+    def test_waitlist_promoted_when_slots_are_added(self):
+        reserve_slot(self.users[0], self.shift.pk)
+        reserve_slot(self.users[1], self.shift.pk)
+        reserve_slot(self.users[2], self.shift.pk, join_waitlist=True)
+
+        self.shift.num_slots = 3
+        self.shift.save()
+
+        self.assertEqual(self.shift.attendances.count(), 3)
+        self.assertFalse(self.shift.waitlist_entries.exists())
+
+    def test_ineligible_users_leave_the_waitlist(self):
+        ShiftWaitlistEntry.objects.create(shift=self.shift, user=self.users[0])
+        ShiftAttendance.objects.create(shift=self.shift, user=self.users[0])
+
+        self.assertEqual(promote_waitlist(self.shift.pk), [])
+        self.assertFalse(self.shift.waitlist_entries.exists())
+
+    def test_views(self):
+        user = login_as_staff(self.client)
+        reserve_slot(self.users[0], self.shift.pk)
+        reserve_slot(self.users[1], self.shift.pk)
+
+        response = self.client.get(
+            reverse("shifts:shift_register_user", args=[self.shift.pk]), follow=True
+        )
+        self.assertContains(response, "The shift is full.")
+        self.assertFalse(self.shift.attendances.filter(user=user).exists())
+
+        response = self.client.post(
+            reverse("shifts:join_shift_waitlist", args=[self.shift.pk]), follow=True
+        )
+        self.assertContains(response, "You are on the waitlist")
+        self.assertTrue(self.shift.waitlist_entries.filter(user=user).exists())
+
+
+@unittest.skipUnless(
+    connection.vendor == "postgresql", "Needs row locks, which SQLite doesn't have"
+)
+class ConcurrentReservationTestCase(TransactionTestCase):
+    RESERVATION_COUNT = 300
+    SLOT_COUNT = 5
+
+    def test_concurrent_reservations_never_overbook(self):
+        shift = create_shift(
+            timezone.now() + datetime.timedelta(days=1), num_slots=self.SLOT_COUNT
+        )
+        users = [
+            TapirUser.objects.create(username="hilda.%d" % i)
+            for i in range(self.RESERVATION_COUNT)
+        ]
+
+        def reserve(user):
+            try:
+                # Every other user would rather wait than give up
+                reserve_slot(user, shift.pk, join_waitlist=bool(user.pk % 2))
+            except ReservationError:
+                pass
+            finally:
+                connection.close()
+
+        def promote(_):
+            try:
+                promote_waitlist(shift.pk)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=50) as executor:
+            reservations = [executor.submit(reserve, user) for user in users]
+            promotions = [executor.submit(promote, i) for i in range(30)]
+            for future in reservations + promotions:
+                future.result()
+
+        shift.refresh_from_db()
+        self.assertEqual(
+            shift.attendances.filter(state__in=ShiftAttendance.VALID_STATES).count(),
+            self.SLOT_COUNT,
+        )
+        self.assertEqual(shift.valid_attendance_count, self.SLOT_COUNT)
+        self.assertEqual(shift.free_slot_count, 0)
+        # Everybody who asked for the waitlist is either registered or waiting
+        waitlisting_user_pks = {user.pk for user in users if user.pk % 2}
+        self.assertEqual(
+            set(shift.waitlist_entries.values_list("user", flat=True))
+            | set(
+                shift.attendances.filter(user__in=waitlisting_user_pks).values_list(
+                    "user", flat=True
+                )
+            ),
+            waitlisting_user_pks,
+        )
+
+        # Freeing a slot promotes the user that joined the waitlist first
+        first_waitlist_entry = shift.waitlist_entries.first()
+        shift.attendances.order_by("pk").first().delete()
+        self.assertTrue(
+            shift.attendances.filter(user=first_waitlist_entry.user_id).exists()
+        )
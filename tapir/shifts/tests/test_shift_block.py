@@ -0,0 +1,68 @@
+import datetime
+
+from django.template import Context, Template
+from django.test import TestCase
+from django.utils import timezone
+
+from tapir.accounts.models import TapirUser
+from tapir.shifts.models import (
+    ShiftAttendance,
+    ShiftAttendanceTemplate,
+    ShiftTemplate,
+    ShiftTemplateGroup,
+    ShiftUserData,
+)
+from tapir.shifts.templatetags.shifts import (
+    get_shift_block_objects,
+    shift_to_block_object,
+)
+
+
+class ShiftBlockTestCase(TestCase):
+    def setUp(self):
+        self.template_user = TapirUser.objects.create(username="hilda.template")
+        self.single_user = TapirUser.objects.create(username="hilda.single")
+        shift_template = ShiftTemplate.objects.create(
+            name="Supermarket",
+            group=ShiftTemplateGroup.objects.create(name="Week A", week_index=1),
+            weekday=0,
+            start_time=datetime.time(9, 0),
+            end_time=datetime.time(12, 0),
+            num_slots=3,
+        )
+        ShiftAttendanceTemplate.objects.create(
+            user=self.template_user, shift_template=shift_template
+        )
+        self.shifts = [
+            shift_template.create_shift(
+                start_date=timezone.localdate() + datetime.timedelta(weeks=week)
+            )
+            for week in range(1, 4)
+        ]
+        for shift in self.shifts:
+            ShiftAttendance.objects.create(shift=shift, user=self.single_user)
+
+    def test_get_shift_block_objects(self):
+        with self.assertNumQueries(2):
+            blocks = get_shift_block_objects(self.shifts, fill_parent=True)
+
+        for shift in self.shifts:
+            self.assertEqual(blocks[shift.pk], shift_to_block_object(shift, True))
+        self.assertEqual(
+            blocks[self.shifts[0].pk]["attendances"], ["template", "single", "empty"]
+        )
+        self.assertEqual(blocks[self.shifts[0].pk]["template_group"], "Ⓐ")
+
+    def test_user_shifts_overview(self):
+        ShiftUserData.objects.get_or_create(user=self.single_user)
+        user = TapirUser.objects.select_related("shift_user_data").get(
+            pk=self.single_user.pk
+        )
+        template = Template("{% load shifts %}{% user_shifts_overview user %}")
+        template.render(Context({"user": user}))
+
+        # The number of queries doesn't depend on the number of upcoming shifts
+        with self.assertNumQueries(4):
+            html = template.render(Context({"user": user}))
+        for shift in self.shifts:
+            self.assertIn("shift_%d" % shift.pk, html)
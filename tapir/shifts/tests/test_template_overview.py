@@ -0,0 +1,87 @@
+import datetime
+
+from django.test import TestCase
+from django.urls import reverse
+
+from tapir.accounts.models import TapirUser
+from tapir.shifts.models import (
+    ShiftAttendanceTemplate,
+    ShiftTemplate,
+    ShiftTemplateGroup,
+    WEEKDAY_CHOICES,
+)
+from tapir.shifts.template_overview import (
+    build_template_overview,
+    get_template_overview,
+)
+from tapir.shifts.tests.utils import login_as_staff
+
+
+class TemplateOverviewTestCase(TestCase):
+    def setUp(self):
+        self.week_a = ShiftTemplateGroup.objects.create(name="Week A", week_index=1)
+        self.week_b = ShiftTemplateGroup.objects.create(name="Week B", week_index=2)
+        self.supermarket_a = self.create_template("Supermarket", self.week_a)
+        self.cashier_b = self.create_template("Cashier", self.week_b)
+        for username in ["hilda.one", "hilda.two"]:
+            ShiftAttendanceTemplate.objects.create(
+                user=TapirUser.objects.create(username=username),
+                shift_template=self.supermarket_a,
+            )
+
+    @staticmethod
+    def create_template(name, group):
+        return ShiftTemplate.objects.create(
+            name=name,
+            group=group,
+            weekday=1,
+            start_time=datetime.time(9, 0),
+            end_time=datetime.time(12, 0),
+            num_slots=3,
+        )
+
+    def test_build_template_overview(self):
+        with self.assertNumQueries(1):
+            overview = build_template_overview()
+
+        self.assertEqual(overview["groups"], ["Week A", "Week B"])
+        self.assertEqual(len(overview["days"]), len(WEEKDAY_CHOICES))
+        time_group = overview["days"][WEEKDAY_CHOICES[1][1]]["09:00:00"]
+        self.assertEqual(
+            time_group["Week A"]["Supermarket"]["pk"], self.supermarket_a.pk
+        )
+        self.assertEqual(
+            time_group["Week A"]["Supermarket"]["block"]["attendances"],
+            ["template", "template", "empty"],
+        )
+        self.assertEqual(
+            time_group["Week A"]["Supermarket"]["block"]["background"], "warning"
+        )
+        self.assertIsNone(time_group["Week A"]["Cashier"])
+        self.assertIsNone(time_group["Week B"]["Supermarket"])
+        self.assertEqual(
+            time_group["Week B"]["Cashier"]["block"]["background"], "danger"
+        )
+
+    def test_cache_invalidated_on_attendance_template_change(self):
+        get_template_overview()
+        with self.assertNumQueries(2):
+            get_template_overview()
+
+        ShiftAttendanceTemplate.objects.create(
+            user=TapirUser.objects.create(username="hilda.three"),
+            shift_template=self.supermarket_a,
+        )
+        overview = get_template_overview()
+        self.assertEqual(
+            overview["days"][WEEKDAY_CHOICES[1][1]]["09:00:00"]["Week A"][
+                "Supermarket"
+            ]["block"]["background"],
+            "success",
+        )
+
+    def test_view(self):
+        login_as_staff(self.client)
+        response = self.client.get(reverse("shifts:shift_template_overview"))
+        self.assertContains(response, "template_%d" % self.supermarket_a.pk)
+        self.assertContains(response, "template_%d" % self.cashier_b.pk)
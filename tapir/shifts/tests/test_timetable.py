@@ -0,0 +1,128 @@
+import datetime
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from tapir.accounts.models import TapirUser
+from tapir.shifts import timetable
+from tapir.shifts.models import (
+    ShiftAttendance,
+    ShiftAttendanceTemplate,
+    ShiftTemplate,
+    ShiftTemplateGroup,
+)
+from tapir.shifts.tests.utils import create_shift, local_datetime, login_as_staff
+
+
+class TimetableTestCase(TestCase):
+    def setUp(self):
+        self.date = timezone.localdate() + datetime.timedelta(days=1)
+        self.shift_template = ShiftTemplate.objects.create(
+            name="Supermarket",
+            group=ShiftTemplateGroup.objects.create(name="Week A", week_index=1),
+            weekday=self.date.weekday(),
+            start_time=datetime.time(9, 0),
+            end_time=datetime.time(12, 0),
+            num_slots=3,
+        )
+        self.template_user = TapirUser.objects.create(username="hilda.template")
+        ShiftAttendanceTemplate.objects.create(
+            user=self.template_user, shift_template=self.shift_template
+        )
+        self.morning_shift = self.shift_template.create_shift(start_date=self.date)
+        self.afternoon_shift = create_shift(local_datetime(self.date, 15), num_slots=2)
+        self.cashier_shift = create_shift(
+            local_datetime(self.date, 10), hours=2, name="Cashier", num_slots=2
+        )
+        ShiftAttendance.objects.create(
+            shift=self.morning_shift,
+            user=TapirUser.objects.create(username="hilda.single"),
+        )
+
+    def test_build_layout(self):
+        with self.assertNumQueries(1):
+            layout = timetable.build_layout(self.date, self.date)
+
+        self.assertEqual(len(layout["days"]), 1)
+        self.assertEqual(layout["days"][0]["date"], self.date)
+        columns = {
+            column["name"]: column["shifts"] for column in layout["days"][0]["columns"]
+        }
+        self.assertEqual(list(columns), ["Supermarket", "Cashier"])
+
+        morning, afternoon = columns["Supermarket"]
+        self.assertEqual(morning["id"], self.morning_shift.pk)
+        self.assertEqual(morning["margin_top"], 0)
+        self.assertEqual(morning["height"], 3 * timetable.HOUR_HEIGHT)
+        self.assertEqual(morning["valid_attendance_count"], 2)
+        self.assertEqual(morning["template_attendance_count"], 1)
+        self.assertEqual(morning["free_slot_count"], 1)
+        self.assertEqual(morning["group"], "Week A")
+        # Placed three hours below the end of the morning shift
+        self.assertEqual(afternoon["margin_top"], 3 * timetable.HOUR_HEIGHT)
+        self.assertEqual(columns["Cashier"][0]["margin_top"], 1 * timetable.HOUR_HEIGHT)
+
+    def test_layout_cached_until_shift_changes(self):
+        timetable.get_layout(self.date, self.date)
+        with self.assertNumQueries(2):
+            timetable.get_layout(self.date, self.date)
+
+        self.cashier_shift.delete()
+        self.assertEqual(
+            len(timetable.get_layout(self.date, self.date)["days"][0]["columns"]), 1
+        )
+
+    @override_settings(SHIFTS_VIRTUAL_FUTURE_SHIFTS=True)
+    def test_build_layout_with_virtual_shifts(self):
+        # Four weeks later, the shift of the template isn't stored yet
+        date = self.date + datetime.timedelta(weeks=4)
+        self.shift_template.group.week_index = ShiftTemplateGroup.get_week_index(date)
+        self.shift_template.group.save()
+
+        layout = timetable.build_layout(date, date)
+
+        (column,) = layout["days"][0]["columns"]
+        (shift,) = column["shifts"]
+        self.assertIsNone(shift["id"])
+        self.assertEqual(
+            shift["url"],
+            reverse("shifts:virtual_shift_detail", args=[self.shift_template.pk, date]),
+        )
+        self.assertEqual(shift["valid_attendance_count"], 1)
+        self.assertEqual(shift["template_attendance_count"], 1)
+        self.assertEqual(shift["free_slot_count"], 2)
+        self.assertEqual(shift["group"], "Week A")
+
+        # Stored shifts are included as well
+        morning = timetable.build_layout(self.date, self.date)["days"][0]["columns"][0][
+            "shifts"
+        ][0]
+        self.assertEqual(morning["id"], self.morning_shift.pk)
+        self.assertEqual(morning["valid_attendance_count"], 2)
+        self.assertEqual(morning["template_attendance_count"], 1)
+
+    def test_views(self):
+        login_as_staff(self.client)
+
+        response = self.client.get(
+            reverse("shifts:timetable_layout"),
+            {"start_date": self.date, "end_date": self.date},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()["days"][0]["columns"][0]["shifts"][0]["url"],
+            reverse("shifts:shift_detail", args=[self.morning_shift.pk]),
+        )
+
+        response = self.client.get(
+            reverse("shifts:timetable_layout"),
+            {
+                "start_date": self.date,
+                "end_date": self.date + datetime.timedelta(days=timetable.MAX_DAYS),
+            },
+        )
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.get(reverse("shifts:upcoming_timetable"))
+        self.assertContains(response, "shift_%d" % self.cashier_shift.pk)
@@ -0,0 +1,81 @@
+import datetime
+
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from tapir.accounts.models import TapirUser
+from tapir.shifts.models import Shift, ShiftAttendance
+from tapir.shifts.views import UPCOMING_DAYS
+from tapir.shifts.tests.utils import login_as_staff
+
+
+class UpcomingDaysTestCase(TestCase):
+    def setUp(self):
+        login_as_staff(self.client)
+        self.date = timezone.localdate() + datetime.timedelta(days=2)
+        self.shift = Shift.objects.create(
+            name="Supermarket",
+            start_time=timezone.make_aware(
+                datetime.datetime.combine(self.date, datetime.time(9, 0))
+            ),
+            end_time=timezone.make_aware(
+                datetime.datetime.combine(self.date, datetime.time(12, 0))
+            ),
+            num_slots=3,
+        )
+
+    def get_upcoming_days(self, start_date=None):
+        url = reverse("shifts:shift_upcoming")
+        if start_date:
+            url += "?start=" + start_date.isoformat()
+        return self.client.get(url)
+
+    def test_window(self):
+        response = self.get_upcoming_days()
+        self.assertEqual(
+            [day for day, rendered_day in response.context["days"]],
+            [timezone.localdate(), self.date],
+        )
+        self.assertContains(response, "Supermarket")
+
+        response = self.get_upcoming_days(response.context["next_start_date"])
+        self.assertEqual([day for day, rendered_day in response.context["days"]], [])
+        self.assertEqual(response.context["previous_start_date"], timezone.localdate())
+        self.assertNotContains(response, "Supermarket")
+
+        self.assertEqual(
+            self.get_upcoming_days(self.date + datetime.timedelta(days=1)).context[
+                "next_start_date"
+            ],
+            self.date + datetime.timedelta(days=1 + UPCOMING_DAYS),
+        )
+
+    def test_cached_days_are_reused(self):
+        self.get_upcoming_days()
+        # Only the versions and the rendered days are read from the cache
+        with self.assertNumQueries(4):
+            response = self.get_upcoming_days()
+        self.assertContains(response, "Supermarket")
+
+    def test_attendance_change_invalidates_day(self):
+        self.assertContains(self.get_upcoming_days(), "radio_button_unchecked", count=3)
+
+        ShiftAttendance.objects.create(
+            shift=self.shift, user=TapirUser.objects.create(username="hilda.attendant")
+        )
+
+        self.assertContains(self.get_upcoming_days(), "radio_button_unchecked", count=2)
+
+    def test_attendance_bulk_delete_invalidates_day(self):
+        ShiftAttendance.objects.create(
+            shift=self.shift, user=TapirUser.objects.create(username="hilda.attendant")
+        )
+        self.assertContains(self.get_upcoming_days(), "radio_button_unchecked", count=2)
+
+        # Attendances are deleted with a single statement, without loading them
+        with self.assertNumQueries(1):
+            ShiftAttendance.objects.filter(shift=self.shift).delete()
+        Shift.objects.filter(pk=self.shift.pk).update_attendance_counts()
+
+        self.assertContains(self.get_upcoming_days(), "radio_button_unchecked", count=3)
@@ -0,0 +1,210 @@
+import datetime
+
+from django.template import Context, Template
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from tapir.accounts.models import TapirUser
+from tapir.shifts import virtual
+from tapir.shifts.models import (
+    Shift,
+    ShiftAccountEntry,
+    ShiftAttendance,
+    ShiftAttendanceTemplate,
+    ShiftTemplate,
+    ShiftTemplateGroup,
+)
+from tapir.shifts.tests.utils import login_as_staff
+
+
+@override_settings(SHIFTS_VIRTUAL_FUTURE_SHIFTS=True)
+class VirtualShiftTestCase(TestCase):
+    def setUp(self):
+        self.user = TapirUser.objects.create(username="hilda.virtual")
+        self.start_date = timezone.localdate() + datetime.timedelta(days=1)
+        # The group of the week of start_date, so that the template occurs once in the first seven days
+        self.group = ShiftTemplateGroup.objects.create(
+            name="Week A", week_index=ShiftTemplateGroup.get_week_index(self.start_date)
+        )
+        self.shift_template = ShiftTemplate.objects.create(
+            name="Supermarket",
+            group=self.group,
+            weekday=self.start_date.weekday(),
+            start_time=datetime.time(9, 0),
+            end_time=datetime.time(12, 0),
+        )
+        ShiftAttendanceTemplate.objects.create(
+            user=self.user, shift_template=self.shift_template
+        )
+
+    def test_get_shifts(self):
+        shifts = virtual.get_shifts(
+            self.start_date, self.start_date + datetime.timedelta(weeks=8, days=-1)
+        )
+
+        self.assertEqual(len(shifts), 2)
+        self.assertTrue(all(shift.is_virtual() for shift in shifts))
+        self.assertEqual(shifts[0].start_time_local_date(), self.start_date)
+        self.assertEqual(
+            [attendance.user for attendance in shifts[0].virtual_attendances],
+            [self.user],
+        )
+        self.assertEqual(shifts[0].free_slot_count, shifts[0].num_slots - 1)
+        self.assertFalse(Shift.objects.exists())
+
+    def test_materialize_shift(self):
+        shift = virtual.materialize_shift(self.shift_template, self.start_date)
+
+        self.assertEqual(shift.valid_attendance_count, 1)
+        self.assertEqual(
+            virtual.materialize_shift(self.shift_template, self.start_date), shift
+        )
+        # The stored shift replaces the virtual one
+        shifts = virtual.get_shifts(self.start_date, self.start_date)
+        self.assertEqual(shifts, [shift])
+
+        with self.assertRaises(ValueError):
+            virtual.materialize_shift(
+                self.shift_template, self.start_date + datetime.timedelta(days=1)
+            )
+
+    def test_close_out_day_of_virtual_shifts(self):
+        login_as_staff(self.client)
+        # A template whose virtual shift was yesterday and has never been stored
+        shift_date = timezone.localdate() - datetime.timedelta(days=1)
+        shift_template = ShiftTemplate.objects.create(
+            name="Cashier",
+            group=ShiftTemplateGroup.objects.create(
+                name="Week B", week_index=ShiftTemplateGroup.get_week_index(shift_date)
+            ),
+            weekday=shift_date.weekday(),
+            start_time=datetime.time(9, 0),
+            end_time=datetime.time(12, 0),
+        )
+        ShiftAttendanceTemplate.objects.create(
+            user=self.user, shift_template=shift_template
+        )
+        self.assertEqual(virtual.get_shifts(shift_date, shift_date), [])
+        url = reverse("shifts:close_out_day", args=[shift_date])
+
+        response = self.client.get(url)
+        self.assertEqual(len(response.context["form"].fields), 1)
+
+        attendance = ShiftAttendance.objects.get(
+            shift__shift_template=shift_template, user=self.user
+        )
+        response = self.client.post(
+            url, {"attendance_%d" % attendance.pk: ShiftAttendance.State.DONE.value}
+        )
+
+        self.assertRedirects(response, reverse("shifts:shift_upcoming"))
+        attendance.refresh_from_db()
+        self.assertEqual(attendance.state, ShiftAttendance.State.DONE)
+        self.assertEqual(ShiftAccountEntry.objects.get(user=self.user).value, 1)
+
+    def test_materialize_shifts(self):
+        end_date = self.start_date + datetime.timedelta(weeks=8, days=-1)
+
+        shifts = virtual.materialize_shifts(self.start_date, end_date)
+
+        self.assertEqual(len(shifts), 2)
+        self.assertEqual(Shift.objects.count(), 2)
+        self.assertEqual(virtual.get_shifts(self.start_date, end_date), shifts)
+        self.assertEqual(virtual.materialize_shifts(self.start_date, end_date), shifts)
+        self.assertEqual(Shift.objects.count(), 2)
+
+    def test_virtual_shift_views(self):
+        login_as_staff(self.client)
+        shift = virtual.get_shifts(self.start_date, self.start_date)[0]
+
+        response = self.client.get(shift.get_absolute_url())
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Shift.objects.exists())
+
+        response = self.client.post(
+            reverse(
+                "shifts:materialize_shift",
+                args=[self.shift_template.pk, self.start_date],
+            ),
+            {"next": "edit"},
+        )
+        stored_shift = Shift.objects.get()
+        self.assertRedirects(
+            response, reverse("shifts:shift_edit", args=[stored_shift.pk])
+        )
+        self.assertRedirects(
+            self.client.get(shift.get_absolute_url()),
+            stored_shift.get_absolute_url(),
+        )
+
+        response = self.client.get(
+            reverse(
+                "shifts:virtual_shift_detail",
+                args=[
+                    self.shift_template.pk,
+                    self.start_date + datetime.timedelta(days=1),
+                ],
+            )
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_search_free_slots(self):
+        login_as_staff(self.client)
+        shift = virtual.get_shifts(self.start_date, self.start_date)[0]
+
+        response = self.client.get(
+            reverse("shifts:search_free_slots"),
+            {"start_date": self.start_date, "group": self.group.pk},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        # Without end date, the virtual shifts of one cycle are searched
+        self.assertEqual(
+            [
+                (result["id"], result["free_slot_count"], result["url"])
+                for result in response.json()["shifts"]
+            ],
+            [(None, shift.num_slots - 1, shift.get_absolute_url())],
+        )
+
+        response = self.client.get(
+            reverse("shifts:search_free_slots"),
+            {
+                "start_date": self.start_date,
+                "earliest_start_time": datetime.time(10, 0),
+            },
+        )
+        self.assertEqual(response.json()["shifts"], [])
+
+    def test_upcoming_attendances(self):
+        stored_shift = virtual.materialize_shift(
+            self.shift_template, self.start_date + datetime.timedelta(weeks=4)
+        )
+        other_user = TapirUser.objects.create(username="hilda.other")
+        ShiftAttendanceTemplate.objects.create(
+            user=other_user, shift_template=self.shift_template
+        )
+
+        attendances = virtual.get_upcoming_attendances(self.user)
+
+        self.assertEqual(
+            [
+                (attendance.shift.start_time_local_date(), attendance.pk is None)
+                for attendance in attendances
+            ],
+            [
+                (self.start_date, True),
+                (self.start_date + datetime.timedelta(weeks=4), False),
+            ],
+        )
+        self.assertEqual(attendances[0].shift.valid_attendance_count, 2)
+        self.assertEqual(
+            attendances[1], ShiftAttendance.objects.get(shift=stored_shift)
+        )
+
+        html = Template("{% load shifts %}{% user_shifts_overview user %}").render(
+            Context({"user": self.user})
+        )
+        self.assertIn(attendances[0].shift.get_absolute_url(), html)
+        self.assertIn(stored_shift.get_absolute_url(), html)
@@ -1,5 +1,5 @@
 from django.test import TestCase
-from datetime import time, date
+from datetime import time, date, timedelta
 
 from tapir.accounts.models import TapirUser
 from tapir.shifts.models import (
@@ -29,3 +29,36 @@ class ShiftsTestCase(TestCase):
         # We expect user2 to be removed and user1 to be added
         s.update_attendances_from_shift_template()
         self.assertEqual(s.attendances.all()[0].user, user1)
+
+    def test_shift_template_propagate_attendance_template_changes(self):
+        user1 = TapirUser.objects.create(username="hilda.propagation")
+        user2 = TapirUser.objects.create(username="otto.propagation")
+
+        st = ShiftTemplate.objects.create(
+            start_time=time(15, 00), end_time=time(18, 00)
+        )
+        past_shift = st.create_shift(start_date=date(2021, 3, 24))
+        future_shifts = [
+            st.create_shift(start_date=date.today() + timedelta(days=days))
+            for days in [7, 14]
+        ]
+        ShiftAttendance.objects.create(shift=future_shifts[0], user=user2)
+
+        ShiftAttendanceTemplate.objects.create(shift_template=st, user=user1)
+        ShiftAttendanceTemplate.objects.create(shift_template=st, user=user2)
+        st.propagate_attendance_template_changes(added_user_pks=[user1.pk, user2.pk])
+
+        self.assertQuerysetEqual(past_shift.attendances.all(), [])
+        for shift in future_shifts:
+            self.assertEqual(
+                sorted(shift.attendances.values_list("user", flat=True)),
+                [user1.pk, user2.pk],
+            )
+
+        ShiftAttendanceTemplate.objects.filter(user=user1).delete()
+        st.propagate_attendance_template_changes(removed_user_pks=[user1.pk])
+
+        for shift in future_shifts:
+            self.assertEqual(
+                list(shift.attendances.values_list("user", flat=True)), [user2.pk]
+            )
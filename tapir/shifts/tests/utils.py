@@ -0,0 +1,43 @@
+import datetime
+
+from django.utils import timezone
+
+from tapir.accounts.models import TapirUser
+from tapir.shifts.models import Shift
+
+
+def local_datetime(date: datetime.date, hour: int) -> datetime.datetime:
+    """The aware datetime of the full hour on the date in the local time zone."""
+    return timezone.make_aware(datetime.datetime.combine(date, datetime.time(hour)))
+
+
+def create_shift(
+    start_time: datetime.datetime,
+    hours=3,
+    name="Supermarket",
+    num_slots=3,
+    shift_template=None,
+) -> Shift:
+    """Create a stored shift that starts at start_time and lasts the given number of hours."""
+    return Shift.objects.create(
+        name=name,
+        shift_template=shift_template,
+        start_time=start_time,
+        end_time=start_time + datetime.timedelta(hours=hours),
+        num_slots=num_slots,
+    )
+
+
+def login(client, user: TapirUser):
+    """Log the test client in as the user.
+
+    TapirUser.save() makes the password of the saved instance unusable after storing it, so the session of that
+    instance would not match the stored user. The user is loaded again instead."""
+    client.force_login(TapirUser.objects.get(pk=user.pk))
+
+
+def login_as_staff(client) -> TapirUser:
+    """Create a superuser and log the test client in as them."""
+    staff = TapirUser.objects.create(username="hilda.staff", is_superuser=True)
+    login(client, staff)
+    return staff
@@ -0,0 +1,174 @@
+"""Layout of the shift timetable: one column per shift name and day, with the vertical offsets of the shifts.
+
+The layout only contains plain values, so that it can be returned as JSON as well as rendered by the timetable page.
+It is cached per date range under the versions of the days in the range (see tapir.shifts.day_cache)."""
+import datetime
+import hashlib
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db.models import Count, F, Q
+from django.urls import reverse
+from django.utils import timezone
+
+from tapir.shifts import day_cache, virtual
+from tapir.shifts.models import (
+    Shift,
+    ShiftAttendance,
+    ShiftAttendanceTemplate,
+    start_of_day,
+)
+
+# Height in pixels of one hour in the timetable
+HOUR_HEIGHT = 50
+# Longest date range that can be requested at once
+MAX_DAYS = 31
+CACHE_TIMEOUT = 24 * 60 * 60
+
+
+def get_layout(start_date: datetime.date, end_date: datetime.date) -> dict:
+    """Return the layout of the shifts between start_date and end_date (inclusive), from the cache if possible."""
+    dates = [
+        start_date + datetime.timedelta(days=i)
+        for i in range((end_date - start_date).days + 1)
+    ]
+    day_versions = day_cache.get_day_versions(dates)
+    cache_key = "shifts:timetable:%s:%s:%s" % (
+        start_date.isoformat(),
+        end_date.isoformat(),
+        hashlib.md5(
+            ",".join(day_versions[date] for date in dates).encode()
+        ).hexdigest(),
+    )
+
+    layout = cache.get(cache_key)
+    if layout is None:
+        layout = build_layout(start_date, end_date)
+        cache.set(cache_key, layout, CACHE_TIMEOUT)
+    return layout
+
+
+def build_layout(start_date: datetime.date, end_date: datetime.date) -> dict:
+    """Compute the layout with a single query, or from the stored and the virtual shifts if they are enabled."""
+    if virtual.is_enabled():
+        shifts = _get_shifts_with_virtual(start_date, end_date)
+    else:
+        shifts = _get_stored_shifts(start_date, end_date)
+
+    days = {}
+    for shift in shifts:
+        start_time = timezone.localtime(shift["start_time"])
+        end_time = timezone.localtime(shift["end_time"])
+        day = days.setdefault(
+            start_time.date(), {"start_time": start_time, "columns": {}}
+        )
+        column = day["columns"].setdefault(shift["name"], [])
+
+        # Each shift is placed below the previous shift of its column, the first ones below the start of the day
+        previous_end_time = column[-1]["end_time"] if column else day["start_time"]
+        column.append(
+            {
+                "id": shift["pk"],
+                "name": shift["name"],
+                "start_time": start_time,
+                "end_time": end_time,
+                "url": shift["url"],
+                "group": shift["group"],
+                "num_slots": shift["num_slots"],
+                "valid_attendance_count": shift["valid_attendance_count"],
+                "template_attendance_count": shift["template_attendance_count"],
+                "free_slot_count": shift["free_slot_count"],
+                "margin_top": _to_height(start_time - previous_end_time),
+                "height": _to_height(end_time - start_time),
+            }
+        )
+
+    return {
+        "start_date": start_date,
+        "end_date": end_date,
+        "hour_height": HOUR_HEIGHT,
+        "days": [
+            {
+                "date": date,
+                "columns": [
+                    {"name": name, "shifts": column_shifts}
+                    for name, column_shifts in day["columns"].items()
+                ],
+            }
+            for date, day in days.items()
+        ],
+    }
+
+
+def _get_stored_shifts(start_date: datetime.date, end_date: datetime.date):
+    valid_attendances = Q(attendances__state__in=ShiftAttendance.VALID_STATES)
+    shifts = (
+        Shift.objects.filter(
+            start_time__gte=start_of_day(start_date),
+            start_time__lt=start_of_day(end_date + datetime.timedelta(days=1)),
+        )
+        # Valid attendances of users that are registered to the template of the shift
+        .annotate(
+            template_attendance_count=Count(
+                "attendances",
+                filter=valid_attendances
+                & Q(
+                    attendances__user__shift_attendance_templates__shift_template=F(
+                        "shift_template"
+                    )
+                ),
+                distinct=True,
+            ),
+            group=F("shift_template__group__name"),
+        )
+        .order_by("start_time", "pk")
+        .values(
+            "pk",
+            "name",
+            "start_time",
+            "end_time",
+            "num_slots",
+            "valid_attendance_count",
+            "free_slot_count",
+            "template_attendance_count",
+            "group",
+        )
+    )
+    for shift in shifts:
+        shift["url"] = reverse("shifts:shift_detail", args=[shift["pk"]])
+        yield shift
+
+
+def _get_shifts_with_virtual(start_date: datetime.date, end_date: datetime.date):
+    """The same values as _get_stored_shifts(), for the stored and the virtual shifts of tapir.shifts.virtual."""
+    shifts = virtual.get_shifts(start_date, end_date)
+    template_user_pks = defaultdict(set)
+    for shift_template_pk, user_pk in ShiftAttendanceTemplate.objects.filter(
+        shift_template__in={shift.shift_template_id for shift in shifts}
+    ).values_list("shift_template", "user"):
+        template_user_pks[shift_template_pk].add(user_pk)
+
+    for shift in shifts:
+        valid_attendances = virtual.get_valid_attendances(shift)
+        yield {
+            "pk": shift.pk,
+            "name": shift.name,
+            "start_time": shift.start_time,
+            "end_time": shift.end_time,
+            "num_slots": shift.num_slots,
+            "valid_attendance_count": len(valid_attendances),
+            "free_slot_count": shift.num_slots - len(valid_attendances),
+            "template_attendance_count": sum(
+                1
+                for attendance in valid_attendances
+                if attendance.user_id in template_user_pks[shift.shift_template_id]
+            ),
+            "group": shift.shift_template.group.name
+            if shift.shift_template and shift.shift_template.group
+            else None,
+            "url": shift.get_absolute_url(),
+        }
+
+
+def _to_height(duration: datetime.timedelta) -> float:
+    return duration.total_seconds() / 3600 * HOUR_HEIGHT
@@ -1,8 +1,23 @@
-from django.urls import path
+import datetime
+
+from django.urls import path, register_converter
 from django.views import generic
 
 from tapir.shifts import views
 
+
+class IsoDateConverter:
+    regex = r"\d{4}-\d{2}-\d{2}"
+
+    def to_python(self, value):
+        return datetime.date.fromisoformat(value)
+
+    def to_url(self, value):
+        return value.isoformat()
+
+
+register_converter(IsoDateConverter, "isodate")
+
 app_name = "shifts"
 urlpatterns = [
     path(
@@ -13,6 +28,31 @@ urlpatterns = [
     path("upcoming/", views.UpcomingDaysView.as_view(), name="shift_upcoming"),
     # TODO(Leon Handreke): Can we somehow introduce a sub-namespace here?
     path("shift/<int:pk>/", views.ShiftDetailView.as_view(), name="shift_detail"),
+    path(
+        "shifttemplate/<int:pk>/shift/<isodate:date>/",
+        views.VirtualShiftDetailView.as_view(),
+        name="virtual_shift_detail",
+    ),
+    path(
+        "shifttemplate/<int:pk>/shift/<isodate:date>/materialize",
+        views.materialize_shift,
+        name="materialize_shift",
+    ),
+    path(
+        "shift/<int:pk>/close_out",
+        views.ShiftCloseOutView.as_view(),
+        name="close_out_shift",
+    ),
+    path(
+        "day/<isodate:date>/close_out",
+        views.DayCloseOutView.as_view(),
+        name="close_out_day",
+    ),
+    path(
+        "shift/free_slots",
+        views.search_free_slots,
+        name="search_free_slots",
+    ),
     path(
         "shift/create",
         views.CreateShiftView.as_view(),
@@ -23,6 +63,11 @@ urlpatterns = [
         views.register_user_to_shift,
         name="shift_register_user",
     ),
+    path(
+        "shift/<int:pk>/waitlist",
+        views.join_shift_waitlist,
+        name="join_shift_waitlist",
+    ),
     path(
         "shift/<int:pk>/edit",
         views.EditShiftView.as_view(),
@@ -58,9 +103,34 @@ urlpatterns = [
         views.shifttemplate_unregister_user,
         name="shifttemplate_unregister_user",
     ),
+    path(
+        "calendar/<str:token>/shifts.ics",
+        views.user_calendar,
+        name="user_calendar",
+    ),
+    path(
+        "calendar/<str:token>/all_shifts.ics",
+        views.all_shifts_calendar,
+        name="all_shifts_calendar",
+    ),
+    path(
+        "penalties",
+        views.PenaltyReportView.as_view(),
+        name="penalty_report",
+    ),
+    path(
+        "flying_assignment",
+        views.FlyingAssignmentView.as_view(),
+        name="flying_assignment",
+    ),
     path(
         "timetable",
         views.UpcomingShiftsAsTimetable.as_view(),
         name="upcoming_timetable",
     ),
+    path(
+        "timetable/layout",
+        views.timetable_layout,
+        name="timetable_layout",
+    ),
 ]
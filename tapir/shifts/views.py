@@ -1,24 +1,60 @@
 import datetime
-from collections import defaultdict, OrderedDict
+from collections import defaultdict
 
+from django.contrib import messages
 from django.contrib.auth.decorators import permission_required
 from django.contrib.auth.mixins import PermissionRequiredMixin
+from django.db import transaction
+from django.core import signing
+from django.core.cache import cache
+from django.core.exceptions import PermissionDenied
+from django.http import JsonResponse, Http404, HttpResponse, StreamingHttpResponse
 from django.shortcuts import redirect, get_object_or_404
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.formats import date_format
+from django.utils.translation import gettext_lazy as _
 from django.views.decorators.csrf import csrf_protect
-from django.views.decorators.http import require_POST
-from django.views.generic import TemplateView, DetailView, CreateView, UpdateView
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from django.utils.safestring import mark_safe
+from django.views.decorators.http import require_POST, require_safe
+from django.views.generic import (
+    TemplateView,
+    DetailView,
+    CreateView,
+    UpdateView,
+    FormView,
+)
 
 from tapir.accounts.models import TapirUser
-from tapir.coop.models import ShareOwner
-from tapir.shifts.forms import ShiftCreateForm
+from tapir.shifts import virtual, ical, day_cache, timetable, flying
+from tapir.shifts.closeout import close_out_attendances
+from tapir.shifts.eligibility import get_join_eligibilities, get_join_eligibility
+from tapir.shifts.penalties import (
+    evaluate_penalties,
+    get_penalty_rules,
+    get_thresholds,
+)
+from tapir.shifts.forms import (
+    ShiftCreateForm,
+    FreeSlotSearchForm,
+    CloseOutForm,
+    TimetableRangeForm,
+    FlyingAssignmentForm,
+)
 from tapir.shifts.models import (
     Shift,
     ShiftAttendance,
     ShiftTemplate,
-    WEEKDAY_CHOICES,
-    ShiftTemplateGroup,
     ShiftAttendanceTemplate,
+    ShiftUserData,
+    ShiftWaitlistEntry,
 )
+from tapir.shifts.propagation import enqueue_attendance_template_change
+from tapir.shifts.reservation import ReservationError, reserve_slot
+from tapir.shifts.template_overview import get_template_overview
 
 
 def time_to_seconds(time):
@@ -31,19 +67,95 @@ DAY_START_SECONDS = time_to_seconds(datetime.time(6, 0))
 DAY_END_SECONDS = time_to_seconds(datetime.time(22, 0))
 DAY_DURATION_SECONDS = DAY_END_SECONDS - DAY_START_SECONDS
 
+# Number of days shown at once by UpcomingDaysView
+UPCOMING_DAYS = 14
+# The rendered days are invalidated through their version in the cache key, see tapir.shifts.day_cache
+UPCOMING_DAY_CACHE_TIMEOUT = 24 * 60 * 60
+
 
 class UpcomingDaysView(PermissionRequiredMixin, TemplateView):
     permission_required = "shifts.manage"
     template_name = "shifts/upcoming_days.html"
 
+    def get_start_date(self) -> datetime.date:
+        try:
+            return datetime.date.fromisoformat(self.request.GET["start"])
+        except (KeyError, ValueError):
+            return timezone.localdate()
+
     def get_context_data(self, *args, **kwargs):
         context_data = super().get_context_data(*args, **kwargs)
 
-        shifts_by_days = defaultdict(list)
+        start_date = self.get_start_date()
+        days = [start_date + datetime.timedelta(days=i) for i in range(UPCOMING_DAYS)]
+
+        day_versions = day_cache.get_day_versions(days)
+        cache_keys = {
+            day: "shifts:upcoming_day:%s:%s" % (day.isoformat(), day_versions[day])
+            for day in days
+        }
+        rendered_days = cache.get_many(cache_keys.values())
+        days_to_render = [day for day in days if cache_keys[day] not in rendered_days]
+        if days_to_render:
+            shifts_by_days = self.get_shifts_by_days(
+                days_to_render[0], days_to_render[-1]
+            )
+            newly_rendered_days = {
+                cache_keys[day]: (
+                    render_to_string(
+                        "shifts/day_snippet.html", {"shifts": shifts_by_days[day]}
+                    )
+                    if shifts_by_days[day]
+                    else ""
+                )
+                for day in days_to_render
+            }
+            cache.set_many(newly_rendered_days, UPCOMING_DAY_CACHE_TIMEOUT)
+            rendered_days.update(newly_rendered_days)
+
+        today = timezone.localdate()
+        context_data["today"] = today
+        # Only show the days that have shifts, and today
+        context_data["days"] = [
+            (day, mark_safe(rendered_days[cache_keys[day]]))
+            for day in days
+            if rendered_days[cache_keys[day]] or day == today
+        ]
+        context_data["previous_start_date"] = start_date - datetime.timedelta(
+            days=UPCOMING_DAYS
+        )
+        context_data["next_start_date"] = start_date + datetime.timedelta(
+            days=UPCOMING_DAYS
+        )
+
+        return context_data
 
-        for shift in Shift.objects.filter(start_time__gte=datetime.date.today()):
-            start_time_seconds = time_to_seconds(shift.start_time)
-            end_time_seconds = time_to_seconds(shift.end_time)
+    @staticmethod
+    def get_shifts_by_days(start_date: datetime.date, end_date: datetime.date):
+        if virtual.is_enabled():
+            shifts = virtual.get_shifts(start_date, end_date)
+        else:
+            shifts = (
+                Shift.objects.filter(
+                    start_time__gte=timezone.make_aware(
+                        datetime.datetime.combine(start_date, datetime.time.min)
+                    ),
+                    start_time__lt=timezone.make_aware(
+                        datetime.datetime.combine(
+                            end_date + datetime.timedelta(days=1), datetime.time.min
+                        )
+                    ),
+                )
+                .with_valid_attendances()
+                .order_by("start_time")
+            )
+
+        shifts_by_days = defaultdict(list)
+        for shift in shifts:
+            start_time = timezone.localtime(shift.start_time)
+            end_time = timezone.localtime(shift.end_time)
+            start_time_seconds = time_to_seconds(start_time)
+            end_time_seconds = time_to_seconds(end_time)
 
             position_left = (
                 start_time_seconds - DAY_START_SECONDS
@@ -52,10 +164,8 @@ class UpcomingDaysView(PermissionRequiredMixin, TemplateView):
             width -= 0.01  # To make shifts not align completely
 
             # TODO(Leon Handreke): The name for this var sucks but can't find a better one
-            perc_slots_occupied = shift.get_valid_attendances().count() / float(
-                shift.num_slots
-            )
-            shifts_by_days[shift.start_time.date()].append(
+            perc_slots_occupied = shift.valid_attendance_count / float(shift.num_slots)
+            shifts_by_days[start_time.date()].append(
                 {
                     "title": shift.name,
                     "obj": shift,
@@ -66,21 +176,11 @@ class UpcomingDaysView(PermissionRequiredMixin, TemplateView):
                     if perc_slots_occupied <= 0.4
                     else ("#a5d6a7" if perc_slots_occupied >= 1 else "#ffe082"),
                     # Have a list of none cause it's easier to loop over in Django templates
-                    "free_slots": [None]
-                    * (shift.num_slots - shift.get_valid_attendances().count()),
-                    "attendances": shift.get_valid_attendances().all(),
+                    "free_slots": [None] * shift.free_slot_count,
+                    "attendances": virtual.get_valid_attendances(shift),
                 }
             )
-
-        # Django template language can't loop defaultdict
-        today = datetime.date.today()
-        context_data["today"] = today
-        context_data["shifts_today"] = shifts_by_days[today]
-        del shifts_by_days[today]
-
-        context_data["shifts_by_days"] = dict(shifts_by_days)
-
-        return context_data
+        return shifts_by_days
 
 
 class ShiftDetailView(PermissionRequiredMixin, DetailView):
@@ -93,16 +193,72 @@ class ShiftDetailView(PermissionRequiredMixin, DetailView):
         context = super().get_context_data(**kwargs)
 
         shift: Shift = context["shift"]
-        attendances = list(shift.attendances.all())
+        attendances = list(shift.attendances.order_by("pk"))
         while len(attendances) < shift.num_slots:
             attendances.append(None)
         context["attendances"] = attendances
 
-        context["can_join"] = user_can_join_shift(self.request.user, shift)
+        eligibility = get_join_eligibility(self.request.user, shift)
+        context["can_join"] = eligibility.can_join
+        context["join_reason"] = eligibility.get_reason_message()
+        context["waitlist_entries"] = shift.waitlist_entries.select_related("user")
+
+        return context
+
+
+class VirtualShiftDetailView(PermissionRequiredMixin, TemplateView):
+    permission_required = "shifts.manage"
+    template_name = "shifts/shift_detail.html"
+
+    def get(self, request, *args, **kwargs):
+        shift_template = get_object_or_404(ShiftTemplate, pk=kwargs["pk"])
+        self.shift = virtual.get_virtual_shift(shift_template, kwargs["date"])
+        if self.shift is None:
+            raise Http404("Shift template doesn't occur on this day")
+
+        stored_shift = Shift.objects.filter(
+            shift_template=shift_template, start_time=self.shift.start_time
+        ).first()
+        if stored_shift is not None:
+            return redirect(stored_shift)
+
+        return super().get(request, *args, **kwargs)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+
+        shift = self.shift
+        context["shift"] = shift
+        attendances = list(shift.virtual_attendances)
+        while len(attendances) < shift.num_slots:
+            attendances.append(None)
+        context["attendances"] = attendances
+        eligibility = get_join_eligibility(self.request.user, shift)
+        context["can_join"] = eligibility.can_join
+        context["join_reason"] = eligibility.get_reason_message()
 
         return context
 
 
+@require_POST
+@csrf_protect
+@permission_required("shifts.manage")
+def materialize_shift(request, pk, date):
+    """Store a virtual shift so that it can be changed, then continue with the action given as "next"."""
+    shift_template = get_object_or_404(ShiftTemplate, pk=pk)
+    try:
+        shift = virtual.materialize_shift(shift_template, date)
+    except ValueError:
+        raise Http404("Shift template doesn't occur on this day")
+
+    next_action = request.POST.get("next")
+    if next_action == "edit":
+        return redirect("shifts:shift_edit", pk=shift.pk)
+    if next_action == "register":
+        return redirect("shifts:shift_register_user", pk=shift.pk)
+    return redirect(shift)
+
+
 @require_POST
 @csrf_protect
 @permission_required("shifts.manage")
@@ -123,6 +279,149 @@ def mark_shift_attendance_missed(request, pk):
     return redirect(shift_attendance.shift)
 
 
+class CloseOutMixin(PermissionRequiredMixin):
+    """Set the outcome of all pending attendances of get_attendance_queryset() in one request, see
+    close_out_attendances()."""
+
+    permission_required = "shifts.manage"
+    form_class = CloseOutForm
+    template_name = "shifts/shift_form.html"
+    attendance_queryset = ShiftAttendance.objects.none()
+
+    def get_attendance_queryset(self):
+        return self.attendance_queryset.all()
+
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs["attendances"] = list(
+            self.get_attendance_queryset()
+            .filter(state=ShiftAttendance.State.PENDING)
+            .select_related("shift", "user")
+            .order_by("shift__start_time", "pk")
+        )
+        return kwargs
+
+    def form_valid(self, form):
+        closed_out_count = close_out_attendances(form.get_outcomes())
+        messages.success(
+            self.request, _("Closed out %d attendances.") % closed_out_count
+        )
+        return super().form_valid(form)
+
+
+class ShiftCloseOutView(CloseOutMixin, FormView):
+    def get_shift(self):
+        return get_object_or_404(Shift, pk=self.kwargs["pk"])
+
+    def get_attendance_queryset(self):
+        return self.get_shift().attendances.all()
+
+    def get_success_url(self):
+        return self.get_shift().get_absolute_url()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["card_title"] = (
+            _("Closing out %s") % self.get_shift().get_display_name()
+        )
+        return context
+
+
+class DayCloseOutView(CloseOutMixin, FormView):
+    def get_attendance_queryset(self):
+        if virtual.is_enabled():
+            # The virtual shifts of the day have no attendances to close out until they are stored
+            virtual.materialize_shifts(self.kwargs["date"], self.kwargs["date"])
+        day_start = timezone.make_aware(
+            datetime.datetime.combine(self.kwargs["date"], datetime.time.min)
+        )
+        return ShiftAttendance.objects.filter(
+            shift__start_time__gte=day_start,
+            shift__start_time__lt=day_start + datetime.timedelta(days=1),
+        )
+
+    def get_success_url(self):
+        return reverse("shifts:shift_upcoming")
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["card_title"] = _("Closing out the shifts of %s") % date_format(
+            self.kwargs["date"]
+        )
+        return context
+
+
+class PenaltyReportView(PermissionRequiredMixin, TemplateView):
+    """Members matching a penalty rule and the status changes the next evaluation will store."""
+
+    permission_required = "shifts.manage"
+    template_name = "shifts/penalty_report.html"
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+
+        evaluations = evaluate_penalties()
+        users = TapirUser.objects.in_bulk(
+            [evaluation.user_id for evaluation in evaluations]
+        )
+        for evaluation in evaluations:
+            evaluation.user = users[evaluation.user_id]
+        context["evaluations"] = evaluations
+        context["rules"] = get_penalty_rules()
+        context["thresholds"] = get_thresholds()
+
+        return context
+
+
+class FlyingAssignmentView(PermissionRequiredMixin, TemplateView):
+    """Review the proposed assignments of flying members to the free slots, the selected ones are applied on POST."""
+
+    permission_required = "shifts.manage"
+    template_name = "shifts/flying_assignment.html"
+
+    def get_form(self):
+        return FlyingAssignmentForm(self.request.GET or self.request.POST)
+
+    def get_proposal(self, form):
+        return flying.compute_proposal(
+            form.cleaned_data["start_date"],
+            form.cleaned_data["end_date"],
+            form.cleaned_data["max_assignments_per_member"],
+        )
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+
+        form = self.get_form()
+        context["form"] = form
+        if not form.is_valid():
+            return context
+
+        proposal = self.get_proposal(form)
+        users = TapirUser.objects.in_bulk(
+            [assignment.user_pk for assignment in proposal.assignments]
+        )
+        for assignment in proposal.assignments:
+            assignment.user = users[assignment.user_pk]
+        context["proposal"] = proposal
+        return context
+
+    def post(self, request, *args, **kwargs):
+        form = self.get_form()
+        if not form.is_valid():
+            return self.get(request, *args, **kwargs)
+
+        applied_count = self.get_proposal(form).apply(
+            keys=set(request.POST.getlist("assignment"))
+        )
+        messages.info(
+            request,
+            _("%(count)d flying members were registered to shifts.")
+            % {"count": applied_count},
+        )
+        return redirect("shifts:flying_assignment")
+
+
 @require_POST
 @csrf_protect
 @permission_required("shifts.manage")
@@ -130,7 +429,10 @@ def shifttemplate_register_user(request, pk, user_pk):
     shift_template = get_object_or_404(ShiftTemplate, pk=pk)
     user = get_object_or_404(TapirUser, pk=user_pk)
 
-    ShiftAttendanceTemplate.objects.create(user=user, shift_template=shift_template)
+    with transaction.atomic():
+        ShiftAttendanceTemplate.objects.create(user=user, shift_template=shift_template)
+        enqueue_attendance_template_change(shift_template, user)
+    messages.info(request, _("The future shifts will be updated in the background."))
     return redirect(request.GET.get("next", user))
 
 
@@ -142,7 +444,12 @@ def shifttemplate_unregister_user(request, pk, user_pk):
     shift_attendance_template = get_object_or_404(
         ShiftAttendanceTemplate, user__pk=user_pk, shift_template__pk=pk
     )
-    shift_attendance_template.delete()
+    with transaction.atomic():
+        shift_attendance_template.delete()
+        enqueue_attendance_template_change(
+            shift_attendance_template.shift_template, user
+        )
+    messages.info(request, _("The future shifts will be updated in the background."))
     return redirect(request.GET.get("next", user))
 
 
@@ -153,30 +460,9 @@ class ShiftTemplateOverview(PermissionRequiredMixin, TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
-        grouped_per_day = {}
-        for weekday in WEEKDAY_CHOICES:
-            grouped_per_day[weekday[1]] = OrderedDict()
-
-        for t in ShiftTemplate.objects.all().order_by("start_time"):
-            template: ShiftTemplate = t
-            weekday_group = grouped_per_day[WEEKDAY_CHOICES[template.weekday][1]]
-            start_time_as_string = str(template.start_time)
-            if start_time_as_string not in weekday_group:
-                weekday_group[start_time_as_string] = {}
-            time_group = weekday_group[start_time_as_string]
-            if template.group.name not in time_group:
-                for template_group in ShiftTemplateGroup.objects.all().order_by("name"):
-                    time_group[template_group.name] = {}
-            for template_group in ShiftTemplateGroup.objects.all().order_by("name"):
-                if template.name not in time_group[template_group.name]:
-                    time_group[template_group.name][template.name] = None
-            template_group_group = time_group[template.group.name]
-            template_group_group[template.name] = template
-
-        context["day_groups"] = grouped_per_day
-        context["shift_template_groups"] = [
-            group.name for group in ShiftTemplateGroup.objects.all().order_by("name")
-        ]
+        overview = get_template_overview()
+        context["day_groups"] = overview["days"]
+        context["shift_template_groups"] = overview["groups"]
         return context
 
 
@@ -216,21 +502,90 @@ class EditShiftView(PermissionRequiredMixin, UpdateView):
 
 @permission_required("shifts.manage")
 def register_user_to_shift(request, pk):
-    shift = Shift.objects.get(pk=pk)
-    user: TapirUser = request.user
-    if not user_can_join_shift(user, shift):
-        raise Exception("User ({0}) can't join shift ({1})".format(user.id, shift.id))
-    ShiftAttendance.objects.create(shift=shift, user=user)
+    try:
+        reserve_slot(request.user, pk)
+    except ReservationError as error:
+        messages.error(request, error.get_message())
+    except Shift.DoesNotExist:
+        raise Http404("Shift doesn't exist")
 
-    return redirect(shift)
+    return redirect("shifts:shift_detail", pk=pk)
+
+
+@require_POST
+@csrf_protect
+@permission_required("shifts.manage")
+def join_shift_waitlist(request, pk):
+    try:
+        result = reserve_slot(request.user, pk, join_waitlist=True)
+    except ReservationError as error:
+        messages.error(request, error.get_message())
+    except Shift.DoesNotExist:
+        raise Http404("Shift doesn't exist")
+    else:
+        if isinstance(result, ShiftWaitlistEntry):
+            messages.info(
+                request,
+                _(
+                    "You are on the waitlist and will be registered as soon as a slot frees up."
+                ),
+            )
+
+    return redirect("shifts:shift_detail", pk=pk)
 
 
-def user_can_join_shift(user: TapirUser, shift: Shift) -> bool:
-    can_join = len(shift.attendances.filter(user=user)) == 0
-    share_owner = ShareOwner.objects.filter(user=user)
-    if len(share_owner) > 0:
-        can_join = can_join and not ShareOwner.objects.get(user=user).is_investing
-    return can_join
+# Maximum number of shifts returned by search_free_slots if the request doesn't specify a limit
+FREE_SLOT_SEARCH_DEFAULT_LIMIT = 50
+
+
+@permission_required("shifts.manage")
+def search_free_slots(request):
+    """Return the upcoming shifts with free slots as JSON, filtered by the parameters of FreeSlotSearchForm."""
+    form = FreeSlotSearchForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({"errors": form.errors}, status=400)
+
+    search = form.cleaned_data
+    filters = {
+        "start_date": search["start_date"] or timezone.localdate(),
+        "end_date": search["end_date"],
+        "weekdays": search["weekdays"],
+        "earliest_start_time": search["earliest_start_time"],
+        "latest_end_time": search["latest_end_time"],
+        "group": search["group"],
+    }
+    limit = search["limit"] or FREE_SLOT_SEARCH_DEFAULT_LIMIT
+    if virtual.is_enabled():
+        shifts = virtual.get_shifts_with_free_slots(**filters)[:limit]
+    else:
+        shifts = list(
+            Shift.objects.with_free_slots(**filters).select_related(
+                "shift_template__group"
+            )[:limit]
+        )
+
+    return JsonResponse(
+        {
+            "shifts": [
+                {
+                    "id": shift.id,
+                    "name": shift.name,
+                    "start_time": shift.start_time,
+                    "end_time": shift.end_time,
+                    "num_slots": shift.num_slots,
+                    "free_slot_count": shift.free_slot_count,
+                    "group": shift.shift_template.group.name
+                    if shift.shift_template and shift.shift_template.group
+                    else None,
+                    "url": shift.get_absolute_url(),
+                    "can_join": eligibility.can_join,
+                }
+                for shift, eligibility in zip(
+                    shifts, get_join_eligibilities(request.user, shifts)
+                )
+            ]
+        }
+    )
 
 
 class UpcomingShiftsAsTimetable(PermissionRequiredMixin, TemplateView):
@@ -240,33 +595,68 @@ class UpcomingShiftsAsTimetable(PermissionRequiredMixin, TemplateView):
     def get_context_data(self, *args, **kwargs):
         context_data = super().get_context_data(*args, **kwargs)
 
-        upcoming_shifts = Shift.objects.filter(
-            start_time__gte=datetime.date.today()
-        ).order_by("start_time")[:100]
-        shifts_by_days = dict()
-        day_start_time = None
-        for test in upcoming_shifts:
-            shift: Shift = test
-            shift_day = shift.start_time.date()
-            if shift_day not in shifts_by_days:
-                shifts_by_days[shift_day] = dict()
-                day_start_time = shift.start_time
-
-            shifts_by_name = shifts_by_days[shift_day]
-            if shift.name not in shifts_by_name:
-                shifts_by_name[shift.name] = []
-
-            shift_display_infos = dict()
-            shift_display_infos["shift"] = shift
-            duration = (shift.end_time - shift.start_time).total_seconds() / 3600
-            shift_display_infos["height"] = duration * 50
-            previous_time = day_start_time
-            if len(shifts_by_name[shift.name]) > 0:
-                previous_time = shifts_by_name[shift.name][-1]["shift"].end_time
-            shift_display_infos["margin_top"] = (
-                (shift.start_time - previous_time).total_seconds() / 3600
-            ) * 50
-            shifts_by_name[shift.name].append(shift_display_infos)
-
-        context_data["shifts_by_days"] = shifts_by_days
+        form = TimetableRangeForm(self.request.GET)
+        if not form.is_valid():
+            for errors in form.errors.values():
+                for error in errors:
+                    messages.error(self.request, error)
+            form = TimetableRangeForm({})
+            form.is_valid()
+        start_date = form.cleaned_data["start_date"]
+        end_date = form.cleaned_data["end_date"]
+
+        context_data["layout"] = timetable.get_layout(start_date, end_date)
+        range_length = end_date - start_date + datetime.timedelta(days=1)
+        context_data["previous_start_date"] = start_date - range_length
+        context_data["previous_end_date"] = end_date - range_length
+        context_data["next_start_date"] = start_date + range_length
+        context_data["next_end_date"] = end_date + range_length
         return context_data
+
+
+@require_safe
+@permission_required("shifts.manage")
+def timetable_layout(request):
+    """Return the timetable layout of the range given by TimetableRangeForm as JSON."""
+    form = TimetableRangeForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({"errors": form.errors}, status=400)
+
+    return JsonResponse(
+        timetable.get_layout(
+            form.cleaned_data["start_date"], form.cleaned_data["end_date"]
+        )
+    )
+
+
+def _get_calendar_user_pk(token: str) -> int:
+    try:
+        return ShiftUserData.get_user_pk_from_calendar_token(token)
+    except signing.BadSignature:
+        raise Http404("Invalid calendar token")
+
+
+@require_safe
+def user_calendar(request, token):
+    """The personal iCalendar feed of the user identified by the token. Unchanged feeds are answered with a 304."""
+    calendar = ical.UserCalendar(_get_calendar_user_pk(token))
+    etag = quote_etag(calendar.get_etag())
+
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(
+            "".join(calendar.get_lines()), content_type=ical.CONTENT_TYPE
+        )
+    response["ETag"] = etag
+    return response
+
+
+@require_safe
+def all_shifts_calendar(request, token):
+    """The iCalendar feed of all upcoming shifts, for the coordinators."""
+    user = get_object_or_404(TapirUser, pk=_get_calendar_user_pk(token))
+    if not user.has_perm("shifts.manage"):
+        raise PermissionDenied()
+    return StreamingHttpResponse(
+        ical.get_all_shifts_lines(), content_type=ical.CONTENT_TYPE
+    )
@@ -0,0 +1,254 @@
+"""Virtual shifts: future shifts expanded on the fly from the ShiftTemplates and the ABCD cycle.
+
+With settings.SHIFTS_VIRTUAL_FUTURE_SHIFTS, future shifts are not generated in advance. A virtual shift is an unsaved
+Shift instance built by ShiftTemplate._generate_shift(), which shows the attendances of the ShiftAttendanceTemplates.
+It is only stored with materialize_shift() once something shift-specific happens to it, such as an edit, a one-off
+attendance or a state change, and at the latest on its day with materialize_shifts(), so that it can be closed out.
+Stored shifts always take precedence over the virtual shift of the same template and
+start time. Members don't attend virtual shifts during their ShiftExemptions."""
+import datetime
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from tapir.shifts.models import (
+    ExemptionCalendar,
+    Shift,
+    ShiftAttendance,
+    ShiftAttendanceTemplate,
+    ShiftTemplate,
+    ShiftTemplateGroup,
+    start_of_day,
+)
+
+# Number of days for which virtual shifts are expanded when there is no end date, one ABCD cycle
+HORIZON_DAYS = 4 * 7
+
+
+def is_enabled() -> bool:
+    return settings.SHIFTS_VIRTUAL_FUTURE_SHIFTS
+
+
+def get_shifts(start_date: datetime.date, end_date: datetime.date):
+    """Return the stored and the virtual shifts between start_date and end_date (inclusive), ordered by start time.
+
+    Virtual shifts are only expanded for days from today on, past shifts must have been stored with
+    materialize_shifts()."""
+    shifts = list(
+        Shift.objects.filter(
+            start_time__gte=start_of_day(start_date),
+            start_time__lt=start_of_day(end_date + datetime.timedelta(days=1)),
+        )
+        .select_related("shift_template__group")
+        .with_valid_attendances()
+    )
+    stored_shift_keys = {
+        (shift.shift_template_id, shift.start_time) for shift in shifts
+    }
+
+    templates_by_week_index_and_weekday = _get_templates_by_week_index_and_weekday()
+    shift_date = max(start_date, timezone.localdate())
+    exemptions = ExemptionCalendar(start_date=shift_date, end_date=end_date)
+    while shift_date <= end_date:
+        for shift_template in templates_by_week_index_and_weekday[
+            (ShiftTemplateGroup.get_week_index(shift_date), shift_date.weekday())
+        ]:
+            shift = _build_virtual_shift(shift_template, shift_date, exemptions)
+            if (shift_template.pk, shift.start_time) not in stored_shift_keys:
+                shifts.append(shift)
+        shift_date += datetime.timedelta(days=1)
+
+    return sorted(shifts, key=lambda shift: shift.start_time)
+
+
+def get_shifts_with_free_slots(
+    start_date: datetime.date,
+    end_date: datetime.date = None,
+    weekdays=None,
+    earliest_start_time: datetime.time = None,
+    latest_end_time: datetime.time = None,
+    group: ShiftTemplateGroup = None,
+):
+    """Like ShiftQuerySet.with_free_slots(), for the stored and the virtual shifts.
+
+    Without an end date, the search ends HORIZON_DAYS after the start date."""
+    if end_date is None:
+        end_date = start_date + datetime.timedelta(days=HORIZON_DAYS - 1)
+    shifts = []
+    for shift in get_shifts(start_date, end_date):
+        start_time = timezone.localtime(shift.start_time)
+        end_time = timezone.localtime(shift.end_time)
+        if shift.free_slot_count <= 0:
+            continue
+        if weekdays and start_time.weekday() not in weekdays:
+            continue
+        if earliest_start_time is not None and start_time.time() < earliest_start_time:
+            continue
+        if latest_end_time is not None and end_time.time() > latest_end_time:
+            continue
+        if group is not None and (
+            shift.shift_template is None or shift.shift_template.group_id != group.pk
+        ):
+            continue
+        shifts.append(shift)
+    return shifts
+
+
+def get_upcoming_attendances(user):
+    """The upcoming attendances of the user in the stored shifts and in the virtual shifts of the next HORIZON_DAYS,
+    ordered by start time.
+
+    Unlike get_shifts(), only the virtual shifts of the user's templates are expanded."""
+    attendances = list(
+        user.shift_user_data.get_upcoming_shift_attendances().select_related("shift")
+    )
+
+    start_date = timezone.localdate()
+    end_date = start_date + datetime.timedelta(days=HORIZON_DAYS - 1)
+    shift_templates = list(
+        ShiftTemplate.objects.filter(
+            attendance_templates__user=user, group__isnull=False, weekday__isnull=False
+        )
+        .select_related("group")
+        .prefetch_related("attendance_templates__user")
+    )
+    stored_shift_keys = set(
+        Shift.objects.filter(
+            shift_template__in=shift_templates,
+            start_time__gte=start_of_day(start_date),
+            start_time__lt=start_of_day(end_date + datetime.timedelta(days=1)),
+        ).values_list("shift_template_id", "start_time")
+    )
+    exemptions = ExemptionCalendar(
+        user_pks=ShiftAttendanceTemplate.objects.filter(
+            shift_template__in=shift_templates
+        ).values("user"),
+        start_date=start_date,
+        end_date=end_date,
+    )
+
+    now = timezone.now()
+    shift_date = start_date
+    while shift_date <= end_date:
+        for shift_template in shift_templates:
+            if not _occurs_on(shift_template, shift_date):
+                continue
+            shift = _build_virtual_shift(shift_template, shift_date, exemptions)
+            if (
+                shift.start_time <= now
+                or (shift_template.pk, shift.start_time) in stored_shift_keys
+            ):
+                continue
+            attendances.extend(
+                attendance
+                for attendance in shift.virtual_attendances
+                if attendance.user_id == user.pk
+            )
+        shift_date += datetime.timedelta(days=1)
+
+    return sorted(attendances, key=lambda attendance: attendance.shift.start_time)
+
+
+def get_virtual_shift(shift_template: ShiftTemplate, shift_date: datetime.date):
+    """Return the virtual shift of the template on the given date, None if the template doesn't occur on that day."""
+    if not _occurs_on(shift_template, shift_date):
+        return None
+    exemptions = ExemptionCalendar(
+        user_pks=shift_template.attendance_templates.values("user"),
+        start_date=shift_date,
+        end_date=shift_date,
+    )
+    return _build_virtual_shift(shift_template, shift_date, exemptions)
+
+
+def get_valid_attendances(shift: Shift):
+    """The valid attendances of a stored shift or the unsaved attendances of a virtual one."""
+    if hasattr(shift, "valid_attendances"):
+        return shift.valid_attendances
+    return shift.get_valid_attendances()
+
+
+@transaction.atomic
+def materialize_shift(
+    shift_template: ShiftTemplate, shift_date: datetime.date
+) -> Shift:
+    """Store the shift of the template on the given date together with the attendances from the template.
+
+    Returns the stored shift if it already exists. Raises ValueError if the template doesn't occur on that day."""
+    if not _occurs_on(shift_template, shift_date):
+        raise ValueError(
+            "Shift template {0} doesn't occur on {1}".format(
+                shift_template.pk, shift_date
+            )
+        )
+    planned_shift = shift_template._generate_shift(start_date=shift_date)
+    shift, created = Shift.objects.get_or_create(
+        shift_template=shift_template,
+        start_time=planned_shift.start_time,
+        defaults={
+            "name": planned_shift.name,
+            "end_time": planned_shift.end_time,
+            "num_slots": planned_shift.num_slots,
+        },
+    )
+    if created:
+        shift.update_attendances_from_shift_template()
+    return shift
+
+
+def materialize_shifts(start_date: datetime.date, end_date: datetime.date):
+    """Store the shifts of all templates between start_date and end_date (inclusive), see materialize_shift().
+
+    Virtual shifts aren't shown anymore once their day has passed, so they are stored daily by the
+    materialize_virtual_shifts command and before a day is closed out. Returns the stored shifts."""
+    templates_by_week_index_and_weekday = _get_templates_by_week_index_and_weekday()
+    shifts = []
+    shift_date = start_date
+    while shift_date <= end_date:
+        for shift_template in templates_by_week_index_and_weekday[
+            (ShiftTemplateGroup.get_week_index(shift_date), shift_date.weekday())
+        ]:
+            shifts.append(materialize_shift(shift_template, shift_date))
+        shift_date += datetime.timedelta(days=1)
+    return shifts
+
+
+def _occurs_on(shift_template: ShiftTemplate, shift_date: datetime.date) -> bool:
+    return (
+        shift_template.group is not None
+        and shift_template.weekday == shift_date.weekday()
+        and shift_template.group.week_index
+        == ShiftTemplateGroup.get_week_index(shift_date)
+    )
+
+
+def _get_templates_by_week_index_and_weekday():
+    templates_by_week_index_and_weekday = defaultdict(list)
+    for shift_template in (
+        ShiftTemplate.objects.filter(group__isnull=False, weekday__isnull=False)
+        .select_related("group")
+        .prefetch_related("attendance_templates__user")
+    ):
+        templates_by_week_index_and_weekday[
+            (shift_template.group.week_index, shift_template.weekday)
+        ].append(shift_template)
+    return templates_by_week_index_and_weekday
+
+
+def _build_virtual_shift(
+    shift_template: ShiftTemplate,
+    shift_date: datetime.date,
+    exemptions: ExemptionCalendar,
+):
+    shift = shift_template._generate_shift(start_date=shift_date)
+    shift.virtual_attendances = [
+        ShiftAttendance(shift=shift, user=attendance_template.user)
+        for attendance_template in shift_template.attendance_templates.all()
+        if not exemptions.is_exempt(attendance_template.user_id, shift_date)
+    ]
+    shift.valid_attendances = shift.virtual_attendances
+    shift.valid_attendance_count = len(shift.virtual_attendances)
+    shift.free_slot_count = shift.num_slots - shift.valid_attendance_count
+    return shift
@@ -7,6 +7,7 @@ import random
 from tapir.accounts.models import TapirUser
 from tapir.coop.models import ShareOwner, ShareOwnership, DraftUser
 from tapir.log.models import LogEntry
+from tapir.shifts import generation
 from tapir.shifts.models import (
     Shift,
     ShiftAttendance,
@@ -182,7 +183,9 @@ def populate_users():
             ShiftAttendanceTemplate.objects.create(
                 user=tapir_user, shift_template=template
             )
-            template.update_future_shift_attendances()
+            template.propagate_attendance_template_changes(
+                added_user_pks=[tapir_user.pk]
+            )
             break
     print("Created fake uses")
 
@@ -263,13 +266,10 @@ def generate_shifts():
     while start_day.weekday() != 0:
         start_day = start_day + datetime.timedelta(days=1)
 
-    groups = ShiftTemplateGroup.objects.order_by("week_index")
-    for week in range(8):
-        monday = start_day + datetime.timedelta(days=7 * week)
-        print("Doing week from " + str(monday) + " " + str(week + 1) + "/8")
-        week_index = ShiftTemplateGroup.get_week_index(monday)
-        groups[week_index - 1].create_shifts(monday)
-    print("Generated shifts")
+    result = generation.generate_shifts(
+        start_date=start_day, end_date=start_day + datetime.timedelta(weeks=8, days=-1)
+    )
+    print("Generated shifts: " + str(result))
 
 
 def clear_data():